@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import (
-    Matiere, ParametresDebit, Affaire, Lancement, Debit, Chute, StockMatiere
+    Matiere, ParametresDebit, Affaire, Lancement, Debit, Chute, StockMatiere,
+    TacheOptimisation
 )
 
 
@@ -50,3 +51,9 @@ class StockMatiereAdmin(admin.ModelAdmin):
     list_display = ['matiere', 'largeur', 'longueur', 'quantite', 'quantite_reservee', 'statut']
     list_filter = ['statut']
     search_fields = ['matiere__code']
+
+
+@admin.register(TacheOptimisation)
+class TacheOptimisationAdmin(admin.ModelAdmin):
+    list_display = ['type_tache', 'debit', 'lancement', 'statut', 'progression', 'created_at', 'finished_at']
+    list_filter = ['type_tache', 'statut', 'created_at']
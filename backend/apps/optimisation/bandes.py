@@ -0,0 +1,267 @@
+"""
+Débit en deux étapes (bandes), tel que le pratiquent les scies à panneaux
+- 1re étape : la plaque est refendue en bandes sur toute sa largeur (en coupe
+  transversale) ou toute sa longueur (en coupe longitudinale)
+- 2e étape : chaque bande est tronçonnée en pièces
+- La hauteur d'une bande est celle de la plus haute pièce restant à placer ;
+  la bande est complétée par un sac à dos sur les largeurs (programmation
+  dynamique sur la frontière de Pareto largeur / surface), et un schéma de
+  bande est répété tant que les quantités le permettent
+- Les bandes sont ensuite rangées sur les plaques par ordre de hauteur
+  décroissante (First Fit Decreasing), chutes et formats en stock d'abord
+- Le moteur travaille en entiers (dixièmes de mm) et renvoie des plaques au
+  même format que PackerGuillotine
+"""
+from operator import itemgetter
+from typing import List, Tuple
+
+from .guillotine import PlaqueGuillotine, SourcePlaque
+from .pieces import TypePiece
+
+# Types de pièces proposés au sac à dos de chaque bande (les plus hauts d'abord)
+CANDIDATS_PAR_BANDE = 24
+# Nombre d'états du sac à dos au-delà duquel on cesse d'ajouter des articles à la bande
+ETATS_MAX = 256
+
+
+class _Article:
+    """Type de pièce orienté dans le repère des bandes (largeur le long de la bande)"""
+    __slots__ = ('type_piece', 'largeur', 'hauteur', 'pivotee')
+
+    def __init__(self, type_piece: TypePiece, largeur: int, hauteur: int, pivotee: bool):
+        self.type_piece = type_piece
+        self.largeur = largeur
+        self.hauteur = hauteur
+        self.pivotee = pivotee
+
+
+class _Bande:
+    __slots__ = ('hauteur', 'largeur', 'schema')
+
+    def __init__(self, hauteur: int, largeur: int, schema: List[Tuple[_Article, int]]):
+        self.hauteur = hauteur
+        self.largeur = largeur  # largeur occupée, traits de coupe compris
+        self.schema = schema
+
+
+class PlaqueBandes(PlaqueGuillotine):
+    """Plaque débitée en bandes : bandes (x, y, largeur, longueur) dans le repère de la plaque"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bandes = []
+
+
+def remplir_bande(articles: List[_Article], capacite: int, lame: int) -> List[int]:
+    """
+    Sac à dos borné : nombre de pièces de chaque article maximisant la surface de la bande
+
+    Chaque pièce consomme sa largeur plus un trait de coupe ; la capacité inclut le
+    trait de coupe final. Les quantités sont découpées en lots 1, 2, 4... ; seuls
+    les états non dominés (plus large sans être plus rempli) et pouvant encore
+    dépasser le meilleur sont conservés. Les articles sont triés par hauteur décroissante.
+    """
+    etats = [(0, 0, None)]  # (largeur, surface, (état précédent, article, nombre))
+    for index, article in enumerate(articles):
+        # Les articles sont triés par hauteur décroissante : un état ne peut plus gagner
+        # que sa largeur restante fois cette hauteur ; les états sans espoir sont écartés
+        meilleure = etats[-1][1]
+        etats = [
+            etat for etat in etats
+            if etat[1] == meilleure or etat[1] + (capacite - etat[0]) * article.hauteur > meilleure
+        ]
+        if len(etats) > ETATS_MAX:
+            # Largeurs trop variées : les articles suivants (moins hauts) ne sont plus proposés
+            break
+        poids = article.largeur + lame
+        disponible = min(article.type_piece.quantite, capacite // poids)
+        lot = 1
+        while disponible > 0:
+            nombre = min(lot, disponible)
+            disponible -= nombre
+            lot *= 2
+            ajout_poids = poids * nombre
+            ajout_valeur = article.largeur * article.hauteur * nombre
+            nouveaux = [
+                (largeur + ajout_poids, valeur + ajout_valeur, (etat, index, nombre))
+                for largeur, valeur, etat in etats
+                if largeur + ajout_poids <= capacite
+            ]
+            if not nouveaux:
+                continue
+            etats.extend(nouveaux)
+            etats.sort(key=itemgetter(0))
+            frontiere = []
+            meilleure = -1
+            for etat in etats:
+                if etat[1] > meilleure:
+                    frontiere.append(etat)
+                    meilleure = etat[1]
+            etats = frontiere
+
+    nombres = [0] * len(articles)
+    chaine = etats[-1][2]
+    while chaine is not None:
+        chaine, index, nombre = chaine
+        nombres[index] += nombre
+    return nombres
+
+
+class PackerBandes:
+    """Place une liste de pièces en bandes (sources éventuelles, puis plaques neuves)"""
+
+    def __init__(self, largeur: int, longueur: int,
+                 epaisseur_lame: int = 0,
+                 reequerrage: int = 0,
+                 sens_coupe: str = 'transversal',
+                 rotation: bool = False):
+        self.largeur = largeur
+        self.longueur = longueur
+        self.epaisseur_lame = epaisseur_lame
+        self.reequerrage = reequerrage
+        # Transversal : bandes sur toute la largeur (empilées sur la longueur) ;
+        # longitudinal : le repère des bandes est transposé
+        self.transposer = sens_coupe != 'transversal'
+        self.rotation = rotation
+
+    def _repere(self, largeur: int, longueur: int) -> Tuple[int, int]:
+        return (longueur, largeur) if self.transposer else (largeur, longueur)
+
+    def _articles(self, types: List[TypePiece]) -> Tuple[List[_Article], List[TypePiece]]:
+        """Oriente les types dans le repère des bandes ; écarte ceux qui ne tiennent sur aucune plaque"""
+        largeur_utile, hauteur_utile = (
+            dimension - 2 * self.reequerrage for dimension in self._repere(self.largeur, self.longueur)
+        )
+        articles = []
+        non_placees = []
+        for type_piece in types:
+            largeur, hauteur = self._repere(type_piece.largeur, type_piece.longueur)
+            orientations = [(largeur, hauteur, False)]
+            if self.rotation and largeur != hauteur:
+                orientations.append((hauteur, largeur, True))
+            # Bandes les plus basses possibles : la pièce est couchée si la rotation est permise
+            orientations = [o for o in orientations if o[0] <= largeur_utile and o[1] <= hauteur_utile]
+            if not orientations:
+                non_placees.append(type_piece)
+                continue
+            largeur, hauteur, pivotee = min(orientations, key=lambda o: (o[1], o[0]))
+            articles.append(_Article(type_piece, largeur, hauteur, pivotee))
+        articles.sort(key=lambda a: (a.hauteur, a.largeur), reverse=True)
+        return articles, non_placees
+
+    def _bandes(self, articles: List[_Article]) -> List[_Bande]:
+        """1re étape : schémas de bandes, par hauteur décroissante"""
+        lame = self.epaisseur_lame
+        capacite = self._repere(self.largeur, self.longueur)[0] - 2 * self.reequerrage + lame
+        bandes = []
+        restants = articles
+        while restants:
+            ancre = restants[0]
+            # L'article le plus haut fixe la hauteur et figure au moins une fois dans la bande
+            ancre.type_piece.quantite -= 1
+            candidats = [a for a in restants[:CANDIDATS_PAR_BANDE] if a.type_piece.quantite > 0]
+            nombres = remplir_bande(candidats, capacite - ancre.largeur - lame, lame)
+            ancre.type_piece.quantite += 1
+            schema = [(ancre, 1)] if ancre not in candidats else []
+            schema += [
+                (article, nombre + (article is ancre)) for article, nombre in zip(candidats, nombres)
+                if nombre or article is ancre
+            ]
+
+            repetitions = min(article.type_piece.quantite // nombre for article, nombre in schema)
+            largeur = sum((article.largeur + lame) * nombre for article, nombre in schema) - lame
+            schema.sort(key=lambda element: element[0].hauteur, reverse=True)
+            for _ in range(repetitions):
+                bandes.append(_Bande(ancre.hauteur, largeur, schema))
+            for article, nombre in schema:
+                article.type_piece.quantite -= nombre * repetitions
+            restants = [a for a in restants if a.type_piece.quantite > 0]
+        return bandes
+
+    def _nouvelle_plaque(self, rang: int, source: SourcePlaque = None) -> PlaqueBandes:
+        if source is None:
+            plaque = PlaqueBandes(None, self.largeur, self.longueur, self.reequerrage, rang=rang)
+            plaque.marge = self.reequerrage
+        else:
+            # Les chutes ont déjà des bords propres : pas de ré-équerrage
+            marge = 0 if source.origine == 'chute' else self.reequerrage
+            plaque = PlaqueBandes(
+                None, source.largeur, source.longueur, marge,
+                origine=source.origine, reference=source.reference, rang=rang,
+            )
+            plaque.marge = marge
+        largeur, hauteur = self._repere(plaque.largeur, plaque.longueur)
+        plaque.largeur_bande = largeur - 2 * plaque.marge
+        plaque.fin = hauteur - plaque.marge
+        plaque.position = plaque.marge
+        return plaque
+
+    def _poser(self, plaque: PlaqueBandes, bande: _Bande):
+        """2e étape : tronçonnage de la bande en pièces, posée au-dessus des précédentes"""
+        lame = self.epaisseur_lame
+        y = plaque.position
+        x = plaque.marge
+        for article, nombre in bande.schema:
+            rotation = article.type_piece.rotation != article.pivotee
+            for _ in range(nombre):
+                if self.transposer:
+                    placement = (y, x, article.hauteur, article.largeur)
+                else:
+                    placement = (x, y, article.largeur, article.hauteur)
+                plaque.pieces.append(placement + (article.type_piece.nom, rotation))
+                x += article.largeur + lame
+        if self.transposer:
+            plaque.bandes.append((y, plaque.marge, bande.hauteur, plaque.largeur_bande))
+        else:
+            plaque.bandes.append((plaque.marge, y, plaque.largeur_bande, bande.hauteur))
+        plaque.position = y + bande.hauteur + lame
+
+    @staticmethod
+    def _accepte(plaque: PlaqueBandes, bande: _Bande) -> bool:
+        return bande.largeur <= plaque.largeur_bande and plaque.position + bande.hauteur <= plaque.fin
+
+    def placer_pieces(self, types: List[TypePiece],
+                      sources: List[SourcePlaque] = None) -> Tuple[List[PlaqueBandes], List[TypePiece]]:
+        """
+        Place les types de pièces en bandes
+
+        Returns:
+            (plaques utilisées, types qui ne tiennent pas sur une plaque)
+        """
+        articles, non_placees = self._articles(types)
+        bandes = self._bandes(articles)
+
+        ouvertes = []
+        a_la_demande = []
+        rang = 0
+        for source in sources or []:
+            if source.origine == 'chute':
+                for _ in range(source.quantite):
+                    ouvertes.append(self._nouvelle_plaque(rang, source))
+                    rang += 1
+            else:
+                a_la_demande.append([source, source.quantite])
+
+        plaques = []
+        for bande in bandes:
+            plaque = next((p for p in ouvertes if self._accepte(p, bande)), None)
+            if plaque is None:
+                for entree in a_la_demande:
+                    if entree[1] == 0:
+                        continue
+                    candidate = self._nouvelle_plaque(rang, entree[0])
+                    if self._accepte(candidate, bande):
+                        entree[1] -= 1
+                        plaque = candidate
+                        break
+                else:
+                    plaque = self._nouvelle_plaque(rang)
+                rang += 1
+                ouvertes.append(plaque)
+            if plaque.numero is None:
+                plaque.numero = len(plaques) + 1
+                plaques.append(plaque)
+            self._poser(plaque, bande)
+            if plaque.fin - plaque.position < bandes[-1].hauteur:
+                ouvertes.remove(plaque)
+        return plaques, non_placees
@@ -0,0 +1,283 @@
+"""
+Moteur de découpe de barres (cutting stock 1D)
+- Best Fit Decreasing comme solution de base
+- Génération de schémas par sac à dos exact (programmation dynamique sur bitset),
+  chaque schéma étant répété autant de fois que la demande le permet
+- Les barres identiques sont regroupées en schéma x multiplicité
+- Les pièces identiques sont traitées par séries (voir pieces.TypePiece)
+- Plusieurs longueurs de barres (neuves, en stock, chutes), chacune avec sa
+  quantité et son coût : à chaque étape, un seul sac à dos calculé jusqu'à la
+  plus grande longueur donne le meilleur schéma de toutes les longueurs, et le
+  schéma au plus faible coût par mm de pièces est retenu (SolveurBarresMixtes)
+"""
+from bisect import bisect_left, insort
+from collections import Counter
+from decimal import Decimal
+from math import gcd
+from typing import List, Dict, Optional, Tuple
+
+from .dimensions import en_dixiemes_piece, en_dixiemes_source, en_mm
+from .pieces import TypePiece, regrouper_pieces
+
+
+class SolveurBarres:
+    """Résout un débit de barres de longueur unique"""
+
+    def __init__(self, longueur_barre: Decimal, epaisseur_lame: Decimal = Decimal('3')):
+        self.capacite = en_dixiemes_source(longueur_barre)
+        self.lame = en_dixiemes_piece(epaisseur_lame)
+
+    def preparer_types(self, pieces: List[Dict]) -> Tuple[List[TypePiece], Dict[int, int], List[Dict]]:
+        """
+        Regroupe les pièces par (longueur, nom)
+
+        Returns:
+            (types de pièces, demande par index de type, pièces trop longues)
+        """
+        types = []
+        demandes = Counter()
+        trop_longues = []
+        for type_piece in regrouper_pieces(pieces):
+            if type_piece.longueur + self.lame > self.capacite:
+                trop_longues.append({
+                    'longueur': en_mm(type_piece.longueur),
+                    'nom': type_piece.nom,
+                    'quantite': type_piece.quantite,
+                })
+                continue
+            demandes[len(types)] = type_piece.quantite
+            types.append(type_piece)
+        return types, demandes, trop_longues
+
+    def _poids(self, types: List[TypePiece], t: int) -> int:
+        return types[t].longueur + self.lame
+
+    def borne_inferieure(self, types, demandes) -> int:
+        """Nombre minimum théorique de barres (borne continue)"""
+        total = sum(self._poids(types, t) * q for t, q in demandes.items())
+        return -(-total // self.capacite) if total else 0
+
+    def best_fit_decreasing(self, types, demandes) -> List[Tuple[Tuple, int]]:
+        """
+        Chaque pièce va dans la barre ouverte qui lui laisse le plus petit reste
+
+        Les pièces identiques sont posées par séries : la barre retenue reste la
+        meilleure tant qu'elle peut en recevoir, on y met donc d'un coup toutes
+        celles qui rentrent, et les barres neuves remplies d'un seul type sont
+        créées en une fois avec leur multiplicité.
+        """
+        poids_min = min(self._poids(types, t) for t in demandes)
+        residus = []  # liste triée de (reste, index_barre)
+        barres = []
+        pleines = Counter()  # schémas des barres qui ne peuvent plus rien recevoir
+        for t in sorted(demandes, key=lambda t: self._poids(types, t), reverse=True):
+            poids = self._poids(types, t)
+            restant = demandes[t]
+            while restant:
+                i = bisect_left(residus, (poids, -1))
+                if i < len(residus):
+                    reste, index = residus.pop(i)
+                    nombre = min(restant, reste // poids)
+                    barres[index][t] += nombre
+                    restant -= nombre
+                    if reste - nombre * poids >= poids_min:
+                        insort(residus, (reste - nombre * poids, index))
+                    continue
+
+                par_barre = self.capacite // poids
+                reste = self.capacite - par_barre * poids
+                if restant >= par_barre and reste < poids_min:
+                    pleines[((t, par_barre),)] += restant // par_barre
+                    restant %= par_barre
+                else:
+                    nombre = min(restant, par_barre)
+                    barres.append(Counter({t: nombre}))
+                    restant -= nombre
+                    insort(residus, (self.capacite - nombre * poids, len(barres) - 1))
+        solution = self._regrouper(barres)
+        for schema, multiplicite in solution:
+            pleines[schema] += multiplicite
+        return list(pleines.items())
+
+    def schemas_sac_a_dos(self, types, demandes) -> List[Tuple[Tuple, int]]:
+        """
+        Procédure séquentielle : à chaque étape, schéma remplissant au mieux une barre
+        (sac à dos borné exact), répété tant que la demande restante le permet
+        """
+        restant = Counter(demandes)
+        poids = {t: self._poids(types, t) for t in restant}
+        pas = 0
+        for p in poids.values():
+            pas = gcd(pas, p)
+        capacite = self.capacite // pas
+        masque = (1 << (capacite + 1)) - 1
+
+        schemas = []
+        while restant:
+            # Décomposition binaire des quantités (sac à dos borné -> 0/1)
+            parts = []
+            for t, q in restant.items():
+                p = poids[t] // pas
+                q = min(q, capacite // p)
+                k = 1
+                while q > 0:
+                    c = min(k, q)
+                    parts.append((t, c, c * p))
+                    q -= c
+                    k *= 2
+
+            atteignables = 1
+            historique = []
+            for _, _, p in parts:
+                historique.append(atteignables)
+                atteignables = (atteignables | (atteignables << p)) & masque
+
+            somme = atteignables.bit_length() - 1
+            schema = Counter()
+            for i in range(len(parts) - 1, -1, -1):
+                if (historique[i] >> somme) & 1:
+                    continue
+                t, c, p = parts[i]
+                schema[t] += c
+                somme -= p
+
+            multiplicite = min(restant[t] // c for t, c in schema.items())
+            for t, c in schema.items():
+                restant[t] -= c * multiplicite
+                if restant[t] == 0:
+                    del restant[t]
+            schemas.append((tuple(sorted(schema.items())), multiplicite))
+        return schemas
+
+    def resoudre(self, types, demandes) -> List[Tuple[Tuple, int]]:
+        """Meilleure solution entre Best Fit Decreasing et les schémas sac à dos"""
+        if not demandes:
+            return []
+        solution = self.best_fit_decreasing(types, demandes)
+        if self.nombre_barres(solution) <= self.borne_inferieure(types, demandes):
+            return solution
+        alternative = self.schemas_sac_a_dos(types, demandes)
+        if (self.nombre_barres(alternative), len(alternative)) < (self.nombre_barres(solution), len(solution)):
+            return alternative
+        return solution
+
+    @staticmethod
+    def nombre_barres(solution: List[Tuple[Tuple, int]]) -> int:
+        return sum(multiplicite for _, multiplicite in solution)
+
+    @staticmethod
+    def _regrouper(barres: List[Counter]) -> List[Tuple[Tuple, int]]:
+        regroupement = Counter(tuple(sorted(barre.items())) for barre in barres)
+        return list(regroupement.items())
+
+
+class BarreSource:
+    """
+    Longueur de barre proposée au solveur (en dixièmes de mm)
+
+    quantite None : barres neuves, sans limite. cout : prix d'une barre (None si inconnu).
+    """
+    __slots__ = ('longueur', 'quantite', 'cout', 'origine', 'reference')
+
+    def __init__(self, longueur: int, quantite: Optional[int] = None, cout: Optional[Decimal] = None,
+                 origine: str = 'neuve', reference: str = None):
+        self.longueur = longueur
+        self.quantite = quantite
+        self.cout = cout
+        self.origine = origine
+        self.reference = reference
+
+
+class SolveurBarresMixtes(SolveurBarres):
+    """
+    Résout un débit sur plusieurs longueurs de barres disponibles
+
+    Objectif 'cout' : coût des barres consommées (les chutes ne coûtent rien) ; il
+    n'est retenu que si toutes les barres neuves et en stock ont un prix. Objectif
+    'chute' (ou prix manquant) : longueur de barres consommée, donc perte minimale.
+    """
+
+    def __init__(self, barres: List[BarreSource], epaisseur_lame: Decimal = Decimal('3'),
+                 objectif: str = 'cout'):
+        self.barres = barres
+        self.lame = en_dixiemes_piece(epaisseur_lame)
+        self.capacite = max(barre.longueur for barre in barres)
+        self.par_cout = objectif == 'cout' and all(
+            barre.cout is not None for barre in barres if barre.origine != 'chute'
+        )
+
+    def cout(self, barre: BarreSource):
+        if not self.par_cout:
+            return barre.longueur
+        return Decimal('0') if barre.origine == 'chute' else barre.cout
+
+    def resoudre(self, types, demandes) -> Tuple[List[Tuple[int, Tuple, int]], Counter]:
+        """
+        Schémas successifs, chacun sur la barre au plus faible coût par longueur remplie
+
+        Returns:
+            ([(index de la barre, schéma, multiplicité)], demande restée sans barre)
+        """
+        restant = Counter({t: q for t, q in demandes.items() if q})
+        disponibles = [barre.quantite for barre in self.barres]
+        poids = {t: self._poids(types, t) for t in restant}
+        pas = 0
+        for p in poids.values():
+            pas = gcd(pas, p)
+        capacite_max = self.capacite // pas if pas else 0
+        masque = (1 << (capacite_max + 1)) - 1
+
+        solution = []
+        while restant:
+            parts = []
+            for t, q in restant.items():
+                p = poids[t] // pas
+                q = min(q, capacite_max // p)
+                k = 1
+                while q > 0:
+                    c = min(k, q)
+                    parts.append((t, c, c * p))
+                    q -= c
+                    k *= 2
+
+            # Un seul sac à dos jusqu'à la plus grande longueur : les sommes atteignables
+            # valent pour toutes les barres plus courtes
+            atteignables = 1
+            historique = []
+            for _, _, p in parts:
+                historique.append(atteignables)
+                atteignables = (atteignables | (atteignables << p)) & masque
+
+            choix = None
+            for index, barre in enumerate(self.barres):
+                if disponibles[index] == 0:
+                    continue
+                capacite = barre.longueur // pas
+                somme = (atteignables & ((1 << (capacite + 1)) - 1)).bit_length() - 1
+                if somme <= 0:
+                    continue
+                score = (self.cout(barre) / somme, -somme / capacite)
+                if choix is None or score < choix[0]:
+                    choix = (score, index, somme)
+            if choix is None:
+                break
+            _, index, somme = choix
+
+            schema = Counter()
+            for i in range(len(parts) - 1, -1, -1):
+                if (historique[i] >> somme) & 1:
+                    continue
+                t, c, p = parts[i]
+                schema[t] += c
+                somme -= p
+
+            multiplicite = min(restant[t] // c for t, c in schema.items())
+            if disponibles[index] is not None:
+                multiplicite = min(multiplicite, disponibles[index])
+                disponibles[index] -= multiplicite
+            for t, c in schema.items():
+                restant[t] -= c * multiplicite
+                if restant[t] == 0:
+                    del restant[t]
+            solution.append((index, tuple(sorted(schema.items())), multiplicite))
+        return solution, restant
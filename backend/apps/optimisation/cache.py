@@ -0,0 +1,302 @@
+"""
+Cache des résultats d'optimisation adressé par contenu
+- La clé est l'empreinte SHA-256 des entrées canoniques du solveur (pièces triées,
+  dimensions source, épaisseur de lame, ré-équerrage, sens de coupe, méthode et
+  version de l'algorithme)
+- Taille bornée avec éviction LRU
+- Backends : mémoire locale, fichiers ou table de base de données
+  (settings.OPTIMISATION_CACHE_BACKEND = 'memoire' | 'fichier' | 'base' | 'aucun')
+- Compteurs de succès / échecs exposés par statistiques()
+"""
+from collections import OrderedDict
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .optimisation_algo import VERSION_ALGORITHME
+
+
+def _normaliser(valeur) -> str:
+    """Représentation canonique d'une dimension : '1000', '1000.0' et 1000 sont équivalents"""
+    decimal = Decimal(str(valeur)).normalize()
+    return format(decimal, 'f')
+
+
+def cle_cache(methode: str, pieces: List[Dict], largeur_source, longueur_source,
+              epaisseur_lame, reequerrage, sens_coupe: str, sources: List[Dict] = None,
+              dimensions_chutes=(), options: Dict = None) -> str:
+    """
+    Empreinte SHA-256 des entrées de l'optimisation
+
+    sources : chutes et stocks proposés ; dimensions_chutes : seuils de chute jetée
+    et facturée ; options : autres réglages du solveur (objectif et prix des barres)
+    """
+    pieces_canoniques = sorted(
+        (
+            _normaliser(piece.get('largeur', 0)),
+            _normaliser(piece['longueur']),
+            int(piece['quantite']),
+            piece.get('nom', ''),
+        )
+        for piece in pieces
+    )
+    contenu = json.dumps([
+        VERSION_ALGORITHME,
+        methode,
+        pieces_canoniques,
+        _normaliser(largeur_source),
+        _normaliser(longueur_source),
+        _normaliser(epaisseur_lame),
+        _normaliser(reequerrage),
+        sens_coupe,
+        [
+            (
+                _normaliser(source['largeur']),
+                _normaliser(source['longueur']),
+                source.get('origine', 'chute'),
+                source.get('reference'),
+                int(source.get('quantite', 1)),
+                None if source.get('prix_unitaire') is None else _normaliser(source['prix_unitaire']),
+            )
+            for source in sources or []
+        ],
+        [_normaliser(dimension) for dimension in dimensions_chutes],
+        sorted((cle, str(valeur)) for cle, valeur in (options or {}).items()),
+    ], separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+def cle_contexte(contexte: Dict, pieces: List[Dict], largeur_source, longueur_source) -> str:
+    """
+    Clé d'un calcul préparé par DebitSerializer._preparer (méthode, réglages, sources
+    et, pour les barres, objectif et prix d'une barre neuve)
+
+    Le débit seul et la comparaison des formats construisent leur clé ici : tout ce
+    qui change le plan ou son coût en fait partie.
+    """
+    optimiseur = contexte['optimiseur']
+    methode = contexte['methode']
+    return cle_cache(
+        methode, pieces, largeur_source, longueur_source,
+        contexte['epaisseur_lame'], contexte['reequerrage'], contexte['sens_coupe'], contexte['sources'],
+        (optimiseur.dimension_chute_jetee, optimiseur.dimension_chute_facturee),
+        {'objectif': contexte['objectif'], 'prix_barre': contexte['prix_barre']} if methode == 'barre' else None,
+    )
+
+
+class CacheResultats:
+    """Interface commune des backends : lecture, écriture et compteurs"""
+
+    def __init__(self, taille_max: int = 500):
+        self.taille_max = taille_max
+        self.succes = 0
+        self.echecs = 0
+        self._verrou = threading.Lock()
+
+    def lire(self, cle: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def ecrire(self, cle: str, resultat: Dict):
+        raise NotImplementedError
+
+    def taille(self) -> int:
+        raise NotImplementedError
+
+    def vider(self):
+        raise NotImplementedError
+
+    def obtenir_ou_calculer(self, cle: str, calcul: Callable[[], Dict]) -> Dict:
+        """Retourne le résultat en cache, ou le calcule et le met en cache"""
+        resultat = self.lire(cle)
+        with self._verrou:
+            if resultat is None:
+                self.echecs += 1
+            else:
+                self.succes += 1
+        if resultat is not None:
+            resultat['depuis_cache'] = True
+            return resultat
+
+        resultat = calcul()
+        if 'erreur' not in resultat:
+            self.ecrire(cle, resultat)
+        return resultat
+
+    def statistiques(self) -> Dict:
+        total = self.succes + self.echecs
+        return {
+            'backend': self.nom,
+            'succes': self.succes,
+            'echecs': self.echecs,
+            'taux_succes': round(self.succes / total * 100, 2) if total else 0,
+            'taille': self.taille(),
+            'taille_max': self.taille_max,
+        }
+
+
+class CacheMemoire(CacheResultats):
+    """Cache LRU en mémoire du processus (résultats stockés en JSON pour être copiés à la lecture)"""
+    nom = 'memoire'
+
+    def __init__(self, taille_max: int = 500):
+        super().__init__(taille_max)
+        self._entrees = OrderedDict()
+
+    def lire(self, cle):
+        with self._verrou:
+            contenu = self._entrees.get(cle)
+            if contenu is None:
+                return None
+            self._entrees.move_to_end(cle)
+        return json.loads(contenu)
+
+    def ecrire(self, cle, resultat):
+        contenu = json.dumps(resultat)
+        with self._verrou:
+            self._entrees[cle] = contenu
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def taille(self):
+        return len(self._entrees)
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+
+class CacheFichier(CacheResultats):
+    """Un fichier JSON par résultat ; la date de modification sert d'horodatage LRU"""
+    nom = 'fichier'
+
+    def __init__(self, repertoire, taille_max: int = 500):
+        super().__init__(taille_max)
+        self.repertoire = Path(repertoire)
+        self.repertoire.mkdir(parents=True, exist_ok=True)
+
+    def _chemin(self, cle):
+        return self.repertoire / f"{cle}.json"
+
+    def lire(self, cle):
+        chemin = self._chemin(cle)
+        try:
+            with open(chemin, encoding='utf-8') as fichier:
+                resultat = json.load(fichier)
+            os.utime(chemin)
+        except (FileNotFoundError, ValueError):
+            return None
+        return resultat
+
+    def ecrire(self, cle, resultat):
+        chemin = self._chemin(cle)
+        temporaire = chemin.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(resultat, fichier)
+        os.replace(temporaire, chemin)
+
+        fichiers = list(self.repertoire.glob('*.json'))
+        if len(fichiers) > self.taille_max:
+            fichiers.sort(key=lambda f: f.stat().st_mtime)
+            for ancien in fichiers[:len(fichiers) - self.taille_max]:
+                ancien.unlink(missing_ok=True)
+
+    def taille(self):
+        return sum(1 for _ in self.repertoire.glob('*.json'))
+
+    def vider(self):
+        for fichier in self.repertoire.glob('*.json'):
+            fichier.unlink(missing_ok=True)
+
+
+class CacheBase(CacheResultats):
+    """Cache partagé entre processus dans la table optimisation_cache_resultats"""
+    nom = 'base'
+
+    def lire(self, cle):
+        from django.db.models import F
+        from .models import ResultatOptimisationCache
+
+        entree = ResultatOptimisationCache.objects.filter(cle=cle).only('resultat').first()
+        if entree is None:
+            return None
+        ResultatOptimisationCache.objects.filter(cle=cle).update(
+            nombre_utilisations=F('nombre_utilisations') + 1,
+            derniere_utilisation=timezone.now(),
+        )
+        return entree.resultat
+
+    def ecrire(self, cle, resultat):
+        from .models import ResultatOptimisationCache
+
+        ResultatOptimisationCache.objects.update_or_create(
+            cle=cle,
+            defaults={'resultat': resultat, 'derniere_utilisation': timezone.now()},
+        )
+        surplus = ResultatOptimisationCache.objects.count() - self.taille_max
+        if surplus > 0:
+            anciennes = ResultatOptimisationCache.objects.order_by('derniere_utilisation').values_list(
+                'cle', flat=True
+            )[:surplus]
+            ResultatOptimisationCache.objects.filter(cle__in=list(anciennes)).delete()
+
+    def taille(self):
+        from .models import ResultatOptimisationCache
+        return ResultatOptimisationCache.objects.count()
+
+    def vider(self):
+        from .models import ResultatOptimisationCache
+        ResultatOptimisationCache.objects.all().delete()
+
+
+class SansCache(CacheResultats):
+    """Cache désactivé : chaque demande relance le solveur"""
+    nom = 'aucun'
+
+    def lire(self, cle):
+        return None
+
+    def ecrire(self, cle, resultat):
+        pass
+
+    def taille(self):
+        return 0
+
+    def vider(self):
+        pass
+
+
+_cache = None
+_verrou_cache = threading.Lock()
+
+
+def obtenir_cache() -> CacheResultats:
+    """Instance unique du cache configuré dans les settings"""
+    global _cache
+    with _verrou_cache:
+        if _cache is None:
+            backend = getattr(settings, 'OPTIMISATION_CACHE_BACKEND', 'memoire')
+            taille_max = getattr(settings, 'OPTIMISATION_CACHE_TAILLE_MAX', 500)
+            if backend == 'fichier':
+                _cache = CacheFichier(settings.OPTIMISATION_CACHE_REPERTOIRE, taille_max)
+            elif backend == 'base':
+                _cache = CacheBase(taille_max)
+            elif backend == 'aucun':
+                _cache = SansCache(taille_max)
+            else:
+                _cache = CacheMemoire(taille_max)
+    return _cache
+
+
+def reinitialiser_cache():
+    """Oublie l'instance courante (changement de settings, tests)"""
+    global _cache
+    with _verrou_cache:
+        _cache = None
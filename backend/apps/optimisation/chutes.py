@@ -0,0 +1,109 @@
+"""
+Extraction des chutes réutilisables d'une plaque après placement
+- Le verre et les panneaux se coupent de bord à bord : une chute n'est utile que si
+  une suite de coupes traversantes la détache. Les chutes sont donc découpées comme
+  les pièces, par les coupes traversantes de chaque zone (coupes_traversantes, voir
+  sequencage.py), et non prises parmi les rectangles vides maximaux, dont le plus
+  grand peut être inaccessible
+- Dans une zone, les bandes vides sont détachées en premier et les parties occupées
+  voisines restent ensemble : la chute garde toute la longueur de la zone au lieu
+  d'être recoupée avec les pièces
+- Le sens des premières coupes est libre : les deux sont évalués, celui qui donne la
+  plus grande chute (puis la suivante...) l'emporte
+- Une zone non guillotine (pièces en moulinet) ne donne aucune chute, même si elle
+  entoure un espace vide
+- Le trait de coupe sépare les parties, les bords ré-équerrés de la plaque sont exclus
+- Chaque zone trie ses pièces : O(n log n) par niveau de découpe, O(n² log n) au pire
+  pour une plaque de n pièces en escalier
+- Tout se fait en entiers (dixièmes de mm, voir dimensions.py)
+"""
+from typing import List, Tuple
+
+from .sequencage import coupes_traversantes, decouper_zone
+
+# Zone par ses coins : (x1, y1, x2, y2)
+Zone = Tuple[int, int, int, int]
+
+
+def _autre(axe: str) -> str:
+    return 'y' if axe == 'x' else 'x'
+
+
+def _regrouper(parties: List[Tuple], axe: str) -> List[Tuple]:
+    """Parties vides seules, parties occupées voisines réunies en une zone"""
+    blocs = []
+    for zone, pieces in parties:
+        if pieces and blocs and blocs[-1][1]:
+            precedente, contenues = blocs[-1]
+            if axe == 'x':
+                zone = (precedente[0], zone[1], zone[2], zone[3])
+            else:
+                zone = (zone[0], precedente[1], zone[2], zone[3])
+            blocs[-1] = (zone, contenues + pieces)
+        else:
+            blocs.append((zone, pieces))
+    return blocs
+
+
+def zones_vides(zone: Zone, pieces: List[Tuple], lame: int, axe: str) -> List[Zone]:
+    """
+    Zones vides d'une zone détachables par coupes traversantes, axe en premier
+
+    pieces : (x, y, largeur, longueur) ; une zone sans coupe possible (pièce seule ou
+    non guillotine) n'en donne aucune.
+    """
+    if not pieces:
+        return [zone]
+    for sens in (axe, _autre(axe)):
+        positions = coupes_traversantes(zone, pieces, sens, lame)
+        if positions:
+            blocs = _regrouper(decouper_zone(zone, pieces, sens, positions, lame), sens)
+            if len(blocs) > 1:
+                return [vide for bloc, contenues in blocs for vide in zones_vides(bloc, contenues, lame, _autre(sens))]
+    # Aucune bande vide à détacher : toutes les coupes d'un sens
+    for sens in (axe, _autre(axe)):
+        positions = coupes_traversantes(zone, pieces, sens, lame)
+        if positions:
+            return [
+                vide
+                for partie, contenues in decouper_zone(zone, pieces, sens, positions, lame)
+                for vide in zones_vides(partie, contenues, lame, _autre(sens))
+            ]
+    return []
+
+
+def extraire_chutes(largeur: int, longueur: int, pieces: List[Tuple], epaisseur_lame: int = 0,
+                    reequerrage: int = 0, cote_min: int = 1) -> List[Tuple[int, int, int, int]]:
+    """
+    Chutes disjointes d'une plaque, détachables par coupes traversantes, de la plus
+    grande à la plus petite
+
+    Args:
+        pieces: placements (x, y, largeur, longueur, ...) de la plaque
+        cote_min: plus petit côté d'une chute conservée (en deçà, elle est jetée)
+
+    Returns:
+        chutes (x, y, largeur, longueur), dans le repère de la plaque
+    """
+    cote_min = max(cote_min, 1)
+    zone_l = largeur - 2 * reequerrage
+    zone_h = longueur - 2 * reequerrage
+    if zone_l < cote_min or zone_h < cote_min:
+        return []
+
+    # Repère de la zone utile
+    placees = [(x - reequerrage, y - reequerrage, l, h) for x, y, l, h in (piece[:4] for piece in pieces)]
+    meilleur = None
+    for axe in ('x', 'y'):
+        chutes = sorted(
+            (
+                (x1 + reequerrage, y1 + reequerrage, x2 - x1, y2 - y1)
+                for x1, y1, x2, y2 in zones_vides((0, 0, zone_l, zone_h), placees, epaisseur_lame, axe)
+                if x2 - x1 >= cote_min and y2 - y1 >= cote_min
+            ),
+            key=lambda c: (-c[2] * c[3], -min(c[2], c[3]), c[1], c[0]),
+        )
+        surfaces = [c[2] * c[3] for c in chutes]
+        if meilleur is None or surfaces > meilleur[0]:
+            meilleur = (surfaces, chutes)
+    return meilleur[1]
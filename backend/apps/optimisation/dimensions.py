@@ -0,0 +1,42 @@
+"""
+Représentation interne des dimensions en virgule fixe
+- Toutes les dimensions sont converties une seule fois en dixièmes de mm (int)
+- Les boucles de placement ne manipulent que des entiers
+- Les cotes qui consomment de la matière (pièces, trait de lame, ré-équerrage) sont
+  arrondies au dixième supérieur, celles des plaques et barres sources au dixième
+  inférieur : une pièce qui tient sur le plan tient aussi sur la scie
+- La reconversion en mm (float / Decimal) n'a lieu qu'à la construction du résultat
+"""
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_EVEN
+
+PRECISION = 10  # dixièmes de mm
+
+
+def en_dixiemes(valeur, arrondi: str = ROUND_HALF_EVEN) -> int:
+    """Convertit une dimension en mm (Decimal, float, int ou str) en dixièmes de mm"""
+    return int((Decimal(str(valeur)) * PRECISION).to_integral_value(rounding=arrondi))
+
+
+def en_dixiemes_piece(valeur) -> int:
+    """Cote d'une pièce, d'un trait de lame ou d'un ré-équerrage : arrondi supérieur"""
+    return en_dixiemes(valeur, ROUND_CEILING)
+
+
+def en_dixiemes_source(valeur) -> int:
+    """Cote d'une plaque, d'une chute ou d'une barre source : arrondi inférieur"""
+    return en_dixiemes(valeur, ROUND_FLOOR)
+
+
+def en_mm(dixiemes: int) -> float:
+    """Convertit des dixièmes de mm en mm (float, pour les plans JSON)"""
+    return dixiemes / PRECISION
+
+
+def en_decimal(dixiemes: int) -> Decimal:
+    """Convertit des dixièmes de mm en mm (Decimal, pour les champs des modèles)"""
+    return Decimal(dixiemes) / PRECISION
+
+
+def surface_en_mm2(surface_dixiemes: int) -> Decimal:
+    """Convertit une surface en dixièmes de mm² (unité²) en mm²"""
+    return Decimal(surface_dixiemes) / (PRECISION * PRECISION)
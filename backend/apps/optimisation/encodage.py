@@ -0,0 +1,198 @@
+"""
+Encodage compact en colonnes des plans de coupe
+- Une liste de dicts devient une table : une colonne par clé
+- Colonnes numériques en tableaux d'entiers (dimensions au dixième de mm),
+  à défaut en flottants 64 bits
+- Autres valeurs (noms, origines, booléens...) : dictionnaire + tableau d'index
+- Listes de dicts imbriquées (pièces d'une plaque) : table aplatie + nombre
+  d'éléments par ligne
+- L'ensemble (en-tête JSON + tableaux) est compressé par zlib
+
+Le décodage restitue la liste de dicts d'origine (clés et leur ordre, valeurs ;
+une colonne mêlant entiers et décimaux est restituée en flottants).
+"""
+from array import array
+from typing import Dict, List
+import json
+import math
+import struct
+import zlib
+
+FORMAT = b'PC1'
+ABSENT = -(2 ** 63)  # valeur d'une clé absente dans une colonne d'entiers
+
+
+class _Manquant:
+    """Marque une clé absente d'une ligne"""
+
+
+_MANQUANT = _Manquant()
+
+
+class _Tampon:
+    """Accumule les tableaux binaires et leurs positions"""
+
+    def __init__(self):
+        self.morceaux = []
+        self.taille = 0
+
+    def ajouter(self, tableau: array) -> List:
+        """Position du tableau dans le tampon : [début, taille en octets, type d'élément]"""
+        donnees = tableau.tobytes()
+        position = [self.taille, len(donnees), tableau.typecode]
+        self.morceaux.append(donnees)
+        self.taille += len(donnees)
+        return position
+
+
+def _entiers(valeurs: List[int]) -> array:
+    tableau = array('i')
+    try:
+        tableau.extend(valeurs)
+    except OverflowError:
+        tableau = array('q', valeurs)
+    return tableau
+
+
+def _entiers_signes(valeurs: List[int]) -> array:
+    # La valeur ABSENT ne tient que sur 64 bits
+    if ABSENT in valeurs:
+        return array('q', valeurs)
+    return _entiers(valeurs)
+
+
+def _est_nombre(valeur) -> bool:
+    return isinstance(valeur, (int, float)) and not isinstance(valeur, bool)
+
+
+def _en_dixiemes(valeur) -> int:
+    dixiemes = round(valeur * 10)
+    return dixiemes if math.isclose(dixiemes, valeur * 10, abs_tol=1e-6) else None
+
+
+def _encoder_colonne(valeurs: List, tampon: _Tampon) -> Dict:
+    presentes = [v for v in valeurs if v is not _MANQUANT]
+    if presentes and all(isinstance(v, list) and all(isinstance(e, dict) for e in v) for v in presentes):
+        nombres = [len(v) if v is not _MANQUANT else -1 for v in valeurs]
+        lignes = [e for v in presentes for e in v]
+        return {'type': 'table', 'nombres': tampon.ajouter(_entiers(nombres)), 'table': _encoder_table(lignes, tampon)}
+
+    if presentes and all(_est_nombre(v) for v in presentes):
+        if all(isinstance(v, int) for v in presentes):
+            entiers = [v if v is not _MANQUANT else ABSENT for v in valeurs]
+            return {'type': 'entier', 'echelle': 1, 'donnees': tampon.ajouter(_entiers_signes(entiers))}
+        dixiemes = [_en_dixiemes(v) if v is not _MANQUANT else ABSENT for v in valeurs]
+        if None not in dixiemes:
+            return {'type': 'entier', 'echelle': 10, 'donnees': tampon.ajouter(_entiers_signes(dixiemes))}
+        flottants = [float(v) if v is not _MANQUANT else math.nan for v in valeurs]
+        absents = [i for i, v in enumerate(valeurs) if v is _MANQUANT]
+        return {'type': 'flottant', 'absents': absents, 'donnees': tampon.ajouter(array('d', flottants))}
+
+    dictionnaire = {}
+    index = []
+    for valeur in valeurs:
+        if valeur is _MANQUANT:
+            index.append(-1)
+            continue
+        cle = json.dumps(valeur, sort_keys=False, ensure_ascii=False)
+        index.append(dictionnaire.setdefault(cle, len(dictionnaire)))
+    return {
+        'type': 'dictionnaire',
+        'valeurs': [json.loads(cle) for cle in dictionnaire],
+        'index': tampon.ajouter(_entiers(index)),
+    }
+
+
+def _encoder_table(lignes: List[Dict], tampon: _Tampon) -> Dict:
+    cles = []
+    for ligne in lignes:
+        for cle in ligne:
+            if cle not in cles:
+                cles.append(cle)
+    colonnes = []
+    for cle in cles:
+        valeurs = [ligne.get(cle, _MANQUANT) for ligne in lignes]
+        colonne = _encoder_colonne(valeurs, tampon)
+        colonne['cle'] = cle
+        colonnes.append(colonne)
+    # Ordre des clés propre à chaque ligne, s'il diffère de l'ordre des colonnes
+    ordres = {}
+    for i, ligne in enumerate(lignes):
+        attendu = [cle for cle in cles if cle in ligne]
+        if list(ligne) != attendu:
+            ordres[i] = list(ligne)
+    return {'lignes': len(lignes), 'colonnes': colonnes, 'ordres': ordres}
+
+
+def encoder_plan(plan: List[Dict]) -> bytes:
+    """Encode une liste de dicts (plan de coupe) en binaire compact"""
+    tampon = _Tampon()
+    entete = json.dumps(_encoder_table(plan or [], tampon), separators=(',', ':'), ensure_ascii=False).encode()
+    contenu = struct.pack('<I', len(entete)) + entete + b''.join(tampon.morceaux)
+    return FORMAT + zlib.compress(contenu, 6)
+
+
+def _lire(donnees: memoryview, position: List) -> array:
+    debut, taille, code = position
+    tableau = array(code)
+    tableau.frombytes(donnees[debut:debut + taille])
+    return tableau
+
+
+def _decoder_colonne(colonne: Dict, donnees: memoryview) -> List:
+    type_colonne = colonne['type']
+    if type_colonne == 'table':
+        nombres = _lire(donnees, colonne['nombres'])
+        elements = _decoder_table(colonne['table'], donnees)
+        valeurs = []
+        debut = 0
+        for nombre in nombres:
+            if nombre < 0:
+                valeurs.append(_MANQUANT)
+                continue
+            valeurs.append(elements[debut:debut + nombre])
+            debut += nombre
+        return valeurs
+    if type_colonne == 'entier':
+        tableau = _lire(donnees, colonne['donnees'])
+        if colonne['echelle'] == 1:
+            return [_MANQUANT if v == ABSENT else v for v in tableau]
+        return [_MANQUANT if v == ABSENT else v / colonne['echelle'] for v in tableau]
+    if type_colonne == 'flottant':
+        valeurs = list(_lire(donnees, colonne['donnees']))
+        for i in colonne['absents']:
+            valeurs[i] = _MANQUANT
+        return valeurs
+    index = _lire(donnees, colonne['index'])
+    valeurs = colonne['valeurs']
+    return [_MANQUANT if i < 0 else valeurs[i] for i in index]
+
+
+def _decoder_table(table: Dict, donnees: memoryview) -> List[Dict]:
+    cles = [colonne['cle'] for colonne in table['colonnes']]
+    colonnes = [_decoder_colonne(colonne, donnees) for colonne in table['colonnes']]
+    resultat = []
+    for i in range(table['lignes']):
+        ligne = {}
+        for cle, valeurs in zip(cles, colonnes):
+            valeur = valeurs[i]
+            if valeur is not _MANQUANT:
+                ligne[cle] = valeur
+        ordre = table['ordres'].get(str(i))
+        if ordre:
+            ligne = {cle: ligne[cle] for cle in ordre}
+        resultat.append(ligne)
+    return resultat
+
+
+def decoder_plan(contenu: bytes) -> List[Dict]:
+    """Décode un plan encodé par encoder_plan"""
+    if not contenu:
+        return []
+    contenu = bytes(contenu)
+    if not contenu.startswith(FORMAT):
+        raise ValueError("Format de plan de coupe inconnu")
+    brut = zlib.decompress(contenu[len(FORMAT):])
+    taille_entete = struct.unpack_from('<I', brut)[0]
+    table = json.loads(brut[4:4 + taille_entete])
+    return _decoder_table(table, memoryview(brut)[4 + taille_entete:])
@@ -0,0 +1,235 @@
+"""
+Export des plans de coupe vers les machines (ASCII, CSV scie, G-code)
+- Chaque dialecte est un générateur de lignes : le fichier est produit plaque par
+  plaque, sans être construit en mémoire
+- Le même générateur alimente une StreamingHttpResponse, un fichier sur disque
+  ou une archive ZIP (tous les débits d'un lancement)
+- Une plaque partagée par les débits d'un lancement (lots.py) n'est programmée
+  qu'une fois, par son débit principal : les renvois des autres débits sont ignorés
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Iterator
+import zipfile
+
+from django.conf import settings
+from django.utils.text import slugify
+
+
+def _mm(valeur) -> str:
+    return f"{float(valeur):.1f}"
+
+
+def est_plan_barres(plan) -> bool:
+    """Les plans de barres placent leurs pièces par 'position' au lieu de (x, y)"""
+    return any('position' in piece for plaque in plan or [] for piece in plaque['pieces'][:1])
+
+
+def plaques_a_couper(plan) -> Iterator[Dict]:
+    """Plaques du plan, sans les renvois vers une plaque partagée portée par un autre débit"""
+    return (plaque for plaque in plan or [] if plaque.get('principal', True))
+
+
+class Dialecte:
+    """Format de fichier de coupe : en-tête, bloc par plaque (ou barre), fin"""
+    nom = ''
+    extension = 'txt'
+    type_fichier = 'cnc'  # 'ascii' : fichier_ascii_path, 'cnc' : fichier_cnc_path
+    barres = True  # le dialecte sait décrire les débits de barres
+
+    def entete(self, debit) -> Iterator[str]:
+        return iter(())
+
+    def plaque(self, plaque: Dict) -> Iterator[str]:
+        raise NotImplementedError
+
+    def barre(self, barre: Dict) -> Iterator[str]:
+        raise NotImplementedError
+
+    def fin(self, debit) -> Iterator[str]:
+        return iter(())
+
+
+class DialecteAscii(Dialecte):
+    """Listing texte lisible à l'atelier"""
+    nom = 'ascii'
+    extension = 'txt'
+    type_fichier = 'ascii'
+
+    def entete(self, debit):
+        lancement = debit.lancement
+        yield f"DEBIT {debit.numero_debit}\n"
+        yield f"AFFAIRE {lancement.affaire.numero_affaire} LANCEMENT {lancement.numero_lancement}\n"
+        yield f"MATIERE {lancement.matiere.code}\n"
+        yield f"SOURCE {_mm(debit.largeur_source)} x {_mm(debit.longueur_source)}\n"
+        yield f"PLAQUES {debit.nombre_plaques_necessaires} TAUX {float(debit.taux_utilisation):.2f}\n"
+
+    def plaque(self, plaque):
+        yield (
+            f"\nPLAQUE {plaque['numero']} {_mm(plaque['largeur'])} x {_mm(plaque['longueur'])}"
+            f" {plaque.get('origine', 'neuve').upper()}\n"
+        )
+        for piece in plaque['pieces']:
+            rotation = ' R90' if piece.get('rotation') else ''
+            yield (
+                f"  {_mm(piece['x']):>8} {_mm(piece['y']):>8} {_mm(piece['largeur']):>8}"
+                f" {_mm(piece['longueur']):>8}{rotation} {piece.get('nom', '')}\n"
+            )
+        if plaque.get('sequence'):
+            yield f"  COUPES {len(plaque['sequence'])} ROTATIONS {plaque.get('rotations', 0)} TEMPS {plaque.get('temps_usinage_s', 0)} s\n"
+            for coupe in plaque['sequence']:
+                rotation = ' R90' if coupe.get('rotation') else ''
+                yield (
+                    f"  {coupe['ordre']:>4} N{coupe['niveau']} {coupe['axe'].upper()} {_mm(coupe['position']):>8}"
+                    f" {_mm(coupe['debut']):>8} {_mm(coupe['fin']):>8}{rotation}\n"
+                )
+
+    def barre(self, barre):
+        yield f"\nBARRE {barre['numero']} {_mm(barre['longueur'])} x{barre.get('quantite', 1)}\n"
+        for piece in barre['pieces']:
+            yield f"  {_mm(piece['position']):>8} {_mm(piece['longueur']):>8} {piece.get('nom', '')}\n"
+
+    def fin(self, debit):
+        yield "\nFIN\n"
+
+
+class DialecteCsv(Dialecte):
+    """Liste de coupe pour scies à panneaux et tronçonneuses (CSV ';', un enregistrement par ligne)"""
+    nom = 'csv'
+    extension = 'csv'
+
+    def entete(self, debit):
+        yield "TYPE;NUMERO;X;Y;LARGEUR;LONGUEUR;ROTATION;QUANTITE;NOM\n"
+
+    def plaque(self, plaque):
+        yield f"PLAQUE;{plaque['numero']};;;{_mm(plaque['largeur'])};{_mm(plaque['longueur'])};;1;\n"
+        for piece in plaque['pieces']:
+            rotation = 90 if piece.get('rotation') else 0
+            yield (
+                f"PIECE;{plaque['numero']};{_mm(piece['x'])};{_mm(piece['y'])};"
+                f"{_mm(piece['largeur'])};{_mm(piece['longueur'])};{rotation};1;{piece.get('nom', '')}\n"
+            )
+
+    def barre(self, barre):
+        quantite = barre.get('quantite', 1)
+        yield f"BARRE;{barre['numero']};;;;{_mm(barre['longueur'])};;{quantite};\n"
+        for piece in barre['pieces']:
+            yield f"PIECE;{barre['numero']};{_mm(piece['position'])};;;{_mm(piece['longueur'])};0;{quantite};{piece.get('nom', '')}\n"
+
+
+class DialecteGcode(Dialecte):
+    """Table de découpe verre : contour de chaque pièce en G-code (G90, mm)"""
+    nom = 'gcode'
+    extension = 'nc'
+    barres = False
+
+    def entete(self, debit):
+        yield f"(DEBIT {debit.numero_debit})\n"
+        yield "G21\nG90\n"
+
+    def plaque(self, plaque):
+        yield f"(PLAQUE {plaque['numero']} {_mm(plaque['largeur'])} x {_mm(plaque['longueur'])})\n"
+        yield "M0\n"  # chargement de la plaque
+        for piece in plaque['pieces']:
+            x, y = float(piece['x']), float(piece['y'])
+            x2, y2 = x + float(piece['largeur']), y + float(piece['longueur'])
+            yield f"(PIECE {piece.get('nom', '')})\n"
+            yield f"G0 X{_mm(x)} Y{_mm(y)}\nM3\n"
+            yield f"G1 X{_mm(x2)} Y{_mm(y)}\nG1 X{_mm(x2)} Y{_mm(y2)}\nG1 X{_mm(x)} Y{_mm(y2)}\nG1 X{_mm(x)} Y{_mm(y)}\n"
+            yield "M5\n"
+
+    def fin(self, debit):
+        yield "G0 X0 Y0\nM30\n"
+
+
+DIALECTES = {dialecte.nom: dialecte for dialecte in (DialecteAscii, DialecteCsv, DialecteGcode)}
+
+
+def obtenir_dialecte(nom: str) -> Dialecte:
+    if nom not in DIALECTES:
+        raise ValueError(f"Dialecte inconnu : {nom} (disponibles : {', '.join(DIALECTES)})")
+    return DIALECTES[nom]()
+
+
+def lignes_programme(debit, dialecte: Dialecte) -> Iterator[str]:
+    """Programme de coupe du débit, produit plaque par plaque"""
+    plan = debit.plan_coupe or []
+    barres = est_plan_barres(plan)
+    if barres and not dialecte.barres:
+        raise ValueError(f"Le dialecte {dialecte.nom} ne gère pas les débits de barres")
+    yield from dialecte.entete(debit)
+    for plaque in plaques_a_couper(plan):
+        yield from (dialecte.barre(plaque) if barres else dialecte.plaque(plaque))
+    yield from dialecte.fin(debit)
+
+
+def nom_fichier(debit, dialecte: Dialecte) -> str:
+    lancement = debit.lancement
+    base = slugify(f"{lancement.affaire.numero_affaire}-{lancement.numero_lancement}-{debit.numero_debit}")
+    return f"{base}.{dialecte.extension}"
+
+
+def enregistrer_programme(debit, dialecte: Dialecte) -> Path:
+    """Écrit le programme dans MEDIA_ROOT/exports et renseigne fichier_ascii_path ou fichier_cnc_path"""
+    repertoire = Path(settings.MEDIA_ROOT) / 'exports'
+    repertoire.mkdir(parents=True, exist_ok=True)
+    chemin = repertoire / nom_fichier(debit, dialecte)
+    temporaire = chemin.with_suffix(chemin.suffix + '.tmp')
+    with open(temporaire, 'w', encoding='utf-8', newline='') as fichier:
+        for ligne in lignes_programme(debit, dialecte):
+            fichier.write(ligne)
+    temporaire.replace(chemin)
+
+    champ = 'fichier_ascii_path' if dialecte.type_fichier == 'ascii' else 'fichier_cnc_path'
+    setattr(debit, champ, str(chemin.relative_to(settings.MEDIA_ROOT)))
+    debit.save(update_fields=[champ, 'updated_at'])
+    return chemin
+
+
+def octets(lignes: Iterable[str], taille_bloc: int = 64 * 1024) -> Iterator[bytes]:
+    """Regroupe les lignes en blocs d'octets pour la réponse HTTP"""
+    bloc = []
+    taille = 0
+    for ligne in lignes:
+        donnees = ligne.encode('utf-8')
+        bloc.append(donnees)
+        taille += len(donnees)
+        if taille >= taille_bloc:
+            yield b''.join(bloc)
+            bloc, taille = [], 0
+    if bloc:
+        yield b''.join(bloc)
+
+
+class _FluxZip:
+    """Fichier en écriture seule dont le contenu est relevé au fil de l'eau"""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def write(self, donnees):
+        self.morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def flush(self):
+        pass
+
+    def relever(self) -> bytes:
+        donnees = b''.join(self.morceaux)
+        self.morceaux = []
+        return donnees
+
+
+def archive_lancement(debits, dialecte: Dialecte) -> Iterator[bytes]:
+    """Archive ZIP des programmes de tous les débits, produite débit par débit"""
+    flux = _FluxZip()
+    with zipfile.ZipFile(flux, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for debit in debits:
+            if not any(plaques_a_couper(debit.plan_coupe)):
+                continue
+            with archive.open(nom_fichier(debit, dialecte), 'w') as fichier:
+                for bloc in octets(lignes_programme(debit, dialecte)):
+                    fichier.write(bloc)
+                    donnees = flux.relever()
+                    if donnees:
+                        yield donnees
+    yield flux.relever()
@@ -0,0 +1,311 @@
+"""
+Choix du format source d'un débit
+- Les formats candidats sont le format standard de la matière et les formats
+  distincts de ses stocks disponibles ; un candidat 'mixte' consomme d'abord
+  les stocks (quantités réelles) puis le format le moins cher au mm² (au mm pour
+  les barres, voir barres.SolveurBarresMixtes)
+- Un format en stock n'est utilisé que dans la limite des quantités disponibles :
+  ses stocks sont proposés au moteur comme sources, les plaques (ou barres)
+  au-delà sont des neuves du format, achetées au prix de la matière au prorata
+  ('plaques_neuves' du candidat)
+- Chaque format est optimisé avec la méthode des paramètres du lancement ; les
+  calculs absents du cache sont lancés simultanément dans un ProcessPoolExecutor
+- Les plans sont classés par pièces non placées, puis coût (prix du stock consommé,
+  prix_neuve des plaques ou barres neuves, chutes gratuites), puis surface consommée
+- Appliquer un format réserve les stocks du plan retenu (voir sources.py)
+- La comparaison d'un débit volumineux est une tâche de fond (taches.py)
+- Sans prix sur le stock, le prix d'un format est déduit de celui de la matière
+  au prorata de la surface (ou de la longueur) de son format standard
+"""
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import os
+
+from django.conf import settings
+
+from .cache import cle_contexte, obtenir_cache
+from .models import StockMatiere
+from .sources import prix_au_prorata
+
+TYPES_PLAQUES = ['plaque', 'panneau', 'tole', 'vitrage', 'plastique']
+
+
+def formats_disponibles(matiere, epaisseur=None) -> List[Dict]:
+    """
+    Formats source de la matière : format standard, puis formats distincts en stock
+
+    Returns:
+        dicts 'cle', 'largeur', 'longueur', 'origine' ('standard' ou 'stock'),
+        'prix_unitaire' (Decimal ou None, le moins cher du stock pour un format en
+        stock), 'prix_neuve' (prix d'une plaque ou barre neuve du format),
+        'quantite_stock' et 'stocks' (id, quantité disponible, prix)
+    """
+    barres = matiere.type_matiere not in TYPES_PLAQUES
+    formats = {}
+    if matiere.longueur_standard and (barres or matiere.largeur_standard):
+        largeur = matiere.largeur_standard or Decimal('0')
+        formats[(largeur, matiere.longueur_standard)] = {
+            'largeur': largeur,
+            'longueur': matiere.longueur_standard,
+            'origine': 'standard',
+            'prix_unitaire': matiere.prix_unitaire,
+            'quantite_stock': 0,
+            'stocks': [],
+        }
+
+    filtres = {'matiere_id': matiere.id, 'statut': 'disponible'}
+    if epaisseur is not None:
+        filtres['epaisseur'] = epaisseur
+    stocks = (
+        StockMatiere.objects.filter(**filtres)
+        .order_by('largeur', 'longueur')
+        .values_list('id', 'largeur', 'longueur', 'quantite', 'quantite_reservee', 'prix_unitaire')
+    )
+    for id_stock, largeur, longueur, quantite, quantite_reservee, prix in stocks:
+        format_ = formats.setdefault((largeur, longueur), {
+            'largeur': largeur,
+            'longueur': longueur,
+            'origine': 'stock',
+            'prix_unitaire': None,
+            'quantite_stock': 0,
+            'stocks': [],
+        })
+        disponible = max(quantite - quantite_reservee, 0)
+        if prix is None:
+            prix = prix_au_prorata(matiere, largeur, longueur, barres)
+        format_['quantite_stock'] += disponible
+        format_['stocks'].append((str(id_stock), disponible, prix))
+        if prix is not None and (format_['prix_unitaire'] is None or prix < format_['prix_unitaire']):
+            format_['prix_unitaire'] = prix
+
+    for (largeur, longueur), format_ in formats.items():
+        format_['cle'] = f"{largeur.normalize():f}x{longueur.normalize():f}"
+        if format_['origine'] == 'standard':
+            format_['prix_neuve'] = matiere.prix_unitaire
+        else:
+            # Au-delà du stock, le format s'achète au prix de la matière
+            format_['prix_neuve'] = prix_au_prorata(matiere, largeur, longueur, barres)
+            if format_['prix_neuve'] is None:
+                format_['prix_neuve'] = format_['prix_unitaire']
+    return list(formats.values())
+
+
+def _sources_stock(formats: List[Dict]) -> List[Dict]:
+    """Stocks disponibles des formats, au format des sources du moteur"""
+    return [
+        {'largeur': float(f['largeur']), 'longueur': float(f['longueur']), 'origine': 'stock',
+         'reference': reference, 'quantite': disponible,
+         'prix_unitaire': None if prix is None else float(prix)}
+        for f in formats for reference, disponible, prix in f['stocks'] if disponible > 0
+    ]
+
+
+def _optimiser_format(parametres: Tuple) -> Dict:
+    """Point d'entrée des processus : optimise les pièces sur un format source"""
+    from .optimisation_algo import OptimiseurDebit
+
+    (largeur, longueur, epaisseur_lame, reequerrage, chute_jetee, chute_facturee,
+     methode, pieces, sens_coupe, sources, objectif) = parametres
+    optimiseur = OptimiseurDebit(
+        largeur_source=Decimal(largeur),
+        longueur_source=Decimal(longueur),
+        epaisseur_lame=Decimal(epaisseur_lame),
+        reequerrage=Decimal(reequerrage),
+        dimension_chute_jetee=Decimal(chute_jetee),
+        dimension_chute_facturee=Decimal(chute_facturee),
+    )
+    if methode == 'barre':
+        if sources:
+            # Stocks et chutes, puis barres neuves du format (dernière source)
+            return optimiseur.optimiser_barres_mixtes(pieces, sources, objectif)
+        return optimiseur.optimiser_barre(pieces, Decimal(longueur))
+    if methode == 'bandes':
+        return optimiseur.optimiser_bandes(pieces, sens_coupe, sources=sources)
+    if methode == 'portefeuille':
+        # Déjà dans un processus : les heuristiques sont évaluées à la suite
+        return optimiseur.optimiser_portefeuille(pieces, sens_coupe, nb_workers=1, sources=sources)
+    return optimiseur.optimiser_guillotine(pieces, sens_coupe, sources=sources)
+
+
+def _cout(resultat: Dict, format_: Dict, prix_stocks: Dict) -> Optional[Decimal]:
+    """Prix des plaques ou barres consommées par le plan (None si un prix manque)"""
+    cout = Decimal('0')
+    for plaque in resultat.get('plan_coupe', []):
+        origine = plaque.get('origine', 'neuve')
+        if origine == 'chute':
+            continue
+        prix = prix_stocks.get(plaque.get('reference')) if origine == 'stock' else format_['prix_neuve']
+        if prix is None:
+            return None
+        cout += prix * plaque.get('quantite', 1)
+    return cout.quantize(Decimal('0.01'))
+
+
+def _cle_classement(candidat: Dict):
+    """Moins de pièces non placées, puis moins cher (prix connu d'abord), puis moins de matière"""
+    cout = candidat['cout']
+    return (
+        candidat['pieces_non_placees'],
+        cout is None,
+        cout if cout is not None else Decimal('0'),
+        candidat['surface_totale_plaques'],
+    )
+
+
+def comparer_formats(lancement, pieces: List[Dict], sens_coupe: str = None, epaisseur=None,
+                     nb_workers: int = None) -> List[Dict]:
+    """
+    Optimise les pièces sur chaque format disponible et classe les plans par coût
+
+    Returns:
+        candidats classés, du moins cher au plus cher : 'format', 'cout', 'nombre_plaques',
+        'plaques_neuves', 'taux_utilisation', 'pieces_non_placees' (nombre),
+        'surface_totale_plaques' et 'resultat' (résultat complet de l'optimiseur)
+    """
+    from .serializers import DebitSerializer
+
+    matiere = lancement.matiere
+    epaisseur = epaisseur or matiere.epaisseur
+    formats = formats_disponibles(matiere, epaisseur)
+    if not formats:
+        return []
+    plaques = matiere.type_matiere in TYPES_PLAQUES
+
+    prix_stocks = {}
+    for format_ in formats:
+        for reference, _, prix in format_['stocks']:
+            prix_stocks[reference] = prix
+
+    if len(formats) > 1:
+        # Mixte : stocks réels de chaque format, puis plaques (ou barres) neuves du format
+        # le moins cher au mm² (ou au mm)
+        prix_connus = [f for f in formats if f['prix_neuve'] is not None]
+        base = min(
+            prix_connus or formats,
+            key=lambda f: (f['prix_neuve'] or 0) / (f['longueur'] * (f['largeur'] if plaques else 1)),
+        )
+        formats.append({**base, 'cle': 'mixte', 'origine': 'mixte', 'mixte': _sources_stock(formats)})
+
+    cache = obtenir_cache()
+    calculs = []
+    for format_ in formats:
+        contexte = DebitSerializer._preparer(
+            lancement, pieces, format_['largeur'], format_['longueur'], sens_coupe, epaisseur
+        )
+        optimiseur = contexte['optimiseur']
+        # Stocks du format (de tous les formats pour le mixte), dans la limite des quantités
+        sources = contexte['sources']
+        references = {source.get('reference') for source in sources}
+        stocks = format_['mixte'] if 'mixte' in format_ else _sources_stock([format_])
+        sources = sources + [s for s in stocks if s['reference'] not in references]
+        prix = format_['prix_neuve']
+        contexte = {**contexte, 'sources': sources, 'prix_barre': None if prix is None else float(prix)}
+        if contexte['methode'] == 'barre' and sources:
+            # Barres neuves du format en dernière source
+            sources = sources + [{
+                'longueur': float(format_['longueur']),
+                'quantite': None,
+                'prix_unitaire': contexte['prix_barre'],
+            }]
+        tache = (
+            str(format_['largeur']), str(format_['longueur']),
+            str(optimiseur.epaisseur_lame), str(optimiseur.reequerrage),
+            str(optimiseur.dimension_chute_jetee), str(optimiseur.dimension_chute_facturee),
+            contexte['methode'], pieces, contexte['sens_coupe'], sources, contexte['objectif'],
+        )
+        cle = cle_contexte(contexte, pieces, format_['largeur'], format_['longueur'])
+        calculs.append([format_, tache, cle, cache.lire(cle)])
+
+    a_calculer = [calcul for calcul in calculs if calcul[3] is None]
+    if nb_workers is None:
+        nb_workers = getattr(settings, 'OPTIMISATION_NB_WORKERS', None) or os.cpu_count() or 1
+    nb_workers = min(nb_workers, len(a_calculer))
+    if nb_workers <= 1:
+        for calcul in a_calculer:
+            calcul[3] = _optimiser_format(calcul[1])
+    elif a_calculer:
+        with ProcessPoolExecutor(max_workers=nb_workers) as executor:
+            for calcul, resultat in zip(a_calculer, executor.map(_optimiser_format, [c[1] for c in a_calculer])):
+                calcul[3] = resultat
+    for calcul in a_calculer:
+        if 'erreur' not in calcul[3]:
+            cache.ecrire(calcul[2], calcul[3])
+
+    candidats = []
+    for format_, _, _, resultat in calculs:
+        if 'erreur' in resultat:
+            continue
+        candidats.append({
+            'format': {
+                'cle': format_['cle'],
+                'largeur': float(format_['largeur']),
+                'longueur': float(format_['longueur']),
+                'origine': format_['origine'],
+                'prix_unitaire': format_['prix_unitaire'],
+                'prix_neuve': format_['prix_neuve'],
+                'quantite_stock': format_['quantite_stock'],
+            },
+            'cout': _cout(resultat, format_, prix_stocks),
+            'nombre_plaques': resultat.get('nombre_plaques', resultat.get('nombre_barres', 0)),
+            'plaques_neuves': sum(
+                plaque.get('quantite', 1) for plaque in resultat.get('plan_coupe', [])
+                if plaque.get('origine', 'neuve') == 'neuve'
+            ),
+            'taux_utilisation': resultat['taux_utilisation'],
+            'pieces_non_placees': sum(int(p.get('quantite', 1)) for p in resultat.get('pieces_non_placees', [])),
+            'surface_totale_plaques': resultat.get('surface_totale_plaques', resultat.get('longueur_totale_barres', 0)),
+            'resultat': resultat,
+        })
+    candidats.sort(key=_cle_classement)
+    return candidats
+
+
+def classement(candidats: List[Dict]) -> List[Dict]:
+    """Candidats sans leur résultat complet, prêts pour une réponse ou une tâche (JSON)"""
+    lignes = []
+    for candidat in candidats:
+        ligne = {cle: valeur for cle, valeur in candidat.items() if cle != 'resultat'}
+        ligne['format'] = {
+            **ligne['format'],
+            **{
+                cle: None if ligne['format'][cle] is None else float(ligne['format'][cle])
+                for cle in ('prix_unitaire', 'prix_neuve')
+            },
+        }
+        ligne['cout'] = None if ligne['cout'] is None else float(ligne['cout'])
+        lignes.append(ligne)
+    return lignes
+
+
+def choisir_format(candidats: List[Dict], cle: str = None) -> Dict:
+    """Candidat de clé donnée, le moins cher sans clé"""
+    if not cle:
+        return candidats[0]
+    candidat = next((c for c in candidats if c['format']['cle'] == cle), None)
+    if candidat is None:
+        raise ValueError(f"Format inconnu : {cle}")
+    return candidat
+
+
+def appliquer_format(debit, candidat: Dict):
+    """
+    Enregistre sur le débit le plan d'un candidat de comparer_formats (format source compris)
+
+    Les réservations du plan actuel sont rendues et les stocks du candidat réservés dans
+    la même transaction ; si l'un d'eux a été pris entre-temps, SourcesIndisponibles est
+    levée et le débit reste inchangé.
+    """
+    from .serializers import DebitSerializer
+
+    precedent = (debit.largeur_source, debit.longueur_source)
+    if candidat['format']['largeur']:
+        # Une barre sans largeur standard garde la section saisie sur le débit
+        debit.largeur_source = Decimal(str(candidat['format']['largeur']))
+    debit.longueur_source = Decimal(str(candidat['format']['longueur']))
+    try:
+        DebitSerializer._remplacer_resultat(debit, candidat['resultat'])
+    except Exception:
+        debit.largeur_source, debit.longueur_source = precedent
+        raise
+    return debit
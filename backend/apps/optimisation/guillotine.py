@@ -0,0 +1,280 @@
+"""
+Moteur de placement guillotine à rectangles libres
+- Chaque plaque conserve la liste de ses rectangles libres
+- Chaque placement découpe le rectangle utilisé en deux (coupe guillotine)
+- L'épaisseur de lame est retirée à chaque coupe
+- Toutes les plaques ouvertes sont essayées avant d'en ouvrir une nouvelle
+- Le moteur travaille en entiers (dixièmes de mm, voir dimensions.py) ; il accepte
+  aussi des Decimal, ce qui sert de référence au benchmark de virgule fixe
+"""
+from typing import List, Optional, Tuple
+
+from .pieces import TypePiece
+
+
+class SourcePlaque:
+    """
+    Support disponible avant les plaques neuves : chute ou format en stock
+
+    Les chutes sont ouvertes dès le départ ; les formats en stock sont ouverts à la
+    demande, avant toute plaque neuve, dans la limite de leur quantité.
+    """
+    __slots__ = ('largeur', 'longueur', 'origine', 'reference', 'quantite')
+
+    def __init__(self, largeur: int, longueur: int, origine: str = 'chute',
+                 reference: str = None, quantite: int = 1):
+        self.largeur = largeur
+        self.longueur = longueur
+        self.origine = origine
+        self.reference = reference
+        self.quantite = quantite
+
+
+class PlaqueGuillotine:
+    """
+    Plaque en cours de remplissage
+
+    libres : rectangles libres (x, y, largeur, longueur)
+    pieces : placements (x, y, largeur, longueur, nom, rotation)
+    numero : attribué à la première pièce posée (None tant que la plaque est vide)
+    """
+
+    def __init__(self, numero: Optional[int], largeur: int, longueur: int, reequerrage: int = 0,
+                 origine: str = 'neuve', reference: str = None, rang: int = 0):
+        self.numero = numero
+        self.largeur = largeur
+        self.longueur = longueur
+        self.origine = origine
+        self.reference = reference
+        self.rang = rang
+        self.pieces = []
+        self.libres = [(
+            reequerrage,
+            reequerrage,
+            largeur - 2 * reequerrage,
+            longueur - 2 * reequerrage,
+        )]
+        self._calculer_maxima()
+
+    def _calculer_maxima(self):
+        """Plus grandes dimensions libres, pour écarter la plaque sans parcourir ses rectangles"""
+        self.largeur_max = max((r[2] for r in self.libres), default=0)
+        self.longueur_max = max((r[3] for r in self.libres), default=0)
+
+    def chercher_emplacement(self, largeur: int, longueur: int,
+                             rotation: bool = False, regle: str = 'bssf') -> Optional[Tuple]:
+        """
+        Cherche le meilleur rectangle libre selon la règle de placement
+
+        Règles : 'bssf' (Best Short Side Fit), 'baf' (Best Area Fit),
+        'bl' (Bottom-Left, plaques les plus anciennes d'abord)
+
+        Returns:
+            (score, index_rectangle, pivotee) ou None si la pièce ne rentre pas
+        """
+        meilleur = None
+        orientations = [(largeur, longueur, False)]
+        if rotation and largeur != longueur:
+            orientations.append((longueur, largeur, True))
+
+        for index, (x, y, l_libre, h_libre) in enumerate(self.libres):
+            for l_piece, h_piece, pivotee in orientations:
+                if l_piece > l_libre or h_piece > h_libre:
+                    continue
+                reste_l = l_libre - l_piece
+                reste_h = h_libre - h_piece
+                if regle == 'baf':
+                    score = (l_libre * h_libre - l_piece * h_piece, min(reste_l, reste_h))
+                elif regle == 'bl':
+                    score = (self.rang, y, x)
+                else:
+                    score = (min(reste_l, reste_h), max(reste_l, reste_h))
+                if meilleur is None or score < meilleur[0]:
+                    meilleur = (score, index, pivotee)
+        return meilleur
+
+    def placer(self, index: int, largeur: int, longueur: int,
+               epaisseur_lame: int, sens_coupe: str) -> Tuple[int, int]:
+        """
+        Place une pièce dans le coin bas-gauche du rectangle libre et découpe le reste.
+
+        En transversal, la première coupe traverse toute la largeur du rectangle libre ;
+        en longitudinal, elle suit toute sa longueur.
+        """
+        x, y, l_libre, h_libre = self.libres.pop(index)
+        reste_l = l_libre - largeur - epaisseur_lame
+        reste_h = h_libre - longueur - epaisseur_lame
+
+        if sens_coupe == 'transversal':
+            droite = (x + largeur + epaisseur_lame, y, reste_l, longueur)
+            dessus = (x, y + longueur + epaisseur_lame, l_libre, reste_h)
+        else:
+            droite = (x + largeur + epaisseur_lame, y, reste_l, h_libre)
+            dessus = (x, y + longueur + epaisseur_lame, largeur, reste_h)
+
+        for rectangle in (droite, dessus):
+            if rectangle[2] > 0 and rectangle[3] > 0:
+                self.libres.append(rectangle)
+        self._calculer_maxima()
+        return x, y
+
+    def purger(self, dimension_min: int):
+        """Supprime les rectangles libres trop petits pour recevoir la moindre pièce"""
+        self.libres = [
+            r for r in self.libres
+            if r[2] >= dimension_min and r[3] >= dimension_min
+        ]
+        self._calculer_maxima()
+
+
+class PackerGuillotine:
+    """Place une liste de pièces par coupes guillotine (sources éventuelles, puis plaques neuves)"""
+
+    def __init__(self, largeur: int, longueur: int,
+                 epaisseur_lame: int = 0,
+                 reequerrage: int = 0,
+                 sens_coupe: str = 'transversal',
+                 rotation: bool = False,
+                 regle_placement: str = 'bssf'):
+        self.largeur = largeur
+        self.longueur = longueur
+        self.epaisseur_lame = epaisseur_lame
+        self.reequerrage = reequerrage
+        self.sens_coupe = sens_coupe
+        self.rotation = rotation
+        self.regle_placement = regle_placement
+
+    def _nouvelle_plaque(self, rang: int, source: SourcePlaque = None) -> PlaqueGuillotine:
+        if source is None:
+            return PlaqueGuillotine(None, self.largeur, self.longueur, self.reequerrage, rang=rang)
+        # Les chutes ont déjà des bords propres : pas de ré-équerrage
+        reequerrage = 0 if source.origine == 'chute' else self.reequerrage
+        return PlaqueGuillotine(
+            None, source.largeur, source.longueur, reequerrage,
+            origine=source.origine, reference=source.reference, rang=rang,
+        )
+
+    def placer_pieces(self, types: List[TypePiece],
+                      sources: List[SourcePlaque] = None) -> Tuple[List[PlaqueGuillotine], List[TypePiece]]:
+        """
+        Place les types de pièces dans l'ordre fourni
+
+        Les sources (chutes, formats en stock) sont utilisées avant les plaques neuves.
+
+        Les pièces identiques sont posées par blocs : une rangée complète (transversal)
+        ou une colonne complète (longitudinal) du rectangle libre retenu, voire
+        plusieurs rangées/colonnes si la quantité restante le permet.
+
+        Args:
+            types: types de pièces (même unité que la plaque) ; leur quantité est consommée
+
+        Returns:
+            (plaques utilisées, types dont une partie n'a pas pu être placée)
+        """
+        plaques = []
+        ouvertes = []
+        non_placees = []
+        if not types:
+            return plaques, non_placees
+
+        a_la_demande = []
+        rang = 0
+        for source in sources or []:
+            if source.origine == 'chute':
+                for _ in range(source.quantite):
+                    ouvertes.append(self._nouvelle_plaque(rang, source))
+                    rang += 1
+            else:
+                a_la_demande.append([source, source.quantite])
+
+        # Plus petite dimension parmi les types restant à placer (suffixe)
+        minima = [0] * len(types)
+        minimum = None
+        for i in range(len(types) - 1, -1, -1):
+            cote = min(types[i].largeur, types[i].longueur)
+            minimum = cote if minimum is None or cote < minimum else minimum
+            minima[i] = minimum
+        dimension_min = minima[0]
+        lame = self.epaisseur_lame
+
+        for i, type_piece in enumerate(types):
+            if minima[i] > dimension_min:
+                # Les pièces restantes sont plus grandes : on referme les plaques pleines
+                dimension_min = minima[i]
+                for plaque in ouvertes:
+                    plaque.purger(dimension_min)
+                ouvertes = [plaque for plaque in ouvertes if plaque.libres]
+
+            largeur = type_piece.largeur
+            longueur = type_piece.longueur
+            while type_piece.quantite > 0:
+                meilleur = None
+                for plaque in ouvertes:
+                    if (largeur > plaque.largeur_max or longueur > plaque.longueur_max) and not (
+                            self.rotation and longueur <= plaque.largeur_max and largeur <= plaque.longueur_max):
+                        continue
+                    candidat = plaque.chercher_emplacement(largeur, longueur, self.rotation, self.regle_placement)
+                    if candidat is not None and (meilleur is None or candidat[0] < meilleur[0]):
+                        meilleur = (candidat[0], plaque, candidat[1], candidat[2])
+
+                if meilleur is None:
+                    # Format en stock avant plaque neuve
+                    for entree in a_la_demande:
+                        if entree[1] == 0:
+                            continue
+                        plaque = self._nouvelle_plaque(rang, entree[0])
+                        candidat = plaque.chercher_emplacement(largeur, longueur, self.rotation, self.regle_placement)
+                        if candidat is not None:
+                            entree[1] -= 1
+                            break
+                    else:
+                        plaque = self._nouvelle_plaque(rang)
+                        candidat = plaque.chercher_emplacement(largeur, longueur, self.rotation, self.regle_placement)
+                    if candidat is None:
+                        non_placees.append(type_piece)
+                        break
+                    rang += 1
+                    ouvertes.append(plaque)
+                    meilleur = (candidat[0], plaque, candidat[1], candidat[2])
+
+                _, plaque, index, pivotee = meilleur
+                if plaque.numero is None:
+                    plaque.numero = len(plaques) + 1
+                    plaques.append(plaque)
+                l_piece, h_piece = (longueur, largeur) if pivotee else (largeur, longueur)
+                _, _, l_libre, h_libre = plaque.libres[index]
+                par_rangee = (l_libre + lame) // (l_piece + lame)
+                par_colonne = (h_libre + lame) // (h_piece + lame)
+                quantite = type_piece.quantite
+                if self.sens_coupe == 'transversal':
+                    n_x = min(quantite, par_rangee)
+                    n_y = min(quantite // n_x, par_colonne)
+                else:
+                    n_y = min(quantite, par_colonne)
+                    n_x = min(quantite // n_y, par_rangee)
+
+                x, y = plaque.placer(
+                    index,
+                    n_x * l_piece + (n_x - 1) * lame,
+                    n_y * h_piece + (n_y - 1) * lame,
+                    lame,
+                    self.sens_coupe,
+                )
+                rotation = type_piece.rotation != pivotee
+                for colonne in range(n_x):
+                    for rangee in range(n_y):
+                        plaque.pieces.append((
+                            x + colonne * (l_piece + lame),
+                            y + rangee * (h_piece + lame),
+                            l_piece,
+                            h_piece,
+                            type_piece.nom,
+                            rotation,
+                        ))
+                type_piece.quantite -= n_x * n_y
+
+                plaque.purger(dimension_min)
+                if not plaque.libres:
+                    ouvertes.remove(plaque)
+
+        return plaques, non_placees
@@ -0,0 +1,150 @@
+"""
+Ré-optimisation incrémentale d'un débit de plaques après modification de ses pièces
+- Les pièces placées par le plan actuel sont comparées aux pièces demandées
+  (même nom et mêmes dimensions, dans l'orientation du débit)
+- Les pièces en trop sont retirées des plaques les moins remplies qui en portent
+- Les pièces restantes des plaques touchées, les pièces ajoutées et les pièces
+  non placées sont re-placées ensemble ; pour un ajout, les plaques les moins
+  remplies sont rouvertes pour accueillir les nouvelles pièces
+- Les autres plaques sont conservées telles quelles, numéros compris ; les plaques
+  recalculées reprennent les numéros libérés puis les suivants
+- Au-delà de settings.OPTIMISATION_INCREMENTAL_PART_MAX de plaques touchées,
+  la ré-optimisation complète est préférable : None est renvoyé
+"""
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+import time
+
+from django.conf import settings
+
+from .dimensions import en_dixiemes_piece, en_mm
+
+# Plaques peu remplies rouvertes pour recevoir les pièces ajoutées
+PLAQUES_D_ACCUEIL = 2
+
+
+def _cle(nom, largeur, longueur):
+    """Cotes arrondies comme dans regrouper_pieces : une pièce demandée retrouve son placement"""
+    return nom or '', en_dixiemes_piece(largeur or 0), en_dixiemes_piece(longueur)
+
+
+def _cle_placement(piece: Dict):
+    """Clé d'une pièce placée, ramenée à l'orientation du débit"""
+    largeur, longueur = piece['largeur'], piece['longueur']
+    if piece.get('rotation'):
+        largeur, longueur = longueur, largeur
+    return _cle(piece.get('nom'), largeur, longueur)
+
+
+def difference(plan_coupe: List[Dict], pieces: List[Dict]):
+    """
+    Pièces à retirer du plan et pièces à placer en plus
+
+    Returns:
+        (retirees, ajoutees) : Counter par clé (nom, largeur, longueur) en dixièmes de mm
+    """
+    placees = Counter(_cle_placement(piece) for plaque in plan_coupe for piece in plaque['pieces'])
+    demandees = Counter()
+    for piece in pieces:
+        demandees[_cle(piece.get('nom'), piece.get('largeur'), piece['longueur'])] += int(piece['quantite'])
+    return placees - demandees, demandees - placees
+
+
+def _surface(element: Dict) -> float:
+    return element['largeur'] * element['longueur']
+
+
+def _remplissage(plaque: Dict) -> float:
+    return sum(_surface(piece) for piece in plaque['pieces']) / _surface(plaque)
+
+
+def _pieces(compteur: Counter) -> List[Dict]:
+    return [
+        {'largeur': en_mm(largeur), 'longueur': en_mm(longueur), 'quantite': quantite, 'nom': nom}
+        for (nom, largeur, longueur), quantite in compteur.items()
+    ]
+
+
+def reoptimiser(optimiseur, plan_coupe: List[Dict], pieces: List[Dict],
+                sens_coupe: str = 'transversal') -> Optional[Dict]:
+    """
+    Met à jour un plan de coupe guillotine pour une nouvelle liste de pièces
+
+    Returns:
+        résultat au format de OptimiseurDebit.optimiser_guillotine, complété de
+        'incremental' (plaques conservées / recalculées), ou None si trop de plaques
+        sont touchées
+    """
+    debut = time.perf_counter()
+    retirees, ajoutees = difference(plan_coupe, pieces)
+
+    # Retrait des pièces en trop, en commençant par les plaques les moins remplies
+    remplissages = [_remplissage(plaque) for plaque in plan_coupe]
+    porteuses = defaultdict(list)
+    for index, plaque in enumerate(plan_coupe):
+        for cle in {_cle_placement(piece) for piece in plaque['pieces']}:
+            porteuses[cle].append(index)
+    a_retirer = defaultdict(Counter)
+    for cle, quantite in retirees.items():
+        for index in sorted(porteuses[cle], key=lambda i: remplissages[i]):
+            presentes = sum(1 for piece in plan_coupe[index]['pieces'] if _cle_placement(piece) == cle)
+            nombre = min(quantite, presentes)
+            a_retirer[index][cle] += nombre
+            quantite -= nombre
+            if quantite == 0:
+                break
+
+    touchees = set(a_retirer)
+    if ajoutees:
+        libres = sorted((i for i in range(len(plan_coupe)) if i not in touchees), key=lambda i: remplissages[i])
+        touchees.update(libres[:PLAQUES_D_ACCUEIL])
+    if len(touchees) > len(plan_coupe) * getattr(settings, 'OPTIMISATION_INCREMENTAL_PART_MAX', 0.5):
+        return None
+
+    # Pièces à re-placer : celles des plaques touchées (moins les retraits) et les ajouts
+    a_placer = Counter(ajoutees)
+    sources = []
+    for index in touchees:
+        plaque = plan_coupe[index]
+        restantes = Counter(_cle_placement(piece) for piece in plaque['pieces']) - a_retirer[index]
+        a_placer.update(restantes)
+        if plaque.get('origine', 'neuve') != 'neuve':
+            sources.append({
+                'largeur': plaque['largeur'],
+                'longueur': plaque['longueur'],
+                'origine': plaque['origine'],
+                'reference': plaque.get('reference'),
+                'quantite': 1,
+            })
+
+    partiel = optimiseur.optimiser_guillotine(_pieces(a_placer), sens_coupe, sources=sources)
+
+    conservees = [plaque for index, plaque in enumerate(plan_coupe) if index not in touchees]
+    numeros = sorted(plan_coupe[index]['numero'] for index in touchees)
+    suivant = max((plaque['numero'] for plaque in plan_coupe), default=0) + 1
+    for plaque in partiel['plan_coupe']:
+        if numeros:
+            plaque['numero'] = numeros.pop(0)
+        else:
+            plaque['numero'] = suivant
+            suivant += 1
+    plan = sorted(conservees + partiel['plan_coupe'], key=lambda plaque: plaque['numero'])
+
+    surface_pieces = sum(_surface(piece) for plaque in plan for piece in plaque['pieces'])
+    surface_plaques = sum(_surface(plaque) for plaque in plan)
+    return {
+        'plan_coupe': plan,
+        'taux_utilisation': surface_pieces / surface_plaques * 100 if surface_plaques else 0.0,
+        'chutes': [
+            {**chute, 'plaque': plaque['numero']} for plaque in plan for chute in plaque.get('chutes', [])
+        ],
+        'nombre_plaques': len(plan),
+        'surface_totale_pieces': surface_pieces,
+        'surface_totale_plaques': surface_plaques,
+        'pieces_non_placees': partiel['pieces_non_placees'],
+        'incremental': {
+            'plaques_conservees': len(conservees),
+            'plaques_recalculees': len(partiel['plan_coupe']),
+        },
+        'duree_optimisation_ms': round((time.perf_counter() - debut) * 1000, 2),
+    }
@@ -0,0 +1,215 @@
+"""
+Optimisation groupée de tous les débits d'un lancement
+- Les débits d'un lancement partagent matière et paramètres : leurs pièces sont
+  résolues ensemble (un problème par format source / sens de coupe / épaisseur),
+  ce qui réduit le nombre de plaques entamées
+- Chaque pièce placée est ensuite rendue à son débit (champ 'debit' du placement) ;
+  une plaque partagée n'est stockée entière (toutes ses pièces, séquence, chutes,
+  réservation) qu'une fois, dans le plan de son débit principal, celui qui y occupe
+  la plus grande surface ; les autres débits n'en gardent qu'un renvoi
+  ('debit_principal', 'plaque_principale' : position dans le plan du principal)
+  avec leurs seules pièces
+- L'écriture des débits, des chutes et des réservations se fait en une transaction
+"""
+from collections import Counter, defaultdict, deque
+from decimal import Decimal
+from typing import Dict, List
+
+from django.db import transaction
+
+from .dimensions import en_dixiemes_piece
+from .sequencage import sequencer_resultat
+from .sources import liberer_sources, reserver_sources
+
+
+def _cle_piece(piece: Dict, barres: bool = False):
+    """
+    Une pièce se reconnaît à son nom et à ses dimensions, quelle que soit son orientation
+
+    Les cotes sont arrondies comme dans regrouper_pieces, pour retrouver celles du plan ;
+    un plan de barres ne porte que la longueur des pièces.
+    """
+    if barres:
+        return piece.get('nom', ''), (en_dixiemes_piece(piece['longueur']),)
+    dimensions = sorted((en_dixiemes_piece(piece.get('largeur', 0)), en_dixiemes_piece(piece['longueur'])))
+    return piece.get('nom', ''), tuple(dimensions)
+
+
+class _Repartition:
+    """Attribue les pièces placées aux débits, dans l'ordre des débits"""
+
+    def __init__(self, debits, barres: bool = False):
+        self.debits = debits
+        self.barres = barres
+        self.demandes = defaultdict(deque)
+        self.derniers = {}
+        for index, debit in enumerate(debits):
+            for piece in debit.pieces:
+                if int(piece['quantite']) > 0:
+                    self.demandes[_cle_piece(piece, barres)].append([index, int(piece['quantite']), piece])
+
+    def attribuer(self, piece: Dict) -> int:
+        """Débit de la pièce ; une pièce sans demande restante va au dernier débit servi"""
+        cle = _cle_piece(piece, self.barres)
+        file = self.demandes[cle]
+        if not file:
+            return self.derniers.get(cle, 0)
+        entree = file[0]
+        entree[1] -= 1
+        if entree[1] == 0:
+            file.popleft()
+        self.derniers[cle] = entree[0]
+        return entree[0]
+
+    def non_placees(self) -> List[List[Dict]]:
+        """Pièces restant à placer, par débit"""
+        restes = [[] for _ in self.debits]
+        for file in self.demandes.values():
+            for index, quantite, piece in file:
+                restes[index].append({**piece, 'quantite': quantite})
+        return restes
+
+
+def _surface(piece: Dict) -> Decimal:
+    return Decimal(str(piece.get('largeur') or 1)) * Decimal(str(piece['longueur']))
+
+
+def _renvoi(plaque: Dict, pieces: List[Dict], debit_principal: str, position: int) -> Dict:
+    """Part d'un débit secondaire sur une plaque partagée : dimensions, renvoi et ses pièces"""
+    renvoi = {cle: plaque[cle] for cle in ('numero', 'largeur', 'longueur', 'origine', 'quantite') if cle in plaque}
+    renvoi.update({
+        'pieces': pieces,
+        'lot': True,
+        'principal': False,
+        'debit_principal': debit_principal,
+        'plaque_principale': position,
+    })
+    return renvoi
+
+
+def repartir_plan(resultat: Dict, debits) -> List[Dict]:
+    """
+    Découpe le résultat d'une optimisation groupée en un résultat par débit
+
+    Returns:
+        pour chaque débit : {'plan_coupe', 'nombre_plaques', 'pieces_non_placees', 'principal'}
+    """
+    repartition = _Repartition(debits, barres='nombre_barres' in resultat)
+    numeros = [debit.numero_debit for debit in debits]
+    parts = [{'plan_coupe': [], 'nombre_plaques': 0, 'surface_principale': 0} for _ in debits]
+
+    entrees = []
+    for plaque in resultat.get('plan_coupe', []):
+        if 'quantite' in plaque:
+            # Barres : un schéma répété peut servir des débits différents à chaque répétition
+            repetitions = Counter(
+                tuple(repartition.attribuer(piece) for piece in plaque['pieces'])
+                for _ in range(plaque['quantite'])
+            )
+            for attribution, quantite in repetitions.items():
+                entrees.append(({**plaque, 'quantite': quantite}, attribution, quantite))
+        else:
+            attribution = tuple(repartition.attribuer(piece) for piece in plaque['pieces'])
+            entrees.append((plaque, attribution, 1))
+
+    for plaque, attribution, quantite in entrees:
+        surfaces = Counter()
+        for piece, index in zip(plaque['pieces'], attribution):
+            surfaces[index] += _surface(piece)
+        principal = max(surfaces, key=lambda index: (surfaces[index], -index))
+        pieces = [
+            {**piece, 'debit': numeros[index]}
+            for piece, index in zip(plaque['pieces'], attribution)
+        ]
+        position = len(parts[principal]['plan_coupe'])
+        parts[principal]['plan_coupe'].append({**plaque, 'pieces': pieces, 'lot': True, 'principal': True})
+        for index in surfaces:
+            if index != principal:
+                parts[index]['plan_coupe'].append(_renvoi(
+                    plaque, [piece for piece in pieces if piece['debit'] == numeros[index]],
+                    numeros[principal], position,
+                ))
+        parts[principal]['nombre_plaques'] += quantite
+        parts[principal]['surface_principale'] += surfaces[principal] * quantite
+
+    for part, restes in zip(parts, repartition.non_placees()):
+        part['pieces_non_placees'] = restes
+    # Les chutes du lot reviennent au débit qui porte le plus de matière
+    principal = max(range(len(debits)), key=lambda index: (parts[index]['surface_principale'], -index))
+    for index, part in enumerate(parts):
+        part['principal'] = index == principal
+        del part['surface_principale']
+    return parts
+
+
+def _groupes(debits) -> Dict:
+    groupes = defaultdict(list)
+    for debit in debits:
+        if debit.pieces:
+            cle = (debit.largeur_source, debit.longueur_source, debit.sens_coupe, debit.epaisseur)
+            groupes[cle].append(debit)
+    return groupes
+
+
+def pieces_lancement(lancement) -> List[Dict]:
+    """Toutes les pièces des débits d'un lancement"""
+    return [piece for debit in lancement.debits.all() for piece in debit.pieces or []]
+
+
+def optimiser_lancement(lancement) -> Dict:
+    """
+    Optimise ensemble tous les débits du lancement et enregistre la part de chacun
+
+    Returns:
+        synthèse par groupe de débits (format source, nombre de plaques, taux)
+    """
+    from .serializers import DebitSerializer
+
+    debits = list(lancement.debits.order_by('numero_debit', 'created_at'))
+    calculs = []
+    for (largeur, longueur, sens_coupe, epaisseur), groupe in _groupes(debits).items():
+        pieces = [piece for debit in groupe for piece in debit.pieces]
+        resultat = DebitSerializer._resoudre(lancement, pieces, largeur, longueur, sens_coupe, epaisseur)
+        if 'erreur' in resultat:
+            raise RuntimeError(resultat['erreur'])
+        parametres = lancement.parametres
+        sequencer_resultat(resultat, parametres.epaisseur_lame if parametres else Decimal('3'))
+        calculs.append((groupe, resultat))
+
+    synthese = []
+    with transaction.atomic():
+        for debit in debits:
+            liberer_sources(debit.plan_coupe)
+        for groupe, resultat in calculs:
+            reserver_sources(resultat.get('plan_coupe', []))
+            nombre_plaques = resultat.get('nombre_plaques', resultat.get('nombre_barres', 0))
+            lot = {
+                'lancement': str(lancement.id),
+                'debits': [debit.numero_debit for debit in groupe],
+                'nombre_plaques': nombre_plaques,
+                'taux_utilisation': resultat['taux_utilisation'],
+            }
+            for debit, part in zip(groupe, repartir_plan(resultat, groupe)):
+                chutes = resultat.get('chutes', []) if part['principal'] else []
+                debit.resultat_optimisation = {
+                    **{cle: valeur for cle, valeur in resultat.items() if cle != 'plan_coupe'},
+                    'chutes': chutes,
+                    'pieces_non_placees': part['pieces_non_placees'],
+                    'lot': lot,
+                }
+                debit.plan_coupe = part['plan_coupe']
+                debit.taux_utilisation = Decimal(str(resultat['taux_utilisation']))
+                debit.nombre_plaques_necessaires = part['nombre_plaques']
+                debit.chutes_reutilisables = chutes
+                debit.save()
+                DebitSerializer._remplacer_chutes(debit, chutes)
+            synthese.append(lot)
+
+        lancement.statut = 'optimise'
+        lancement.save(update_fields=['statut', 'updated_at'])
+
+    return {
+        'lancement': str(lancement.id),
+        'groupes': synthese,
+        'nombre_plaques': sum(lot['nombre_plaques'] for lot in synthese),
+    }
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0002_affaire_debit_lancement_matiere_parametresdebit_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parametresdebit',
+            name='algorithme_plaques',
+            field=models.CharField(choices=[('guillotine', 'Guillotine'), ('portefeuille', 'Portefeuille multi-heuristiques')], default='guillotine', max_length=20),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 11:12
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0003_parametresdebit_algorithme_plaques'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheOptimisation',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('type_tache', models.CharField(choices=[('debit', 'Débit')], default='debit', max_length=20)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echec', 'Échec')], default='en_attente', max_length=20)),
+                ('progression', models.IntegerField(default=0)),
+                ('resultat', models.JSONField(blank=True, default=dict)),
+                ('erreur', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='taches_optimisation', to=settings.AUTH_USER_MODEL)),
+                ('debit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='taches', to='optimisation.debit')),
+            ],
+            options={
+                'verbose_name': "Tâche d'optimisation",
+                'verbose_name_plural': "Tâches d'optimisation",
+                'db_table': 'optimisation_taches',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
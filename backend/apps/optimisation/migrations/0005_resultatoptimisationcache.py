@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0004_tacheoptimisation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultatOptimisationCache',
+            fields=[
+                ('cle', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('resultat', models.JSONField(default=dict)),
+                ('nombre_utilisations', models.IntegerField(default=0)),
+                ('derniere_utilisation', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Résultat en cache',
+                'verbose_name_plural': 'Résultats en cache',
+                'db_table': 'optimisation_cache_resultats',
+            },
+        ),
+    ]
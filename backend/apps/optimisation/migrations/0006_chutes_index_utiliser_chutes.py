@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0005_resultatoptimisationcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parametresdebit',
+            name='utiliser_chutes',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='chute',
+            index=models.Index(condition=models.Q(('statut', 'disponible')), fields=['matiere', 'epaisseur', 'largeur', 'longueur'], name='chute_disponible_dims_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmatiere',
+            index=models.Index(condition=models.Q(('statut', 'disponible')), fields=['matiere', 'epaisseur', 'largeur', 'longueur'], name='stock_disponible_dims_idx'),
+        ),
+    ]
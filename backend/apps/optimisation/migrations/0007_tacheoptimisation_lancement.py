@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0006_chutes_index_utiliser_chutes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tacheoptimisation',
+            name='lancement',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='taches', to='optimisation.lancement'),
+        ),
+        migrations.AlterField(
+            model_name='tacheoptimisation',
+            name='type_tache',
+            field=models.CharField(choices=[('debit', 'Débit'), ('lancement', 'Lancement')], default='debit', max_length=20),
+        ),
+    ]
@@ -0,0 +1,44 @@
+import apps.optimisation.models
+from django.db import migrations
+
+
+def encoder_plans(apps, schema_editor):
+    """Copie chaque plan JSON dans la colonne compacte et le retire de resultat_optimisation"""
+    Debit = apps.get_model('optimisation', 'Debit')
+    for debit in Debit.objects.only('id', 'plan_coupe', 'resultat_optimisation').iterator():
+        debit.plan_coupe_compact = debit.plan_coupe or []
+        if isinstance(debit.resultat_optimisation, dict):
+            debit.resultat_optimisation.pop('plan_coupe', None)
+        debit.save(update_fields=['plan_coupe_compact', 'resultat_optimisation'])
+
+
+def decoder_plans(apps, schema_editor):
+    Debit = apps.get_model('optimisation', 'Debit')
+    for debit in Debit.objects.only('id', 'plan_coupe_compact').iterator():
+        debit.plan_coupe = debit.plan_coupe_compact
+        debit.save(update_fields=['plan_coupe'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0007_tacheoptimisation_lancement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='debit',
+            name='plan_coupe_compact',
+            field=apps.optimisation.models.PlanCoupeField(),
+        ),
+        migrations.RunPython(encoder_plans, decoder_plans),
+        migrations.RemoveField(
+            model_name='debit',
+            name='plan_coupe',
+        ),
+        migrations.RenameField(
+            model_name='debit',
+            old_name='plan_coupe_compact',
+            new_name='plan_coupe',
+        ),
+    ]
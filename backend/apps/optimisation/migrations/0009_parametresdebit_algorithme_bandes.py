@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0008_debit_plan_coupe_compact'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='parametresdebit',
+            name='algorithme_plaques',
+            field=models.CharField(choices=[('guillotine', 'Guillotine'), ('portefeuille', 'Portefeuille multi-heuristiques'), ('bandes', 'Deux étapes (bandes)')], default='guillotine', max_length=20),
+        ),
+    ]
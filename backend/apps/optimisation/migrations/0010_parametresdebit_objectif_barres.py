@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0009_parametresdebit_algorithme_bandes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parametresdebit',
+            name='objectif_barres',
+            field=models.CharField(choices=[('cout', 'Coût minimal'), ('chute', 'Chute minimale')], default='cout', max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('optimisation', '0010_parametresdebit_objectif_barres'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tacheoptimisation',
+            name='parametres',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='tacheoptimisation',
+            name='type_tache',
+            field=models.CharField(choices=[('debit', 'Débit'), ('lancement', 'Lancement'), ('formats', 'Comparaison des formats')], default='debit', max_length=20),
+        ),
+    ]
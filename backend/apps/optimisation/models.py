@@ -1,8 +1,47 @@
 from django.db import models
+import json
 import uuid
 from django.conf import settings
 from decimal import Decimal
 
+from .encodage import decoder_plan, encoder_plan
+
+
+class PlanCoupeField(models.BinaryField):
+    """
+    Plan de coupe (liste de dicts) stocké en colonnes compressées (voir encodage.py)
+
+    Le plan n'est décodé qu'au chargement du champ : les listes le diffèrent (defer)
+    et seul le détail d'un débit le lit.
+    """
+    description = "Plan de coupe compressé"
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', list)
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return []
+        return decoder_plan(value)
+
+    def to_python(self, value):
+        if value is None:
+            return []
+        if isinstance(value, (bytes, memoryview)):
+            return decoder_plan(value)
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return value
+        return encoder_plan(value or [])
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
 
 class Matiere(models.Model):
     """Bibliothèque de matières pour les débits"""
@@ -56,6 +95,26 @@ class ParametresDebit(models.Model):
         ],
         default='transversal'
     )
+    algorithme_plaques = models.CharField(
+        max_length=20,
+        choices=[
+            ('guillotine', 'Guillotine'),
+            ('portefeuille', 'Portefeuille multi-heuristiques'),
+            ('bandes', 'Deux étapes (bandes)'),
+        ],
+        default='guillotine'
+    )
+    # Barres de plusieurs longueurs : minimiser le coût des barres ou la longueur consommée
+    objectif_barres = models.CharField(
+        max_length=20,
+        choices=[
+            ('cout', 'Coût minimal'),
+            ('chute', 'Chute minimale'),
+        ],
+        default='cout'
+    )
+    # Utiliser les chutes disponibles et les formats en stock avant les plaques neuves
+    utiliser_chutes = models.BooleanField(default=False)
     actif = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -174,8 +233,8 @@ class Debit(models.Model):
     pieces = models.JSONField(default=list)  # Liste de dicts: [{'largeur': 100, 'longueur': 200, 'quantite': 5, 'nom': 'Piece A'}]
     
     # Résultat de l'optimisation
-    resultat_optimisation = models.JSONField(default=dict)  # Détails de l'optimisation
-    plan_coupe = models.JSONField(default=list)  # Plan de coupe détaillé
+    resultat_optimisation = models.JSONField(default=dict)  # Détails de l'optimisation (sans le plan)
+    plan_coupe = PlanCoupeField()  # Plan de coupe détaillé (encodé en colonnes, voir encodage.py)
     taux_utilisation = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # en %
     nombre_plaques_necessaires = models.IntegerField(default=1)
     
@@ -246,6 +305,14 @@ class Chute(models.Model):
         verbose_name = 'Chute'
         verbose_name_plural = 'Chutes'
         ordering = ['-created_at']
+        indexes = [
+            # Recherche des chutes réutilisables par le moteur d'optimisation
+            models.Index(
+                fields=['matiere', 'epaisseur', 'largeur', 'longueur'],
+                name='chute_disponible_dims_idx',
+                condition=models.Q(statut='disponible'),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.matiere.code} - {self.largeur}x{self.longueur}mm"
@@ -293,6 +360,13 @@ class StockMatiere(models.Model):
         verbose_name = 'Stock matière'
         verbose_name_plural = 'Stocks matières'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['matiere', 'epaisseur', 'largeur', 'longueur'],
+                name='stock_disponible_dims_idx',
+                condition=models.Q(statut='disponible'),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.matiere.code} - {self.largeur}x{self.longueur}mm (x{self.quantite})"
@@ -300,3 +374,81 @@ class StockMatiere(models.Model):
     @property
     def quantite_disponible(self):
         return self.quantite - self.quantite_reservee
+
+
+class TacheOptimisation(models.Model):
+    """Optimisation exécutée en arrière-plan (Celery ou pool de threads)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    type_tache = models.CharField(
+        max_length=20,
+        choices=[
+            ('debit', 'Débit'),
+            ('lancement', 'Lancement'),
+            ('formats', 'Comparaison des formats'),
+        ],
+        default='debit'
+    )
+    debit = models.ForeignKey(
+        Debit,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='taches'
+    )
+    lancement = models.ForeignKey(
+        Lancement,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='taches'
+    )
+    statut = models.CharField(
+        max_length=20,
+        choices=[
+            ('en_attente', 'En attente'),
+            ('en_cours', 'En cours'),
+            ('terminee', 'Terminée'),
+            ('echec', 'Échec'),
+        ],
+        default='en_attente'
+    )
+    progression = models.IntegerField(default=0)  # en %
+    parametres = models.JSONField(default=dict, blank=True)  # Options de la tâche (format à appliquer...)
+    resultat = models.JSONField(default=dict, blank=True)
+    erreur = models.TextField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='taches_optimisation'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'optimisation_taches'
+        verbose_name = 'Tâche d\'optimisation'
+        verbose_name_plural = 'Tâches d\'optimisation'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_type_tache_display()} - {self.get_statut_display()} ({self.progression}%)"
+
+
+class ResultatOptimisationCache(models.Model):
+    """Résultat d'optimisation mis en cache, indexé par l'empreinte de ses entrées"""
+    cle = models.CharField(max_length=64, primary_key=True)  # SHA-256 hexadécimal
+    resultat = models.JSONField(default=dict)
+    nombre_utilisations = models.IntegerField(default=0)
+    derniere_utilisation = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'optimisation_cache_resultats'
+        verbose_name = 'Résultat en cache'
+        verbose_name_plural = 'Résultats en cache'
+
+    def __str__(self):
+        return self.cle
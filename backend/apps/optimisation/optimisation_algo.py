@@ -1,12 +1,43 @@
 """
 Algorithmes d'optimisation de débit
 - Bin Packing pour les plaques
-- Guillotine Cut (First Fit, Best Fit)
-- Optimisation linéaire pour les barres
+- Guillotine Cut (rectangles libres, Best Short Side Fit)
+- Débit en deux étapes (bandes remplies par sac à dos)
+- Cutting stock 1D pour les barres (Best Fit Decreasing + schémas sac à dos),
+  sur une ou plusieurs longueurs de barres
 """
+from collections import Counter
 from decimal import Decimal
 from typing import List, Dict, Tuple
 import math
+import random
+import time
+
+from .bandes import PackerBandes
+from .barres import BarreSource, SolveurBarres, SolveurBarresMixtes
+from .chutes import extraire_chutes
+from .dimensions import (
+    en_dixiemes, en_dixiemes_piece, en_dixiemes_source, en_mm, en_decimal, surface_en_mm2
+)
+from .guillotine import PackerGuillotine, SourcePlaque
+from .pieces import TypePiece, regrouper_pieces
+
+# À incrémenter à chaque changement des algorithmes : invalide le cache des résultats
+VERSION_ALGORITHME = 8
+
+
+def _dimensions(piece: TypePiece) -> Tuple[int, int]:
+    return piece.largeur, piece.longueur
+
+
+# Ordres de tri des types de pièces (ordre décroissant)
+TRIS_PIECES = {
+    'surface': lambda p: (_dimensions(p)[0] * _dimensions(p)[1], max(_dimensions(p))),
+    'cote_max': lambda p: (max(_dimensions(p)), min(_dimensions(p))),
+    'perimetre': lambda p: (sum(_dimensions(p)), max(_dimensions(p))),
+    'largeur': lambda p: _dimensions(p),
+    'longueur': lambda p: tuple(reversed(_dimensions(p))),
+}
 
 
 class OptimiseurDebit:
@@ -14,109 +45,163 @@ class OptimiseurDebit:
     
     def __init__(self, largeur_source: Decimal, longueur_source: Decimal, 
                  epaisseur_lame: Decimal = Decimal('3'),
-                 reequerrage: Decimal = Decimal('0')):
+                 reequerrage: Decimal = Decimal('0'),
+                 dimension_chute_jetee: Decimal = Decimal('50'),
+                 dimension_chute_facturee: Decimal = Decimal('100')):
         self.largeur_source = largeur_source
         self.longueur_source = longueur_source
         self.epaisseur_lame = epaisseur_lame
         self.reequerrage = reequerrage
-        
-    def optimiser_guillotine(self, pieces: List[Dict], sens_coupe: str = 'transversal') -> Dict:
+        # Chutes de plaques : jetées sous la première dimension, facturées sous la seconde
+        self.dimension_chute_jetee = dimension_chute_jetee
+        self.dimension_chute_facturee = dimension_chute_facturee
+        
+    def optimiser_guillotine(self, pieces: List[Dict], sens_coupe: str = 'transversal',
+                             tri: str = 'surface', regle_placement: str = 'bssf',
+                             rotation: bool = False, sources: List[Dict] = None,
+                             graine: float = None) -> Dict:
         """
         Optimise le débit en utilisant l'algorithme Guillotine Cut
         
         Args:
             pieces: Liste de dicts avec 'largeur', 'longueur', 'quantite', 'nom'
             sens_coupe: 'transversal' ou 'longitudinal'
+            tri: ordre de placement des pièces (clé de TRIS_PIECES)
+            regle_placement: 'bssf', 'baf' ou 'bl'
+            rotation: autoriser la rotation à 90° des pièces
+            sources: chutes / formats en stock à utiliser avant les plaques neuves,
+                dicts avec 'largeur', 'longueur', 'origine' ('chute' ou 'stock'),
+                'reference' et 'quantite'
+            graine: si fournie, l'ordre de tri est légèrement perturbé (voisins échangés
+                au hasard), pour diversifier les essais de la recherche locale
         
         Returns:
             Dict avec 'plan_coupe', 'taux_utilisation', 'chutes', 'nombre_plaques'
+            Les chutes réutilisables de chaque plaque (voir chutes.py) sont dans
+            plaque['chutes'] ; 'chutes' les reprend toutes avec le numéro de plaque.
         """
-        # Trier les pièces par surface décroissante
-        pieces_triees = sorted(
-            pieces,
-            key=lambda p: Decimal(str(p['largeur'])) * Decimal(str(p['longueur'])) * p['quantite'],
-            reverse=True
+        debut = time.perf_counter()
+        # Conversion unique en types de pièces (dixièmes de mm, quantités regroupées)
+        # En coupe longitudinale, on inverse largeur et longueur
+        types = regrouper_pieces(pieces, sens_coupe)
+        
+        # Trier les pièces (par défaut par surface décroissante)
+        types.sort(key=TRIS_PIECES[tri], reverse=True)
+        if graine is not None:
+            alea = random.Random(graine)
+            for i in range(len(types) - 1):
+                if alea.random() < 0.2:
+                    types[i], types[i + 1] = types[i + 1], types[i]
+        
+        # Placer les pièces sur les plaques (rectangles libres, toutes plaques ouvertes)
+        packer = PackerGuillotine(
+            largeur=en_dixiemes_source(self.largeur_source),
+            longueur=en_dixiemes_source(self.longueur_source),
+            epaisseur_lame=en_dixiemes_piece(self.epaisseur_lame),
+            reequerrage=en_dixiemes_piece(self.reequerrage),
+            sens_coupe=sens_coupe,
+            rotation=rotation,
+            regle_placement=regle_placement,
         )
+        plaques, non_placees = packer.placer_pieces(types, self._sources_plaques(sources))
+        return self._resultat_plaques(plaques, non_placees, debut)
+    
+    def optimiser_bandes(self, pieces: List[Dict], sens_coupe: str = 'transversal',
+                         rotation: bool = False, sources: List[Dict] = None) -> Dict:
+        """
+        Optimise le débit en deux étapes : refente en bandes, puis tronçonnage (voir bandes.py)
         
-        plan_coupe = []
-        chutes = []
-        nombre_plaques = 0
-        surface_totale_pieces = Decimal('0')
-        surface_totale_plaques = Decimal('0')
-        
-        # Créer la liste étendue des pièces (avec quantités)
-        pieces_etendues = []
-        for piece in pieces_triees:
-            for _ in range(piece['quantite']):
-                pieces_etendues.append({
-                    'largeur': Decimal(str(piece['largeur'])),
-                    'longueur': Decimal(str(piece['longueur'])),
-                    'nom': piece.get('nom', ''),
-                })
-                surface_totale_pieces += Decimal(str(piece['largeur'])) * Decimal(str(piece['longueur']))
+        Les plans obtenus sont réalisables sur une scie à panneaux sans recoupe. Chaque
+        plaque du plan porte en plus ses 'bandes' (x, y, largeur, longueur).
         
-        # Placer les pièces sur les plaques
-        pieces_placees = []
-        plaque_courante = {
-            'numero': 1,
-            'largeur': self.largeur_source,
-            'longueur': self.longueur_source,
-            'pieces': [],
-            'chutes': [],
-        }
+        Args:
+            pieces, sens_coupe, rotation, sources: voir optimiser_guillotine
+        """
+        debut = time.perf_counter()
+        types = regrouper_pieces(pieces, sens_coupe)
+        packer = PackerBandes(
+            largeur=en_dixiemes_source(self.largeur_source),
+            longueur=en_dixiemes_source(self.longueur_source),
+            epaisseur_lame=en_dixiemes_piece(self.epaisseur_lame),
+            reequerrage=en_dixiemes_piece(self.reequerrage),
+            sens_coupe=sens_coupe,
+            rotation=rotation,
+        )
+        plaques, non_placees = packer.placer_pieces(types, self._sources_plaques(sources))
+        return self._resultat_plaques(plaques, non_placees, debut)
+    
+    @staticmethod
+    def _sources_plaques(sources: List[Dict]) -> List[SourcePlaque]:
+        return [
+            SourcePlaque(
+                en_dixiemes_source(source['largeur']),
+                en_dixiemes_source(source['longueur']),
+                source.get('origine', 'chute'),
+                source.get('reference'),
+                source.get('quantite', 1),
+            )
+            for source in sources or []
+        ]
+    
+    def _resultat_plaques(self, plaques, non_placees: List[TypePiece], debut: float) -> Dict:
+        """Résultat d'un placement sur plaques, reconverti en mm, avec les chutes de chaque plaque"""
+        chutes = []
+        surface_totale_pieces = 0
+        surface_totale_plaques = 0
+        lame = en_dixiemes_piece(self.epaisseur_lame)
+        chute_jetee = en_dixiemes(self.dimension_chute_jetee)
+        chute_facturee = en_dixiemes(self.dimension_chute_facturee)
         
-        for piece in pieces_etendues:
-            # Essayer de placer la pièce sur la plaque courante
-            if sens_coupe == 'transversal':
-                # Coupe transversale : on coupe d'abord en largeur
-                placee = self._placer_piece_transversal(
-                    plaque_courante, piece, self.epaisseur_lame
-                )
-            else:
-                # Coupe longitudinale : on coupe d'abord en longueur
-                placee = self._placer_piece_longitudinal(
-                    plaque_courante, piece, self.epaisseur_lame
-                )
-            
-            if not placee:
-                # La pièce ne rentre pas, créer une nouvelle plaque
-                plan_coupe.append(plaque_courante)
-                nombre_plaques += 1
-                surface_totale_plaques += plaque_courante['largeur'] * plaque_courante['longueur']
-                
-                # Identifier les chutes réutilisables
-                for chute in plaque_courante['chutes']:
-                    if chute['largeur'] >= Decimal('100') and chute['longueur'] >= Decimal('100'):
-                        chutes.append(chute)
-                
-                # Nouvelle plaque
-                plaque_courante = {
-                    'numero': nombre_plaques + 1,
-                    'largeur': self.largeur_source,
-                    'longueur': self.longueur_source,
-                    'pieces': [],
-                    'chutes': [],
+        # Reconversion en mm uniquement pour le résultat
+        plan_coupe = []
+        for plaque in plaques:
+            pieces_plaque = []
+            for x, y, largeur, longueur, nom, pivotee in plaque.pieces:
+                placement = {
+                    'x': en_mm(x),
+                    'y': en_mm(y),
+                    'largeur': en_mm(largeur),
+                    'longueur': en_mm(longueur),
+                    'nom': nom,
                 }
-                
-                # Réessayer de placer la pièce
-                if sens_coupe == 'transversal':
-                    self._placer_piece_transversal(plaque_courante, piece, self.epaisseur_lame)
-                else:
-                    self._placer_piece_longitudinal(plaque_courante, piece, self.epaisseur_lame)
-        
-        # Ajouter la dernière plaque
-        if plaque_courante['pieces']:
-            plan_coupe.append(plaque_courante)
-            nombre_plaques += 1
-            surface_totale_plaques += plaque_courante['largeur'] * plaque_courante['longueur']
-            
-            for chute in plaque_courante['chutes']:
-                if chute['largeur'] >= Decimal('100') and chute['longueur'] >= Decimal('100'):
-                    chutes.append(chute)
+                if pivotee:
+                    placement['rotation'] = 90
+                pieces_plaque.append(placement)
+                surface_totale_pieces += largeur * longueur
+            plan_plaque = {
+                'numero': plaque.numero,
+                'largeur': en_mm(plaque.largeur),
+                'longueur': en_mm(plaque.longueur),
+                'origine': plaque.origine,
+                'pieces': pieces_plaque,
+                'chutes': [],
+            }
+            if plaque.reference:
+                plan_plaque['reference'] = plaque.reference
+            if getattr(plaque, 'bandes', None):
+                plan_plaque['bandes'] = [
+                    {'x': en_mm(x), 'y': en_mm(y), 'largeur': en_mm(largeur), 'longueur': en_mm(longueur)}
+                    for x, y, largeur, longueur in plaque.bandes
+                ]
+            reequerrage = 0 if plaque.origine == 'chute' else en_dixiemes_piece(self.reequerrage)
+            for x, y, largeur, longueur in extraire_chutes(
+                    plaque.largeur, plaque.longueur, plaque.pieces, lame, reequerrage, chute_jetee):
+                chute = {
+                    'x': en_mm(x),
+                    'y': en_mm(y),
+                    'largeur': en_mm(largeur),
+                    'longueur': en_mm(longueur),
+                    'facturee': min(largeur, longueur) < chute_facturee,
+                }
+                plan_plaque['chutes'].append(chute)
+                chutes.append({**chute, 'plaque': plaque.numero})
+            plan_coupe.append(plan_plaque)
+            surface_totale_plaques += plaque.largeur * plaque.longueur
+        nombre_plaques = len(plan_coupe)
         
         # Calculer le taux d'utilisation
         if surface_totale_plaques > 0:
-            taux_utilisation = (surface_totale_pieces / surface_totale_plaques) * Decimal('100')
+            taux_utilisation = Decimal(surface_totale_pieces) / Decimal(surface_totale_plaques) * Decimal('100')
         else:
             taux_utilisation = Decimal('0')
         
@@ -125,88 +210,46 @@ class OptimiseurDebit:
             'taux_utilisation': float(taux_utilisation),
             'chutes': chutes,
             'nombre_plaques': nombre_plaques,
-            'surface_totale_pieces': float(surface_totale_pieces),
-            'surface_totale_plaques': float(surface_totale_plaques),
+            'surface_totale_pieces': float(surface_en_mm2(surface_totale_pieces)),
+            'surface_totale_plaques': float(surface_en_mm2(surface_totale_plaques)),
+            'pieces_non_placees': [
+                {
+                    'largeur': en_mm(t.longueur if t.rotation else t.largeur),
+                    'longueur': en_mm(t.largeur if t.rotation else t.longueur),
+                    'quantite': t.quantite,
+                    'nom': t.nom,
+                }
+                for t in non_placees
+            ],
+            'duree_optimisation_ms': round((time.perf_counter() - debut) * 1000, 2),
         }
     
-    def _placer_piece_transversal(self, plaque: Dict, piece: Dict, epaisseur_lame: Decimal) -> bool:
-        """Place une pièce sur une plaque avec coupe transversale"""
-        largeur_piece = piece['largeur']
-        longueur_piece = piece['longueur']
-        
-        # Vérifier si la pièce rentre dans la plaque
-        if largeur_piece > plaque['largeur'] or longueur_piece > plaque['longueur']:
-            return False
-        
-        # Chercher un emplacement disponible
-        # Algorithme simple : placer en haut à gauche
-        x = Decimal('0')
-        y = Decimal('0')
-        
-        # Vérifier les collisions avec les pièces existantes
-        for piece_existante in plaque['pieces']:
-            # Si la nouvelle pièce chevauche une pièce existante, décaler
-            if not (x + largeur_piece <= piece_existante['x'] or 
-                   x >= piece_existante['x'] + piece_existante['largeur'] or
-                   y + longueur_piece <= piece_existante['y'] or
-                   y >= piece_existante['y'] + piece_existante['longueur']):
-                # Collision, essayer de décaler
-                y = piece_existante['y'] + piece_existante['longueur'] + epaisseur_lame
-                if y + longueur_piece > plaque['longueur']:
-                    return False
-        
-        # Vérifier que la pièce rentre toujours
-        if x + largeur_piece > plaque['largeur'] or y + longueur_piece > plaque['longueur']:
-            return False
-        
-        # Placer la pièce
-        plaque['pieces'].append({
-            'x': float(x),
-            'y': float(y),
-            'largeur': float(largeur_piece),
-            'longueur': float(longueur_piece),
-            'nom': piece.get('nom', ''),
-        })
-        
-        # Mettre à jour les chutes (simplifié)
-        # TODO: Implémenter un algorithme plus sophistiqué pour identifier les chutes
+    def optimiser_portefeuille(self, pieces: List[Dict], sens_coupe: str = 'transversal',
+                               nb_workers: int = None, budget_secondes: float = None,
+                               sources: List[Dict] = None) -> Dict:
+        """
+        Lance en parallèle plusieurs heuristiques de placement et garde le meilleur plan
         
-        return True
+        Args:
+            pieces: Liste de dicts avec 'largeur', 'longueur', 'quantite', 'nom'
+            sens_coupe: 'transversal' ou 'longitudinal'
+            nb_workers: nombre de processus (settings.OPTIMISATION_NB_WORKERS par défaut)
+            budget_secondes: temps maximum alloué (settings.OPTIMISATION_BUDGET_SECONDES par défaut)
+            sources: chutes / formats en stock (voir optimiser_guillotine)
+        """
+        from .portefeuille import optimiser_portefeuille
+        return optimiser_portefeuille(self, pieces, sens_coupe, nb_workers, budget_secondes, sources)
     
-    def _placer_piece_longitudinal(self, plaque: Dict, piece: Dict, epaisseur_lame: Decimal) -> bool:
-        """Place une pièce sur une plaque avec coupe longitudinale"""
-        # Pour la coupe longitudinale, on inverse largeur et longueur
-        largeur_piece = piece['longueur']  # Inversé
-        longueur_piece = piece['largeur']  # Inversé
-        
-        if largeur_piece > plaque['largeur'] or longueur_piece > plaque['longueur']:
-            return False
-        
-        x = Decimal('0')
-        y = Decimal('0')
-        
-        for piece_existante in plaque['pieces']:
-            if not (x + largeur_piece <= piece_existante['x'] or 
-                   x >= piece_existante['x'] + piece_existante['largeur'] or
-                   y + longueur_piece <= piece_existante['y'] or
-                   y >= piece_existante['y'] + piece_existante['longueur']):
-                y = piece_existante['y'] + piece_existante['longueur'] + epaisseur_lame
-                if y + longueur_piece > plaque['longueur']:
-                    return False
-        
-        if x + largeur_piece > plaque['largeur'] or y + longueur_piece > plaque['longueur']:
-            return False
-        
-        plaque['pieces'].append({
-            'x': float(x),
-            'y': float(y),
-            'largeur': float(largeur_piece),
-            'longueur': float(longueur_piece),
-            'nom': piece.get('nom', ''),
-            'rotation': 90,  # Indiquer la rotation
-        })
+    def optimiser_progressif(self, pieces: List[Dict], sens_coupe: str = 'transversal',
+                             budget_secondes: float = None, sources: List[Dict] = None):
+        """
+        Optimisation « anytime » : générateur des plans successivement améliorés
         
-        return True
+        Le premier plan (glouton) est produit immédiatement, les suivants jusqu'à
+        l'échéance (settings.OPTIMISATION_BUDGET_SECONDES par défaut).
+        """
+        from .progressif import optimiser_progressif
+        return optimiser_progressif(self, pieces, sens_coupe, budget_secondes, sources)
     
     def optimiser_barre(self, pieces: List[Dict], longueur_barre: Decimal) -> Dict:
         """
@@ -218,89 +261,121 @@ class OptimiseurDebit:
         
         Returns:
             Dict avec 'plan_coupe', 'taux_utilisation', 'chutes', 'nombre_barres'
+            Chaque entrée du plan est un schéma de coupe répété 'quantite' fois.
         """
-        # Trier les pièces par longueur décroissante
-        pieces_triees = sorted(
-            pieces,
-            key=lambda p: Decimal(str(p['longueur'])),
-            reverse=True
+        debut = time.perf_counter()
+        solveur = SolveurBarres(longueur_barre, self.epaisseur_lame)
+        types, demandes, trop_longues = solveur.preparer_types(pieces)
+        solution = solveur.resoudre(types, demandes)
+        barre = BarreSource(solveur.capacite)
+        return self._resultat_barres(
+            [(barre, schema, multiplicite) for schema, multiplicite in solution],
+            types, solveur.lame, trop_longues, debut
         )
+    
+    def optimiser_barres_mixtes(self, pieces: List[Dict], barres: List[Dict],
+                                objectif: str = 'cout') -> Dict:
+        """
+        Optimise le débit sur plusieurs longueurs de barres (voir barres.SolveurBarresMixtes)
+        
+        Args:
+            pieces: Liste de dicts avec 'longueur', 'quantite', 'nom'
+            barres: dicts 'longueur', 'quantite' (None : barres neuves sans limite),
+                'prix_unitaire', 'origine' ('neuve', 'stock' ou 'chute') et 'reference'
+            objectif: 'cout' (prix des barres consommées) ou 'chute' (longueur consommée)
         
+        Returns:
+            résultat de optimiser_barre, complété de 'cout_total' (None si un prix
+            manque) ; chaque schéma porte sa 'longueur' et, hors barres neuves, son
+            'origine' et sa 'reference'
+        """
+        debut = time.perf_counter()
+        sources = [
+            BarreSource(
+                en_dixiemes_source(barre['longueur']),
+                barre.get('quantite'),
+                None if barre.get('prix_unitaire') is None else Decimal(str(barre['prix_unitaire'])),
+                barre.get('origine', 'neuve'),
+                barre.get('reference'),
+            )
+            for barre in barres
+        ]
+        solveur = SolveurBarresMixtes(sources, self.epaisseur_lame, objectif)
+        types, demandes, trop_longues = solveur.preparer_types(pieces)
+        solution, restant = solveur.resoudre(types, demandes)
+        solution = [(sources[index], schema, multiplicite) for index, schema, multiplicite in solution]
+        
+        # Une seule longueur neuve, résolue par le moteur mono-longueur, fait parfois mieux
+        cout = lambda plan: sum(solveur.cout(barre) * multiplicite for barre, _, multiplicite in plan)
+        for barre in sources:
+            if barre.quantite is not None or not demandes:
+                continue
+            if any(solveur._poids(types, t) > barre.longueur for t in demandes):
+                continue
+            mono = SolveurBarres(en_decimal(barre.longueur), self.epaisseur_lame)
+            alternative = [(barre, schema, multiplicite) for schema, multiplicite in mono.resoudre(types, demandes)]
+            if restant or cout(alternative) < cout(solution):
+                solution, restant = alternative, Counter()
+        
+        for t, quantite in restant.items():
+            trop_longues.append({'longueur': en_mm(types[t].longueur), 'nom': types[t].nom, 'quantite': quantite})
+        resultat = self._resultat_barres(solution, types, solveur.lame, trop_longues, debut)
+        if all(barre.origine == 'chute' or barre.cout is not None for barre, _, _ in solution):
+            resultat['cout_total'] = float(sum(
+                (barre.cout or Decimal('0')) * multiplicite for barre, _, multiplicite in solution
+                if barre.origine != 'chute'
+            ))
+        else:
+            resultat['cout_total'] = None
+        return resultat
+    
+    @staticmethod
+    def _resultat_barres(solution: List[Tuple], types: List[TypePiece], lame: int,
+                         non_placees: List[Dict], debut: float) -> Dict:
+        """Plan de barres à partir des schémas (barre, schéma, multiplicité), reconverti en mm"""
         plan_coupe = []
         chutes = []
+        longueur_totale_pieces = 0
+        longueur_totale_barres = 0
         nombre_barres = 0
-        longueur_totale_pieces = Decimal('0')
-        longueur_totale_barres = Decimal('0')
-        
-        # Créer la liste étendue
-        pieces_etendues = []
-        for piece in pieces_triees:
-            for _ in range(piece['quantite']):
-                pieces_etendues.append({
-                    'longueur': Decimal(str(piece['longueur'])),
-                    'nom': piece.get('nom', ''),
-                })
-                longueur_totale_pieces += Decimal(str(piece['longueur']))
-        
-        # Placer les pièces sur les barres
-        barre_courante = {
-            'numero': 1,
-            'longueur': longueur_barre,
-            'pieces': [],
-            'longueur_utilisee': Decimal('0'),
-        }
         
-        for piece in pieces_etendues:
-            longueur_piece = piece['longueur']
-            longueur_necessaire = longueur_piece + self.epaisseur_lame  # Ajouter l'épaisseur de la lame
-            
-            if barre_courante['longueur_utilisee'] + longueur_necessaire <= longueur_barre:
-                # Placer sur la barre courante
-                barre_courante['pieces'].append({
-                    'position': float(barre_courante['longueur_utilisee']),
-                    'longueur': float(longueur_piece),
-                    'nom': piece.get('nom', ''),
-                })
-                barre_courante['longueur_utilisee'] += longueur_necessaire
-            else:
-                # Nouvelle barre
-                chute_longueur = longueur_barre - barre_courante['longueur_utilisee']
-                if chute_longueur >= Decimal('100'):  # Chute réutilisable si >= 100mm
-                    chutes.append({
-                        'longueur': float(chute_longueur),
+        for source, schema, multiplicite in solution:
+            # Pièces les plus longues en premier sur la barre
+            barre = {
+                'numero': len(plan_coupe) + 1,
+                'longueur': en_mm(source.longueur),
+                'quantite': multiplicite,
+                'pieces': [],
+                'longueur_utilisee': 0,
+            }
+            if source.origine != 'neuve':
+                barre['origine'] = source.origine
+                barre['reference'] = source.reference
+            position = 0
+            for t, nombre in sorted(schema, key=lambda item: types[item[0]].longueur, reverse=True):
+                longueur, nom = types[t].longueur, types[t].nom
+                for _ in range(nombre):
+                    barre['pieces'].append({
+                        'position': en_mm(position),
+                        'longueur': en_mm(longueur),
+                        'nom': nom,
                     })
-                
-                plan_coupe.append(barre_courante)
-                nombre_barres += 1
-                longueur_totale_barres += longueur_barre
-                
-                # Nouvelle barre
-                barre_courante = {
-                    'numero': nombre_barres + 1,
-                    'longueur': longueur_barre,
-                    'pieces': [],
-                    'longueur_utilisee': Decimal('0'),
-                }
-                
-                # Placer la pièce sur la nouvelle barre
-                barre_courante['pieces'].append({
-                    'position': 0,
-                    'longueur': float(longueur_piece),
-                    'nom': piece.get('nom', ''),
-                })
-                barre_courante['longueur_utilisee'] = longueur_necessaire
-        
-        # Ajouter la dernière barre
-        if barre_courante['pieces']:
-            chute_longueur = longueur_barre - barre_courante['longueur_utilisee']
-            if chute_longueur >= Decimal('100'):
+                    position += longueur + lame
+                longueur_totale_pieces += longueur * nombre * multiplicite
+            barre['longueur_utilisee'] = en_mm(position)
+            plan_coupe.append(barre)
+            nombre_barres += multiplicite
+            longueur_totale_barres += source.longueur * multiplicite
+            
+            chute_longueur = en_mm(source.longueur - position)
+            if chute_longueur >= 100:  # Chute réutilisable si >= 100mm
                 chutes.append({
-                    'longueur': float(chute_longueur),
+                    'longueur': chute_longueur,
+                    'quantite': multiplicite,
                 })
-            
-            plan_coupe.append(barre_courante)
-            nombre_barres += 1
-            longueur_totale_barres += longueur_barre
+        
+        longueur_totale_pieces = en_decimal(longueur_totale_pieces)
+        longueur_totale_barres = en_decimal(longueur_totale_barres)
         
         # Calculer le taux d'utilisation
         if longueur_totale_barres > 0:
@@ -315,8 +390,6 @@ class OptimiseurDebit:
             'nombre_barres': nombre_barres,
             'longueur_totale_pieces': float(longueur_totale_pieces),
             'longueur_totale_barres': float(longueur_totale_barres),
+            'pieces_non_placees': non_placees,
+            'duree_optimisation_ms': round((time.perf_counter() - debut) * 1000, 2),
         }
-
-
-
-
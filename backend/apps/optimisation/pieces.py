@@ -0,0 +1,47 @@
+"""
+Modèle compact des pièces à débiter
+- Une instance par type de pièce (dimensions, nom) et non par pièce physique
+- La quantité restante est décrémentée au fur et à mesure des placements,
+  ce qui permet de placer des séries de pièces identiques en une seule fois
+"""
+from typing import List, Dict
+
+from .dimensions import en_dixiemes_piece
+
+
+class TypePiece:
+    """Type de pièce en dixièmes de mm avec sa quantité restant à placer"""
+    __slots__ = ('largeur', 'longueur', 'nom', 'quantite', 'rotation')
+
+    def __init__(self, largeur: int, longueur: int, nom: str = '', quantite: int = 1,
+                 rotation: bool = False):
+        self.largeur = largeur
+        self.longueur = longueur
+        self.nom = nom
+        self.quantite = quantite
+        self.rotation = rotation
+
+    def __repr__(self):
+        return f"TypePiece({self.largeur}x{self.longueur} '{self.nom}' x{self.quantite})"
+
+
+def regrouper_pieces(pieces: List[Dict], sens_coupe: str = 'transversal') -> List[TypePiece]:
+    """
+    Convertit les pièces d'un débit en types de pièces
+
+    Les lignes identiques (mêmes dimensions et même nom) sont fusionnées.
+    Hors coupe transversale, largeur et longueur sont inversées.
+    """
+    types = {}
+    for piece in pieces:
+        largeur = en_dixiemes_piece(piece.get('largeur', 0))
+        longueur = en_dixiemes_piece(piece['longueur'])
+        if sens_coupe != 'transversal':
+            largeur, longueur = longueur, largeur
+        nom = piece.get('nom', '')
+        cle = (largeur, longueur, nom)
+        if cle in types:
+            types[cle].quantite += piece['quantite']
+        else:
+            types[cle] = TypePiece(largeur, longueur, nom, piece['quantite'], sens_coupe != 'transversal')
+    return [t for t in types.values() if t.quantite > 0]
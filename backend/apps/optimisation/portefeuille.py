@@ -0,0 +1,196 @@
+"""
+Recherche par portefeuille d'heuristiques pour le débit de plaques
+- Plusieurs ordres de tri et règles de placement, avec et sans rotation à 90°
+- Exécution simultanée dans un pool de processus (multiprocessing.Pool)
+- Budget de temps : seuls les plans terminés avant l'échéance sont comparés ; les
+  heuristiques encore en cours sont arrêtées avec leur pool (terminate), qui ne
+  consomme plus de CPU une fois le résultat rendu
+- Un pool dont toutes les heuristiques ont abouti est gardé pour l'appel suivant
+  (un pool par appel simultané, jamais partagé)
+"""
+from decimal import Decimal
+from itertools import product
+from typing import List, Dict, Tuple
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+REGLES_PLACEMENT = ['bssf', 'baf', 'bl']
+TRIS = ['surface', 'cote_max', 'perimetre', 'largeur', 'longueur']
+
+
+def heuristiques() -> List[Dict]:
+    """Liste des combinaisons (tri, règle de placement, rotation) à évaluer"""
+    return [
+        {'tri': tri, 'regle_placement': regle, 'rotation': rotation}
+        for tri, regle, rotation in product(TRIS, REGLES_PLACEMENT, (False, True))
+    ]
+
+
+def _executer_heuristique(parametres: Tuple) -> Dict:
+    """Point d'entrée des processus : rejoue optimiser_guillotine avec une heuristique"""
+    from .optimisation_algo import OptimiseurDebit
+
+    (largeur, longueur, epaisseur_lame, reequerrage, chute_jetee, chute_facturee,
+     pieces, sens_coupe, sources, heuristique) = parametres
+    optimiseur = OptimiseurDebit(
+        largeur_source=Decimal(largeur),
+        longueur_source=Decimal(longueur),
+        epaisseur_lame=Decimal(epaisseur_lame),
+        reequerrage=Decimal(reequerrage),
+        dimension_chute_jetee=Decimal(chute_jetee),
+        dimension_chute_facturee=Decimal(chute_facturee),
+    )
+    resultat = optimiseur.optimiser_guillotine(pieces, sens_coupe, sources=sources, **heuristique)
+    resultat['heuristique'] = heuristique
+    return resultat
+
+
+def pieces_non_placees(resultat: Dict) -> int:
+    """Nombre de pièces non placées (quantités comprises, et non nombre de types)"""
+    return sum(int(piece.get('quantite', 1)) for piece in resultat.get('pieces_non_placees', []))
+
+
+def _cle_classement(resultat: Dict) -> Tuple:
+    """Moins de pièces non placées d'abord, puis moins de plaques, puis meilleur taux d'utilisation"""
+    return (
+        -pieces_non_placees(resultat),
+        -resultat.get('nombre_plaques', 0),
+        resultat['taux_utilisation'],
+    )
+
+
+# Pools inoccupés, par nombre de processus
+_pools_libres: Dict[int, List] = {}
+_verrou_pools = threading.Lock()
+
+
+def _emprunter_pool(nb_workers: int):
+    with _verrou_pools:
+        libres = _pools_libres.get(nb_workers)
+        if libres:
+            return libres.pop()
+    return multiprocessing.Pool(nb_workers)
+
+
+def _rendre_pool(nb_workers: int, pool):
+    with _verrou_pools:
+        _pools_libres.setdefault(nb_workers, []).append(pool)
+
+
+@atexit.register
+def _fermer_pools():
+    with _verrou_pools:
+        for pools in _pools_libres.values():
+            for pool in pools:
+                pool.terminate()
+        _pools_libres.clear()
+
+
+class _Collecte:
+    """Résultats des heuristiques, reçus au fil de l'eau (callbacks du pool)"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.terminees = 0
+        self.resultats = []
+        self.condition = threading.Condition()
+
+    def reussite(self, resultat: Dict):
+        with self.condition:
+            self.resultats.append(resultat)
+            self.terminees += 1
+            self.condition.notify_all()
+
+    def echec(self, erreur: BaseException):
+        with self.condition:
+            self.terminees += 1
+            self.condition.notify_all()
+
+    def attendre(self, echeance: float) -> bool:
+        """Attend toutes les heuristiques jusqu'à l'échéance, au moins un plan au-delà ; True si toutes ont fini"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.terminees == self.total, timeout=max(echeance - time.perf_counter(), 0)
+            )
+            # Budget trop court : on attend au moins un plan
+            self.condition.wait_for(lambda: self.resultats or self.terminees == self.total)
+            return self.terminees == self.total
+
+
+def _executer_en_parallele(taches: List[Tuple], nb_workers: int, budget_secondes: float) -> List[Dict]:
+    """Résultats des heuristiques terminées dans le budget ; les autres sont arrêtées"""
+    collecte = _Collecte(len(taches))
+    pool = _emprunter_pool(nb_workers)
+    toutes = False
+    try:
+        for tache in taches:
+            pool.apply_async(
+                _executer_heuristique, (tache,), callback=collecte.reussite, error_callback=collecte.echec
+            )
+        toutes = collecte.attendre(time.perf_counter() + budget_secondes)
+        with collecte.condition:
+            return list(collecte.resultats)
+    finally:
+        if toutes:
+            _rendre_pool(nb_workers, pool)
+        else:
+            pool.terminate()
+
+
+def optimiser_portefeuille(optimiseur, pieces: List[Dict], sens_coupe: str = 'transversal',
+                           nb_workers: int = None, budget_secondes: float = None,
+                           sources: List[Dict] = None) -> Dict:
+    """
+    Évalue toutes les heuristiques et retourne le meilleur plan (voir _cle_classement :
+    le moins de pièces non placées, puis le moins de plaques, puis le meilleur taux)
+
+    Le résultat a la même forme que OptimiseurDebit.optimiser_guillotine, complété de
+    'heuristique' (combinaison retenue) et 'heuristiques_evaluees'.
+    """
+    debut = time.perf_counter()
+    if nb_workers is None:
+        nb_workers = getattr(settings, 'OPTIMISATION_NB_WORKERS', None) or os.cpu_count() or 1
+    if budget_secondes is None:
+        budget_secondes = getattr(settings, 'OPTIMISATION_BUDGET_SECONDES', 10)
+
+    taches = [
+        (
+            str(optimiseur.largeur_source),
+            str(optimiseur.longueur_source),
+            str(optimiseur.epaisseur_lame),
+            str(optimiseur.reequerrage),
+            str(optimiseur.dimension_chute_jetee),
+            str(optimiseur.dimension_chute_facturee),
+            pieces,
+            sens_coupe,
+            sources,
+            heuristique,
+        )
+        for heuristique in heuristiques()
+    ]
+
+    resultats = []
+    if nb_workers <= 1:
+        # Exécution séquentielle : utile pour les tests et l'exécutable Windows
+        echeance = debut + budget_secondes
+        for tache in taches:
+            resultats.append(_executer_heuristique(tache))
+            if time.perf_counter() >= echeance:
+                break
+    else:
+        resultats = _executer_en_parallele(taches, nb_workers, budget_secondes)
+
+    if not resultats:
+        # Toutes les heuristiques ont échoué : plan par défaut
+        resultats = [optimiseur.optimiser_guillotine(pieces, sens_coupe, sources=sources)]
+
+    meilleur = max(resultats, key=_cle_classement)
+    meilleur['heuristiques_evaluees'] = len(resultats)
+    meilleur['duree_optimisation_ms'] = round((time.perf_counter() - debut) * 1000, 2)
+    return meilleur
@@ -0,0 +1,136 @@
+"""
+Optimisation progressive (« anytime ») du débit de plaques
+- Un premier plan glouton est produit immédiatement
+- Les heuristiques du portefeuille sont ensuite essayées une à une
+- Puis, jusqu'à l'échéance, recherche locale : les plaques les moins remplies
+  (et une plaque tirée au hasard) sont vidées et leurs pièces re-placées avec
+  une heuristique et un ordre perturbé ; le nouveau plan est gardé s'il est meilleur
+- Chaque amélioration est produite par le générateur dès qu'elle est trouvée
+
+Un plan est meilleur s'il laisse moins de pièces non placées, puis s'il utilise
+moins de plaques, puis si le remplissage est plus concentré (somme des carrés
+des taux par plaque) : la dernière plaque se vide, ce qui prépare la plaque
+suivante à disparaître et laisse des chutes plus grandes.
+"""
+from typing import Dict, Iterator, List, Tuple
+import random
+import time
+
+from django.conf import settings
+
+from .portefeuille import heuristiques
+
+
+def _surface(element: Dict) -> float:
+    return element['largeur'] * element['longueur']
+
+
+def _remplissage(plaque: Dict) -> float:
+    return sum(_surface(piece) for piece in plaque['pieces']) / _surface(plaque)
+
+
+def _score(resultat: Dict) -> Tuple:
+    """Plus petit = meilleur"""
+    non_placees = sum(piece['quantite'] for piece in resultat.get('pieces_non_placees', []))
+    concentration = sum(_remplissage(plaque) ** 2 for plaque in resultat['plan_coupe'])
+    return non_placees, resultat['nombre_plaques'], -round(concentration, 9)
+
+
+def _pieces_d_origine(plaques: List[Dict]) -> List[Dict]:
+    """Pièces des plaques dans leur orientation d'origine (au format des débits)"""
+    pieces = []
+    for plaque in plaques:
+        for piece in plaque['pieces']:
+            largeur, longueur = piece['largeur'], piece['longueur']
+            if piece.get('rotation'):
+                largeur, longueur = longueur, largeur
+            pieces.append({'largeur': largeur, 'longueur': longueur, 'quantite': 1, 'nom': piece['nom']})
+    return pieces
+
+
+def _recomposer(resultat: Dict, plan_coupe: List[Dict]) -> Dict:
+    """Résultat complet pour un nouveau plan (mêmes pièces non placées)"""
+    for numero, plaque in enumerate(plan_coupe, start=1):
+        plaque['numero'] = numero
+    surface_pieces = sum(_surface(piece) for plaque in plan_coupe for piece in plaque['pieces'])
+    surface_plaques = sum(_surface(plaque) for plaque in plan_coupe)
+    return {
+        **resultat,
+        'plan_coupe': plan_coupe,
+        'chutes': [{**chute, 'plaque': plaque['numero']} for plaque in plan_coupe for chute in plaque['chutes']],
+        'nombre_plaques': len(plan_coupe),
+        'surface_totale_pieces': surface_pieces,
+        'surface_totale_plaques': surface_plaques,
+        'taux_utilisation': surface_pieces / surface_plaques * 100 if surface_plaques else 0.0,
+    }
+
+
+def _plaques_neuves(plan: List[Dict]) -> List[int]:
+    # Les chutes et formats en stock restent en place : seules les plaques neuves sont re-placées
+    return [i for i, plaque in enumerate(plan) if plaque.get('origine', 'neuve') == 'neuve']
+
+
+def reconditionner(optimiseur, resultat: Dict, sens_coupe: str, alea: random.Random):
+    """
+    Vide quelques plaques neuves peu remplies (au moins deux) et re-place leurs pièces
+
+    Returns:
+        le nouveau résultat, ou None si le re-placement n'a pas tenu sur autant de plaques
+    """
+    plan = resultat['plan_coupe']
+    neuves = _plaques_neuves(plan)
+    nombre = alea.randint(2, min(4, len(neuves)))
+    neuves.sort(key=lambda i: _remplissage(plan[i]))
+    choisies = set(neuves[:nombre - 1])
+    choisies.add(alea.choice([i for i in neuves if i not in choisies]))
+
+    pieces = _pieces_d_origine([plan[i] for i in choisies])
+    heuristique = alea.choice(heuristiques())
+    partiel = optimiseur.optimiser_guillotine(pieces, sens_coupe, graine=alea.random(), **heuristique)
+    if partiel['pieces_non_placees'] or partiel['nombre_plaques'] > len(choisies):
+        return None
+    conservees = [plaque for i, plaque in enumerate(plan) if i not in choisies]
+    return _recomposer(resultat, conservees + partiel['plan_coupe'])
+
+
+def optimiser_progressif(optimiseur, pieces: List[Dict], sens_coupe: str = 'transversal',
+                         budget_secondes: float = None, sources: List[Dict] = None,
+                         graine: int = 0) -> Iterator[Dict]:
+    """
+    Produit des plans de plus en plus bons jusqu'à l'échéance
+
+    Chaque résultat a la forme de OptimiseurDebit.optimiser_guillotine, complété de
+    'phase' ('glouton', 'portefeuille' ou 'recherche_locale') et 'iteration'.
+    """
+    debut = time.perf_counter()
+    if budget_secondes is None:
+        budget_secondes = getattr(settings, 'OPTIMISATION_BUDGET_SECONDES', 10)
+    echeance = debut + budget_secondes
+    alea = random.Random(graine)
+    iteration = 0
+
+    def publier(resultat, phase):
+        resultat['phase'] = phase
+        resultat['iteration'] = iteration
+        resultat['duree_optimisation_ms'] = round((time.perf_counter() - debut) * 1000, 2)
+        return resultat
+
+    meilleur = optimiseur.optimiser_guillotine(pieces, sens_coupe, sources=sources)
+    yield publier(meilleur, 'glouton')
+
+    for heuristique in heuristiques():
+        if time.perf_counter() >= echeance:
+            return
+        iteration += 1
+        candidat = optimiseur.optimiser_guillotine(pieces, sens_coupe, sources=sources, **heuristique)
+        if _score(candidat) < _score(meilleur):
+            candidat['heuristique'] = heuristique
+            meilleur = candidat
+            yield publier(meilleur, 'portefeuille')
+
+    while time.perf_counter() < echeance and len(_plaques_neuves(meilleur['plan_coupe'])) >= 2:
+        iteration += 1
+        candidat = reconditionner(optimiseur, meilleur, sens_coupe, alea)
+        if candidat is not None and _score(candidat) < _score(meilleur):
+            meilleur = candidat
+            yield publier(meilleur, 'recherche_locale')
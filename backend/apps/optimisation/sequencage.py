@@ -0,0 +1,240 @@
+"""
+Séquencement des coupes d'un plan de plaques (scie à panneaux, table de découpe)
+- Le plan ne donne que les rectangles des pièces : l'arbre de coupe est retrouvé
+  en cherchant, dans chaque zone, les traits de coupe traversants (de bord à bord)
+  qui ne coupent aucune pièce, trait de lame compris
+- Toutes les coupes parallèles d'une zone sont faites d'une traite, sans rotation ;
+  chaque partie obtenue est ensuite tournée d'un quart de tour pour les coupes
+  perpendiculaires (une partie n'a plus de coupe possible dans le sens de sa zone)
+- Seul le sens des premières coupes de la plaque est à choisir : les deux sont
+  évalués, le moins de rotations puis le moins de déplacements l'emporte
+- Dans une zone, les coupes sont faites dans l'ordre des positions croissantes :
+  le chariot ne revient jamais en arrière
+- Le temps d'usinage estimé additionne chargement, longueur coupée, déplacements
+  du chariot et rotations (settings.OPTIMISATION_SCIE_*)
+- Un plan non guillotine (aucune coupe traversante possible) est signalé
+- Les calculs se font en entiers (dixièmes de mm, voir dimensions.py)
+"""
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .dimensions import en_dixiemes, en_mm
+
+# Zone : (x1, y1, x2, y2) ; pièce : (x, y, largeur, longueur)
+Zone = Tuple[int, int, int, int]
+
+
+def _intervalle(piece: Tuple, axe: str) -> Tuple[int, int]:
+    x, y, largeur, longueur = piece
+    return (x, x + largeur) if axe == 'x' else (y, y + longueur)
+
+
+def coupes_traversantes(zone: Zone, pieces: List[Tuple], axe: str, lame: int) -> List[int]:
+    """
+    Positions (début du trait de lame) des coupes traversantes d'une zone
+
+    axe 'x' : coupes parallèles à l'axe y, à une abscisse donnée ; axe 'y' : l'inverse.
+    Un trait doit laisser de la matière de part et d'autre et ne toucher aucune pièce.
+    Une bande vide plus large que deux traits entre deux pièces est détachée par
+    deux coupes.
+    """
+    debut, fin = (zone[0], zone[2]) if axe == 'x' else (zone[1], zone[3])
+    occupes = []
+    for a, b in sorted(_intervalle(piece, axe) for piece in pieces):
+        if occupes and a < occupes[-1][1]:
+            occupes[-1][1] = max(occupes[-1][1], b)
+        else:
+            occupes.append([a, b])
+
+    positions = []
+    precedente = None
+    for a, b in occupes:
+        if precedente is None:
+            # Bord de zone avant la première pièce
+            if a - lame > debut:
+                positions.append(a - lame)
+        else:
+            if a - precedente >= lame:
+                positions.append(precedente)
+                if a - precedente - lame > lame:
+                    positions.append(a - lame)
+        precedente = b
+    if precedente is not None and precedente + lame < fin:
+        positions.append(precedente)
+    return positions
+
+
+def decouper_zone(zone: Zone, pieces: List[Tuple], axe: str, positions: List[int], lame: int):
+    """Zones et pièces de part et d'autre des coupes"""
+    bornes = [zone[0] if axe == 'x' else zone[1]] + [p for position in positions for p in (position, position + lame)]
+    bornes.append(zone[2] if axe == 'x' else zone[3])
+    parties = []
+    for debut, fin in zip(bornes[::2], bornes[1::2]):
+        if axe == 'x':
+            partie = (debut, zone[1], fin, zone[3])
+        else:
+            partie = (zone[0], debut, zone[2], fin)
+        contenues = [piece for piece in pieces if debut <= _intervalle(piece, axe)[0] < fin]
+        parties.append((partie, contenues))
+    return parties
+
+
+def arbre_de_coupe(zone: Zone, pieces: List[Tuple], lame: int, axe: Optional[str] = None) -> Dict:
+    """
+    Arbre de coupe guillotine d'une zone
+
+    Returns:
+        noeud {'zone', 'axe', 'positions', 'enfants'} ; feuilles {'zone', 'piece'},
+        {'zone', 'chute': True} ou {'zone', 'non_guillotine': pièces}
+    """
+    if not pieces:
+        return {'zone': zone, 'chute': True}
+    axes = [axe] if axe else ['x', 'y']
+    for sens in axes:
+        positions = coupes_traversantes(zone, pieces, sens, lame)
+        if positions:
+            enfants = [
+                arbre_de_coupe(partie, contenues, lame, 'y' if sens == 'x' else 'x')
+                for partie, contenues in decouper_zone(zone, pieces, sens, positions, lame)
+            ]
+            return {'zone': zone, 'axe': sens, 'positions': positions, 'enfants': enfants}
+    if axe:
+        # Aucune coupe dans le sens imposé (plaque entière) : l'autre sens
+        autre = 'y' if axe == 'x' else 'x'
+        if coupes_traversantes(zone, pieces, autre, lame):
+            return arbre_de_coupe(zone, pieces, lame, autre)
+    if len(pieces) == 1:
+        return {'zone': zone, 'piece': pieces[0]}
+    return {'zone': zone, 'non_guillotine': pieces}
+
+
+def sequence(arbre: Dict) -> List[Dict]:
+    """Coupes de l'arbre dans l'ordre d'exécution (zone par zone, en profondeur)"""
+    coupes = []
+
+    def parcourir(noeud, niveau, sens_precedent):
+        if 'axe' not in noeud:
+            return
+        zone = noeud['zone']
+        debut, fin = (zone[1], zone[3]) if noeud['axe'] == 'x' else (zone[0], zone[2])
+        origine = zone[0] if noeud['axe'] == 'x' else zone[1]
+        for i, position in enumerate(noeud['positions']):
+            coupes.append({
+                'niveau': niveau,
+                'axe': noeud['axe'],
+                'position': position,
+                'debut': debut,
+                'fin': fin,
+                'rotation': i == 0 and sens_precedent is not None and sens_precedent != noeud['axe'],
+                'decalage': position - origine,
+            })
+        for enfant in noeud['enfants']:
+            parcourir(enfant, niveau + 1, noeud['axe'])
+
+    parcourir(arbre, 1, None)
+    return coupes
+
+
+def _indicateurs(coupes: List[Dict]) -> Tuple[int, int, int]:
+    """(rotations, déplacement du chariot, longueur coupée), en dixièmes de mm"""
+    rotations = sum(1 for coupe in coupes if coupe['rotation'])
+    deplacement = 0
+    precedent = 0
+    for coupe in coupes:
+        # Nouvelle zone : le chariot repart de l'origine de la pièce posée contre la butée
+        if coupe['rotation'] or coupe['decalage'] < precedent:
+            precedent = 0
+        deplacement += coupe['decalage'] - precedent
+        precedent = coupe['decalage']
+    longueur = sum(coupe['fin'] - coupe['debut'] for coupe in coupes)
+    return rotations, deplacement, longueur
+
+
+def temps_usinage(rotations: int, deplacement: int, longueur: int) -> float:
+    """Temps estimé (s) d'usinage d'une plaque, chargement compris"""
+    return round(
+        getattr(settings, 'OPTIMISATION_SCIE_TEMPS_CHARGEMENT', 30)
+        + en_mm(longueur) / getattr(settings, 'OPTIMISATION_SCIE_VITESSE_COUPE', 300)
+        + en_mm(deplacement) / getattr(settings, 'OPTIMISATION_SCIE_VITESSE_DEPLACEMENT', 500)
+        + rotations * getattr(settings, 'OPTIMISATION_SCIE_TEMPS_ROTATION', 8),
+        1
+    )
+
+
+def sequencer_plaque(plaque: Dict, epaisseur_lame) -> Dict:
+    """
+    Séquence de coupe d'une plaque du plan
+
+    Returns:
+        {'coupes': [...] (mm), 'rotations', 'deplacement' (mm), 'guillotine',
+        'temps_usinage_s'}
+    """
+    lame = en_dixiemes(epaisseur_lame)
+    zone = (0, 0, en_dixiemes(plaque['largeur']), en_dixiemes(plaque['longueur']))
+    pieces = [
+        (en_dixiemes(p['x']), en_dixiemes(p['y']), en_dixiemes(p['largeur']), en_dixiemes(p['longueur']))
+        for p in plaque['pieces']
+    ]
+
+    # Seul le sens des premières coupes est libre : le moins de rotations puis de déplacements
+    meilleur = None
+    for axe in ('x', 'y'):
+        arbre = arbre_de_coupe(zone, pieces, lame, axe)
+        if 'positions' not in arbre and meilleur is not None:
+            continue
+        coupes = sequence(arbre)
+        rotations, deplacement, longueur = _indicateurs(coupes)
+        guillotine = not _contient_non_guillotine(arbre)
+        cle = (not guillotine, rotations, deplacement)
+        if meilleur is None or cle < meilleur[0]:
+            meilleur = (cle, coupes, rotations, deplacement, longueur, guillotine)
+
+    _, coupes, rotations, deplacement, longueur, guillotine = meilleur
+    return {
+        'coupes': [
+            {
+                'ordre': ordre,
+                'niveau': coupe['niveau'],
+                'axe': coupe['axe'],
+                'position': en_mm(coupe['position']),
+                'debut': en_mm(coupe['debut']),
+                'fin': en_mm(coupe['fin']),
+                'rotation': coupe['rotation'],
+            }
+            for ordre, coupe in enumerate(coupes, 1)
+        ],
+        'rotations': rotations,
+        'deplacement': en_mm(deplacement),
+        'guillotine': guillotine,
+        'temps_usinage_s': temps_usinage(rotations, deplacement, longueur),
+    }
+
+
+def _contient_non_guillotine(noeud: Dict) -> bool:
+    if 'non_guillotine' in noeud:
+        return True
+    return any(_contient_non_guillotine(enfant) for enfant in noeud.get('enfants', []))
+
+
+def sequencer_resultat(resultat: Dict, epaisseur_lame) -> Dict:
+    """
+    Ajoute à chaque plaque du plan sa séquence de coupe et son temps d'usinage
+
+    Les plaques déjà séquencées (plan incrémental) sont conservées ; les plans de
+    barres sont laissés tels quels. Le temps total est reporté dans 'temps_usinage_s'.
+    """
+    plan = resultat.get('plan_coupe') or []
+    if not plan or 'quantite' in plan[0]:
+        return resultat
+    total = 0
+    for plaque in plan:
+        if 'sequence' not in plaque:
+            sequence_plaque = sequencer_plaque(plaque, epaisseur_lame)
+            plaque['sequence'] = sequence_plaque['coupes']
+            plaque['rotations'] = sequence_plaque['rotations']
+            plaque['guillotine'] = sequence_plaque['guillotine']
+            plaque['temps_usinage_s'] = sequence_plaque['temps_usinage_s']
+        total += plaque['temps_usinage_s']
+    resultat['temps_usinage_s'] = round(total, 1)
+    return resultat
@@ -1,8 +1,19 @@
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
-    Matiere, ParametresDebit, Affaire, Lancement, Debit, Chute, StockMatiere
+    Matiere, ParametresDebit, Affaire, Lancement, Debit, Chute, StockMatiere,
+    TacheOptimisation
 )
+from .cache import cle_contexte, obtenir_cache
+from .incremental import reoptimiser
 from .optimisation_algo import OptimiseurDebit
+from .sequencage import sequencer_resultat
+from .sources import (
+    SourcesIndisponibles, liberer_sources, prix_au_prorata, reserver_sources, sources_disponibles,
+)
+from .taches import creer_tache_debit, est_volumineux
+from collections import defaultdict
 from decimal import Decimal
 
 
@@ -27,7 +38,8 @@ class ParametresDebitSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'nom', 'reequerrage', 'epaisseur_lame',
             'dimension_chute_jetee', 'dimension_chute_facturee',
-            'sens_coupe_par_defaut', 'sens_coupe_label', 'actif',
+            'sens_coupe_par_defaut', 'sens_coupe_label', 'algorithme_plaques', 'objectif_barres',
+            'utiliser_chutes', 'actif',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -75,12 +87,16 @@ class LancementSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def get_debits(self, obj):
-        return DebitSerializer(obj.debits.all(), many=True).data
+        # Sans plan de coupe : il n'est décodé que dans le détail d'un débit
+        return DebitResumeSerializer(obj.debits.all(), many=True).data
 
 
 class DebitSerializer(serializers.ModelSerializer):
     sens_coupe_label = serializers.CharField(source='get_sens_coupe_display', read_only=True)
     lancement_numero = serializers.CharField(source='lancement.numero_lancement', read_only=True)
+    # Écrit par l'optimisation seule : les réservations se libèrent d'après le plan enregistré
+    plan_coupe = serializers.JSONField(read_only=True)
+    temps_usinage_s = serializers.SerializerMethodField()
 
     class Meta:
         model = Debit
@@ -88,109 +104,383 @@ class DebitSerializer(serializers.ModelSerializer):
             'id', 'lancement', 'lancement_numero', 'numero_debit',
             'largeur_source', 'longueur_source', 'epaisseur',
             'pieces', 'resultat_optimisation', 'plan_coupe',
-            'taux_utilisation', 'nombre_plaques_necessaires',
+            'taux_utilisation', 'temps_usinage_s', 'nombre_plaques_necessaires',
             'sens_coupe', 'sens_coupe_label', 'chutes_reutilisables',
             'pdf_path', 'fichier_cnc_path', 'fichier_ascii_path',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def get_temps_usinage_s(self, obj):
+        """Temps d'usinage estimé de toutes les plaques (voir sequencage.py)"""
+        return (obj.resultat_optimisation or {}).get('temps_usinage_s')
+
     def create(self, validated_data):
         debit = Debit.objects.create(**validated_data)
         # Optimiser automatiquement si des pièces sont fournies
         if debit.pieces:
-            debit = self._optimiser_debit(debit)
+            debit = self._optimiser_ou_planifier(debit)
         return debit
 
     def update(self, instance, validated_data):
         # Si les pièces changent, réoptimiser
         pieces_changed = 'pieces' in validated_data
+        # Même format source et même sens : le plan actuel peut être mis à jour,
+        # sinon il est recalculé entièrement
+        meme_source = all(
+            validated_data.get(champ, getattr(instance, champ)) == getattr(instance, champ)
+            for champ in self.CHAMPS_SOURCE
+        )
+        # Plan et résultat tels qu'enregistrés : ce sont leurs réservations qui seront libérées
+        instance.refresh_from_db(fields=self.CHAMPS_RESULTAT)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        if pieces_changed and instance.pieces:
-            instance = self._optimiser_debit(instance)
+        if pieces_changed and instance.pieces and meme_source and self._reoptimiser_debit(instance):
+            return instance
+        if (pieces_changed or not meme_source) and instance.pieces:
+            instance = self._optimiser_ou_planifier(instance)
         else:
             instance.save()
         
         return instance
 
+    def _optimiser_ou_planifier(self, debit):
+        """Optimise immédiatement, ou en tâche de fond pour les débits volumineux"""
+        if est_volumineux(debit.pieces):
+            debit.save()
+            request = self.context.get('request')
+            creer_tache_debit(debit, request.user if request else None)
+            debit.refresh_from_db()
+            return debit
+        return self._optimiser_debit(debit)
+
+    # Champs du débit dont dépend tout le plan de coupe
+    CHAMPS_SOURCE = ('largeur_source', 'longueur_source', 'epaisseur', 'sens_coupe')
+
+    # Champs du débit écrits par une optimisation (restaurés si elle échoue)
+    CHAMPS_RESULTAT = (
+        'resultat_optimisation', 'plan_coupe', 'taux_utilisation',
+        'nombre_plaques_necessaires', 'chutes_reutilisables',
+    )
+
     def _optimiser_debit(self, debit):
-        """Optimise le débit"""
+        """
+        Optimise le débit
+
+        Libération des sources, calcul et enregistrement forment une seule transaction :
+        en cas d'erreur, le plan, les réservations et les chutes précédents sont conservés.
+        Si une chute ou un stock du plan a été réservé entre-temps par une autre
+        optimisation, le calcul est refait une fois sur les sources restantes.
+        """
+        precedent = {champ: getattr(debit, champ) for champ in self.CHAMPS_RESULTAT}
         try:
-            lancement = debit.lancement
-            matiere = lancement.matiere
-            parametres = lancement.parametres
-            
-            # Déterminer les paramètres
-            epaisseur_lame = Decimal('3')
-            reequerrage = Decimal('0')
-            sens_coupe = debit.sens_coupe or 'transversal'
+            for tentative in range(2):
+                try:
+                    with transaction.atomic():
+                        # Libérer les chutes et stocks réservés par l'optimisation précédente
+                        liberer_sources(debit.plan_coupe)
+                        resultat = self._resoudre(
+                            debit.lancement, debit.pieces, debit.largeur_source, debit.longueur_source,
+                            debit.sens_coupe, debit.epaisseur
+                        )
+                        self._enregistrer_resultat(debit, resultat)
+                    break
+                except SourcesIndisponibles:
+                    if tentative:
+                        raise
             
-            if parametres:
-                epaisseur_lame = parametres.epaisseur_lame
-                reequerrage = parametres.reequerrage
-                if not sens_coupe:
-                    sens_coupe = parametres.sens_coupe_par_defaut
-            
-            # Créer l'optimiseur
-            optimiseur = OptimiseurDebit(
-                largeur_source=debit.largeur_source,
-                longueur_source=debit.longueur_source,
-                epaisseur_lame=epaisseur_lame,
-                reequerrage=reequerrage
+        except Exception as e:
+            for champ, valeur in precedent.items():
+                setattr(debit, champ, valeur)
+            debit.resultat_optimisation = {'erreur': str(e)}
+            debit.save()
+        
+        return debit
+
+    def _reoptimiser_debit(self, debit) -> bool:
+        """
+        Met à jour le plan actuel pour les nouvelles pièces (voir incremental.py)
+
+        Seules les plaques touchées par la modification sont recalculées. Renvoie False
+        si le plan ne s'y prête pas (barres, bandes, plan de lancement, réglages de coupe
+        modifiés depuis le calcul, trop de plaques touchées, sources prises entre-temps) :
+        le débit doit alors être ré-optimisé complètement. Comme pour une optimisation
+        complète, une erreur conserve le plan précédent et est enregistrée sur le débit.
+        """
+        plan = debit.plan_coupe
+        if not plan or any(plaque.get('lot') or 'quantite' in plaque for plaque in plan):
+            return False
+        if (debit.resultat_optimisation or {}).get('reglages') != self._reglages(debit.lancement):
+            return False
+        try:
+            contexte = self._preparer(
+                debit.lancement, [], debit.largeur_source, debit.longueur_source,
+                debit.sens_coupe, debit.epaisseur
             )
+            if contexte['methode'] in ('barre', 'bandes'):
+                return False
+            resultat = reoptimiser(contexte['optimiseur'], plan, debit.pieces, contexte['sens_coupe'])
+            if resultat is None:
+                return False
+            self._remplacer_resultat(debit, resultat, incremental=True)
+        except SourcesIndisponibles:
+            return False
+        except Exception as e:
+            debit.resultat_optimisation = {'erreur': str(e)}
+            debit.save()
+        return True
+
+    @staticmethod
+    def _reglages(lancement) -> dict:
+        """Réglages de coupe du lancement dont dépend un plan (enregistrés avec lui)"""
+        parametres = lancement.parametres if lancement else None
+        if not parametres:
+            return {}
+        return {
+            champ: str(getattr(parametres, champ))
+            for champ in (
+                'epaisseur_lame', 'reequerrage', 'dimension_chute_jetee', 'dimension_chute_facturee',
+                'algorithme_plaques', 'utiliser_chutes',
+            )
+        }
+
+    @classmethod
+    def _remplacer_resultat(cls, debit, resultat, incremental=False):
+        """
+        Remplace le plan actuel du débit par un résultat déjà calculé
+
+        Les réservations du plan actuel sont rendues et celles du nouveau prises dans la
+        même transaction : en cas d'erreur, rien ne change, ni en base ni sur le débit.
+        """
+        precedent = {champ: getattr(debit, champ) for champ in cls.CHAMPS_RESULTAT}
+        try:
+            with transaction.atomic():
+                liberer_sources(precedent['plan_coupe'])
+                cls._enregistrer_resultat(debit, resultat, incremental)
+        except Exception:
+            for champ, valeur in precedent.items():
+                setattr(debit, champ, valeur)
+            raise
+
+    @classmethod
+    def _enregistrer_resultat(cls, debit, resultat, incremental=False):
+        """
+        Enregistre un résultat d'optimisation : réservations, débit, lancement et chutes
+
+        Les plaques reçoivent leur séquence de coupe et leur temps d'usinage. Après une
+        ré-optimisation incrémentale, les chutes existantes du débit sont mises à jour
+        sur place plutôt que recréées.
+        """
+        parametres = debit.lancement.parametres
+        sequencer_resultat(resultat, parametres.epaisseur_lame if parametres else Decimal('3'))
+        with transaction.atomic():
+            reserver_sources(resultat.get('plan_coupe', []))
             
-            # Optimiser selon le type de matière
-            if matiere.type_matiere in ['plaque', 'panneau', 'tole', 'vitrage', 'plastique']:
-                resultat = optimiseur.optimiser_guillotine(debit.pieces, sens_coupe)
-            elif matiere.type_matiere in ['barre', 'bobine']:
-                resultat = optimiseur.optimiser_barre(debit.pieces, debit.longueur_source)
-            else:
-                # Par défaut, utiliser guillotine
-                resultat = optimiseur.optimiser_guillotine(debit.pieces, sens_coupe)
-            
-            # Mettre à jour le débit
-            debit.resultat_optimisation = resultat
+            # Mettre à jour le débit (le plan n'est stocké qu'une fois, dans plan_coupe)
+            debit.resultat_optimisation = {cle: valeur for cle, valeur in resultat.items() if cle != 'plan_coupe'}
+            debit.resultat_optimisation['reglages'] = cls._reglages(debit.lancement)
             debit.plan_coupe = resultat.get('plan_coupe', [])
             debit.taux_utilisation = Decimal(str(resultat.get('taux_utilisation', 0)))
             debit.nombre_plaques_necessaires = resultat.get('nombre_plaques', resultat.get('nombre_barres', 1))
             debit.chutes_reutilisables = resultat.get('chutes', [])
             debit.save()
             
-            # Mettre à jour le statut du lancement
-            if debit.lancement:
+            # Mettre à jour le statut du lancement (aucune écriture s'il est déjà optimisé)
+            if debit.lancement and debit.lancement.statut != 'optimise':
                 debit.lancement.statut = 'optimise'
-                debit.lancement.save()
-            
-            # Créer les chutes dans la base de données
-            for chute_data in resultat.get('chutes', []):
-                if matiere.type_matiere in ['plaque', 'panneau', 'tole', 'vitrage', 'plastique']:
-                    Chute.objects.create(
-                        matiere=matiere,
-                        debit=debit,
-                        largeur=Decimal(str(chute_data.get('largeur', 0))),
-                        longueur=Decimal(str(chute_data.get('longueur', 0))),
-                        epaisseur=debit.epaisseur,
-                        quantite=1,
-                        statut='disponible'
-                    )
-                else:  # barre
-                    Chute.objects.create(
-                        matiere=matiere,
-                        debit=debit,
-                        largeur=Decimal('0'),  # Pour les barres, seule la longueur compte
-                        longueur=Decimal(str(chute_data.get('longueur', 0))),
-                        epaisseur=debit.epaisseur,
-                        quantite=1,
-                        statut='disponible'
-                    )
+                debit.lancement.save(update_fields=['statut', 'updated_at'])
             
-        except Exception as e:
-            debit.resultat_optimisation = {'erreur': str(e)}
-            debit.save()
+            if incremental:
+                cls._synchroniser_chutes(debit, resultat.get('chutes', []))
+            else:
+                cls._remplacer_chutes(debit, resultat.get('chutes', []))
+
+    @staticmethod
+    def _preparer(lancement, pieces, largeur_source, longueur_source, sens_coupe, epaisseur=None):
+        """
+        Paramètres d'optimisation d'un lancement : optimiseur, sens de coupe, méthode et sources
+
+        Returns:
+            dict avec 'optimiseur', 'sens_coupe', 'methode' ('guillotine', 'portefeuille',
+            'bandes' ou 'barre'), 'sources', 'epaisseur_lame', 'reequerrage' et, pour les
+            barres, 'objectif' et 'prix_barre' (prix d'une barre neuve)
+        """
+        matiere = lancement.matiere
+        parametres = lancement.parametres
         
-        return debit
+        # Déterminer les paramètres
+        epaisseur_lame = Decimal('3')
+        reequerrage = Decimal('0')
+        dimensions_chutes = {}
+        sens_coupe = sens_coupe or 'transversal'
+        algorithme_plaques = 'guillotine'
+        objectif_barres = 'cout'
+        utiliser_chutes = False
+        
+        if parametres:
+            epaisseur_lame = parametres.epaisseur_lame
+            reequerrage = parametres.reequerrage
+            algorithme_plaques = parametres.algorithme_plaques
+            objectif_barres = parametres.objectif_barres
+            utiliser_chutes = parametres.utiliser_chutes
+            dimensions_chutes = {
+                'dimension_chute_jetee': parametres.dimension_chute_jetee,
+                'dimension_chute_facturee': parametres.dimension_chute_facturee,
+            }
+            if not sens_coupe:
+                sens_coupe = parametres.sens_coupe_par_defaut
+        
+        # Créer l'optimiseur
+        optimiseur = OptimiseurDebit(
+            largeur_source=largeur_source,
+            longueur_source=longueur_source,
+            epaisseur_lame=epaisseur_lame,
+            reequerrage=reequerrage,
+            **dimensions_chutes
+        )
+        
+        # Méthode selon le type de matière (guillotine par défaut)
+        sources = []
+        methode = 'guillotine'
+        prix_barre = None
+        if matiere.type_matiere in ['plaque', 'panneau', 'tole', 'vitrage', 'plastique']:
+            if utiliser_chutes:
+                sources = sources_disponibles(matiere, epaisseur or matiere.epaisseur, pieces)
+            if algorithme_plaques in ('portefeuille', 'bandes'):
+                methode = algorithme_plaques
+        elif matiere.type_matiere in ['barre', 'bobine']:
+            methode = 'barre'
+            if utiliser_chutes:
+                sources = sources_disponibles(matiere, epaisseur or matiere.epaisseur, pieces, barres=True)
+            prix_barre = prix_au_prorata(matiere, largeur_source, longueur_source, barres=True)
+        
+        return {
+            'optimiseur': optimiseur,
+            'sens_coupe': sens_coupe,
+            'methode': methode,
+            'sources': sources,
+            'epaisseur_lame': epaisseur_lame,
+            'reequerrage': reequerrage,
+            'objectif': objectif_barres,
+            'prix_barre': None if prix_barre is None else float(prix_barre),
+        }
+
+    @staticmethod
+    def _optimiser_barres(contexte, pieces, longueur_source):
+        """Débit de barres : une seule longueur, ou chutes et stocks puis barres neuves"""
+        optimiseur = contexte['optimiseur']
+        if not contexte['sources']:
+            return optimiseur.optimiser_barre(pieces, longueur_source)
+        barres = contexte['sources'] + [{
+            'longueur': float(longueur_source),
+            'quantite': None,
+            'prix_unitaire': contexte['prix_barre'],
+        }]
+        return optimiseur.optimiser_barres_mixtes(pieces, barres, contexte['objectif'])
+
+    @classmethod
+    def _resoudre(cls, lancement, pieces, largeur_source, longueur_source, sens_coupe, epaisseur=None):
+        """
+        Calcule le plan de coupe de pièces d'un lancement (ou le lit dans le cache)
+
+        Utilisé pour un débit seul comme pour l'optimisation groupée d'un lancement.
+        """
+        contexte = cls._preparer(lancement, pieces, largeur_source, longueur_source, sens_coupe, epaisseur)
+        optimiseur = contexte['optimiseur']
+        sens_coupe = contexte['sens_coupe']
+        methode = contexte['methode']
+        sources = contexte['sources']
+        
+        if methode == 'portefeuille':
+            calcul = lambda: optimiseur.optimiser_portefeuille(pieces, sens_coupe, sources=sources)
+        elif methode == 'bandes':
+            calcul = lambda: optimiseur.optimiser_bandes(pieces, sens_coupe, sources=sources)
+        elif methode == 'barre':
+            calcul = lambda: cls._optimiser_barres(contexte, pieces, longueur_source)
+        else:
+            calcul = lambda: optimiseur.optimiser_guillotine(pieces, sens_coupe, sources=sources)
+        
+        # Réutiliser un résultat identique déjà calculé
+        cle = cle_contexte(contexte, pieces, largeur_source, longueur_source)
+        return obtenir_cache().obtenir_ou_calculer(cle, calcul)
+
+    @staticmethod
+    def _creer_chutes(debit, chutes):
+        """Crée les chutes du débit dans la base de données (un seul INSERT)"""
+        matiere = debit.lancement.matiere
+        plaques = matiere.type_matiere in ['plaque', 'panneau', 'tole', 'vitrage', 'plastique']
+        instances = []
+        for chute_data in chutes:
+            if plaques:
+                largeur = Decimal(str(chute_data.get('largeur', 0)))
+                quantite = 1
+            else:  # barre
+                largeur = Decimal('0')  # Pour les barres, seule la longueur compte
+                quantite = chute_data.get('quantite', 1)
+            longueur = Decimal(str(chute_data.get('longueur', 0)))
+            instances.append(Chute(
+                matiere=matiere,
+                debit=debit,
+                largeur=largeur,
+                longueur=longueur,
+                epaisseur=debit.epaisseur,
+                quantite=quantite,
+                # bulk_create n'appelle pas Chute.save() : la surface est calculée ici
+                surface=largeur * longueur if largeur and longueur else None,
+                statut='disponible'
+            ))
+        Chute.objects.bulk_create(instances, batch_size=500)
+
+    @classmethod
+    def _remplacer_chutes(cls, debit, chutes):
+        """Remplace les chutes disponibles de l'optimisation précédente par celles du nouveau plan"""
+        # Les chutes déjà réservées ou utilisées par d'autres débits sont conservées
+        Chute.objects.filter(debit=debit, statut='disponible').delete()
+        cls._creer_chutes(debit, chutes)
+
+    @classmethod
+    def _synchroniser_chutes(cls, debit, chutes):
+        """
+        Aligne les chutes disponibles du débit sur celles du nouveau plan
+
+        Les chutes de mêmes dimensions sont gardées, les autres lignes sont réutilisées
+        pour les nouvelles chutes ; seul le surplus est créé ou supprimé.
+        """
+        cle = lambda largeur, longueur: (Decimal(str(largeur or 0)), Decimal(str(longueur or 0)))
+        attendues = defaultdict(list)
+        for chute in chutes:
+            attendues[cle(chute.get('largeur', 0), chute.get('longueur', 0))].append(chute)
+        a_recycler = []
+        for existante in debit.chutes.filter(statut='disponible'):
+            restantes = attendues.get(cle(existante.largeur, existante.longueur))
+            if restantes:
+                restantes.pop()
+            else:
+                a_recycler.append(existante)
+
+        nouvelles = [chute for restantes in attendues.values() for chute in restantes]
+        recyclees = []
+        for existante, chute in zip(a_recycler, nouvelles):
+            existante.largeur = Decimal(str(chute.get('largeur', 0)))
+            existante.longueur = Decimal(str(chute.get('longueur', 0)))
+            existante.quantite = chute.get('quantite', 1)
+            existante.surface = existante.largeur * existante.longueur
+            existante.updated_at = timezone.now()
+            recyclees.append(existante)
+        if recyclees:
+            Chute.objects.bulk_update(recyclees, ['largeur', 'longueur', 'quantite', 'surface', 'updated_at'])
+        if len(a_recycler) > len(nouvelles):
+            Chute.objects.filter(id__in=[c.id for c in a_recycler[len(nouvelles):]]).delete()
+        else:
+            cls._creer_chutes(debit, nouvelles[len(a_recycler):])
+
+
+class DebitResumeSerializer(DebitSerializer):
+    """Débit sans son plan de coupe, pour les listes"""
+
+    class Meta(DebitSerializer.Meta):
+        fields = [champ for champ in DebitSerializer.Meta.fields if champ != 'plan_coupe']
 
 
 class ChuteSerializer(serializers.ModelSerializer):
@@ -223,3 +513,17 @@ class StockMatiereSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'quantite_disponible', 'created_at', 'updated_at']
 
+
+
+class TacheOptimisationSerializer(serializers.ModelSerializer):
+    statut_label = serializers.CharField(source='get_statut_display', read_only=True)
+    type_tache_label = serializers.CharField(source='get_type_tache_display', read_only=True)
+
+    class Meta:
+        model = TacheOptimisation
+        fields = [
+            'id', 'type_tache', 'type_tache_label', 'debit', 'lancement', 'statut', 'statut_label',
+            'progression', 'parametres', 'resultat', 'erreur', 'created_by',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
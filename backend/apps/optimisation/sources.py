@@ -0,0 +1,182 @@
+"""
+Chutes et formats en stock proposés au moteur avant les plaques neuves
+- Sélection par l'index partiel (matiere, epaisseur, largeur, longueur) des lignes disponibles
+- Les chutes trop étroites pour la plus petite pièce sont écartées dès la requête
+- Les plus petites chutes sont proposées en premier, dans la limite de
+  settings.OPTIMISATION_CHUTES_MAX_CANDIDATS
+- Pour les barres, seule la longueur compte : les chutes et barres en stock
+  plus courtes que la plus petite pièce sont écartées
+- Les supports retenus par le plan sont réservés ; une ré-optimisation libère
+  d'abord les réservations du plan précédent
+- Une ligne de chutes de barres (quantite > 1) dont le plan n'utilise qu'une partie
+  est scindée : la ligne du plan (même id) est réservée pour la quantité utilisée,
+  le reste passe sur une nouvelle ligne disponible
+- La réservation verrouille les lignes (select_for_update) et vérifie qu'elles sont
+  encore disponibles : un plan calculé sur une chute ou un stock réservé entre-temps
+  par une autre optimisation lève SourcesIndisponibles
+"""
+from collections import Counter
+from decimal import Decimal
+from typing import List, Dict, Optional
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Chute, StockMatiere
+
+
+class SourcesIndisponibles(Exception):
+    """Chutes ou stocks du plan réservés entre-temps par une autre optimisation"""
+
+
+def prix_au_prorata(matiere, largeur, longueur, barres: bool = False) -> Optional[Decimal]:
+    """Prix d'un format déduit de celui de la matière, au prorata de son format standard"""
+    if matiere.prix_unitaire is None or not matiere.longueur_standard:
+        return None
+    if barres:
+        return matiere.prix_unitaire * Decimal(str(longueur)) / matiere.longueur_standard
+    if not matiere.largeur_standard or largeur is None:
+        return None
+    return (
+        matiere.prix_unitaire * Decimal(str(largeur)) * Decimal(str(longueur))
+        / (matiere.largeur_standard * matiere.longueur_standard)
+    )
+
+
+def sources_disponibles(matiere, epaisseur, pieces: List[Dict], barres: bool = False) -> List[Dict]:
+    """
+    Chutes puis formats en stock utilisables pour les pièces
+
+    Au format attendu par optimiser_guillotine, ou par optimiser_barres_mixtes pour les
+    barres (les stocks portent alors leur prix_unitaire).
+    """
+    if not pieces:
+        return []
+    filtres = {'matiere_id': matiere.id, 'statut': 'disponible'}
+    if barres:
+        filtres['longueur__gte'] = min(Decimal(str(piece['longueur'])) for piece in pieces)
+        ordre_chutes = ('longueur',)
+    else:
+        cote_min = min(
+            min(Decimal(str(piece.get('largeur', 0))), Decimal(str(piece['longueur'])))
+            for piece in pieces
+        )
+        filtres['largeur__gte'] = cote_min
+        filtres['longueur__gte'] = cote_min
+        ordre_chutes = ('surface', 'largeur', 'longueur')
+    if epaisseur is not None:
+        filtres['epaisseur'] = epaisseur
+
+    limite = getattr(settings, 'OPTIMISATION_CHUTES_MAX_CANDIDATS', 200)
+    chutes = (
+        Chute.objects.filter(**filtres)
+        .order_by(*ordre_chutes)
+        .values_list('id', 'largeur', 'longueur', 'quantite')[:limite]
+    )
+    stocks = (
+        StockMatiere.objects.filter(quantite__gt=F('quantite_reservee'), **filtres)
+        .order_by('largeur', 'longueur')
+        .values_list('id', 'largeur', 'longueur', 'quantite', 'quantite_reservee', 'prix_unitaire')
+    )
+
+    sources = [
+        {
+            'largeur': float(largeur or 0),
+            'longueur': float(longueur),
+            'origine': 'chute',
+            'reference': str(id_chute),
+            'quantite': quantite,
+        }
+        for id_chute, largeur, longueur, quantite in chutes
+    ]
+    for id_stock, largeur, longueur, quantite, quantite_reservee, prix in stocks:
+        source = {
+            'largeur': float(largeur),
+            'longueur': float(longueur),
+            'origine': 'stock',
+            'reference': str(id_stock),
+            'quantite': quantite - quantite_reservee,
+        }
+        if barres:
+            if prix is None:
+                prix = prix_au_prorata(matiere, largeur, longueur, barres=True)
+            source['prix_unitaire'] = None if prix is None else float(prix)
+        sources.append(source)
+    return sources
+
+
+def _supports_utilises(plan_coupe: List[Dict], origine: str) -> Counter:
+    # Une plaque partagée par plusieurs débits (voir lots.py) n'est comptée que par son débit principal ;
+    # un schéma de barres compte pour autant de barres qu'il est répété
+    utilises = Counter()
+    for plaque in plan_coupe or []:
+        if plaque.get('origine') == origine and plaque.get('reference') and plaque.get('principal', True):
+            utilises[plaque['reference']] += plaque.get('quantite', 1)
+    return utilises
+
+
+def liberer_sources(plan_coupe: List[Dict]):
+    """Rend disponibles les chutes et stocks réservés par un plan de coupe"""
+    chutes = _supports_utilises(plan_coupe, 'chute')
+    if chutes:
+        Chute.objects.filter(id__in=list(chutes), statut='reservee').update(statut='disponible')
+    for reference, nombre in _supports_utilises(plan_coupe, 'stock').items():
+        StockMatiere.objects.filter(id=reference, quantite_reservee__gte=nombre).update(
+            quantite_reservee=F('quantite_reservee') - nombre
+        )
+
+
+def reserver_sources(plan_coupe: List[Dict]):
+    """
+    Réserve les chutes et stocks utilisés par un plan de coupe
+
+    À appeler dans une transaction : les lignes sont verrouillées dans l'ordre de leur id
+    (pas d'interblocage entre deux réservations), puis leur disponibilité vérifiée.
+
+    Raises:
+        SourcesIndisponibles: une chute n'est plus disponible, ou un stock n'a plus
+        assez de formats libres
+    """
+    chutes = _supports_utilises(plan_coupe, 'chute')
+    if chutes:
+        disponibles = {
+            str(chute.id): chute
+            for chute in Chute.objects.select_for_update()
+            .filter(id__in=list(chutes), statut='disponible').order_by('id')
+        }
+        manquantes = [
+            reference for reference, nombre in chutes.items()
+            if reference not in disponibles or disponibles[reference].quantite < nombre
+        ]
+        if manquantes:
+            raise SourcesIndisponibles(f"{len(manquantes)} chute(s) du plan ne sont plus disponibles")
+        entieres = [reference for reference, nombre in chutes.items() if disponibles[reference].quantite == nombre]
+        Chute.objects.filter(id__in=entieres).update(statut='reservee')
+        restes = []
+        for reference, nombre in chutes.items():
+            chute = disponibles[reference]
+            if chute.quantite > nombre:
+                Chute.objects.filter(id=chute.id).update(statut='reservee', quantite=nombre)
+                restes.append(Chute(
+                    matiere_id=chute.matiere_id, debit_id=chute.debit_id, largeur=chute.largeur,
+                    longueur=chute.longueur, epaisseur=chute.epaisseur, surface=chute.surface,
+                    dimensions=chute.dimensions, quantite=chute.quantite - nombre,
+                ))
+        Chute.objects.bulk_create(restes)
+    stocks = _supports_utilises(plan_coupe, 'stock')
+    if stocks:
+        libres = dict(
+            StockMatiere.objects.select_for_update()
+            .filter(id__in=list(stocks), statut='disponible')
+            .order_by('id').values_list('id', F('quantite') - F('quantite_reservee'))
+        )
+        libres = {str(reference): nombre for reference, nombre in libres.items()}
+        manquants = [reference for reference, nombre in stocks.items() if libres.get(reference, 0) < nombre]
+        if manquants:
+            raise SourcesIndisponibles(
+                f"{len(manquants)} format(s) en stock du plan n'ont plus assez de plaques libres"
+            )
+        for reference, nombre in stocks.items():
+            StockMatiere.objects.filter(id=reference).update(
+                quantite_reservee=F('quantite_reservee') + nombre
+            )
@@ -0,0 +1,169 @@
+"""
+Tâches d'optimisation asynchrones
+- Une TacheOptimisation suit l'état d'une optimisation (en attente, en cours, terminée, échec) :
+  d'un débit, d'un lancement, ou la comparaison des formats source d'un débit
+  (appliquant éventuellement le format choisi, voir formats.py)
+- Le backend d'exécution est choisi par settings.OPTIMISATION_TACHES_BACKEND :
+  'thread' (pool de threads dans le processus Django, installations mono-poste),
+  'celery' (workers Celery) ou 'eager' (exécution immédiate, utile pour les tests)
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import TacheOptimisation
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_verrou_pool = threading.Lock()
+
+
+def _obtenir_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _verrou_pool:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'OPTIMISATION_TACHES_THREADS', 2),
+                thread_name_prefix='optimisation',
+            )
+    return _pool
+
+
+def nombre_pieces(pieces) -> int:
+    """Nombre de pièces physiques d'une liste de pièces de débit"""
+    return sum(int(piece.get('quantite', 1)) for piece in pieces or [])
+
+
+def est_volumineux(pieces) -> bool:
+    """Un débit est optimisé en arrière-plan au-delà de OPTIMISATION_SEUIL_ASYNCHRONE pièces"""
+    return nombre_pieces(pieces) > getattr(settings, 'OPTIMISATION_SEUIL_ASYNCHRONE', 500)
+
+
+def soumettre_tache(tache: TacheOptimisation) -> TacheOptimisation:
+    """Confie la tâche au backend configuré (après validation de la transaction courante)"""
+    backend = getattr(settings, 'OPTIMISATION_TACHES_BACKEND', 'thread')
+
+    if backend == 'eager':
+        executer_tache(tache.id)
+        tache.refresh_from_db()
+        return tache
+
+    def lancer():
+        if backend == 'celery':
+            from .tasks import executer_tache_optimisation
+            executer_tache_optimisation.delay(str(tache.id))
+        else:
+            _obtenir_pool().submit(_executer_dans_thread, tache.id)
+
+    transaction.on_commit(lancer)
+    return tache
+
+
+def creer_tache_debit(debit, utilisateur=None) -> TacheOptimisation:
+    """Crée et soumet l'optimisation d'un débit"""
+    tache = TacheOptimisation.objects.create(
+        type_tache='debit',
+        debit=debit,
+        created_by=utilisateur if utilisateur and utilisateur.is_authenticated else None,
+    )
+    return soumettre_tache(tache)
+
+
+def creer_tache_lancement(lancement, utilisateur=None) -> TacheOptimisation:
+    """Crée et soumet l'optimisation groupée de tous les débits d'un lancement"""
+    tache = TacheOptimisation.objects.create(
+        type_tache='lancement',
+        lancement=lancement,
+        created_by=utilisateur if utilisateur and utilisateur.is_authenticated else None,
+    )
+    return soumettre_tache(tache)
+
+
+def creer_tache_formats(debit, appliquer: bool = False, format_choisi: str = None,
+                        utilisateur=None) -> TacheOptimisation:
+    """Crée et soumet la comparaison des formats d'un débit (puis l'application du format choisi)"""
+    tache = TacheOptimisation.objects.create(
+        type_tache='formats',
+        debit=debit,
+        parametres={'appliquer': appliquer, 'format': format_choisi},
+        created_by=utilisateur if utilisateur and utilisateur.is_authenticated else None,
+    )
+    return soumettre_tache(tache)
+
+
+def _comparer_formats(tache: TacheOptimisation) -> dict:
+    from .formats import appliquer_format, choisir_format, classement, comparer_formats
+
+    debit = tache.debit
+    candidats = comparer_formats(debit.lancement, debit.pieces, debit.sens_coupe, debit.epaisseur)
+    if not candidats:
+        raise ValueError('Aucun format standard ni stock disponible pour cette matière')
+    resultat = {'formats': classement(candidats)}
+    if tache.parametres.get('appliquer'):
+        candidat = choisir_format(candidats, tache.parametres.get('format'))
+        appliquer_format(debit, candidat)
+        resultat['format_applique'] = candidat['format']['cle']
+    return resultat
+
+
+def _executer_dans_thread(tache_id):
+    try:
+        executer_tache(tache_id)
+    finally:
+        # Chaque thread ouvre ses propres connexions : on les libère
+        connections.close_all()
+
+
+def _mettre_a_jour(tache: TacheOptimisation, **champs):
+    for champ, valeur in champs.items():
+        setattr(tache, champ, valeur)
+    tache.save(update_fields=list(champs))
+
+
+def executer_tache(tache_id):
+    """Exécute une tâche d'optimisation et enregistre son état à chaque étape"""
+    from .lots import optimiser_lancement
+    from .serializers import DebitSerializer
+
+    tache = TacheOptimisation.objects.select_related(
+        'debit__lancement__matiere', 'debit__lancement__parametres',
+        'lancement__matiere', 'lancement__parametres',
+    ).get(id=tache_id)
+    if tache.statut != 'en_attente':
+        return tache
+
+    _mettre_a_jour(tache, statut='en_cours', progression=10, started_at=timezone.now())
+    try:
+        if tache.type_tache in ('lancement', 'formats'):
+            if tache.type_tache == 'lancement':
+                resultat = optimiser_lancement(tache.lancement)
+            else:
+                resultat = _comparer_formats(tache)
+            _mettre_a_jour(
+                tache, statut='terminee', progression=100, resultat=resultat, finished_at=timezone.now()
+            )
+            return tache
+
+        debit = DebitSerializer()._optimiser_debit(tache.debit)
+        erreur = debit.resultat_optimisation.get('erreur')
+        if erreur:
+            raise RuntimeError(erreur)
+        _mettre_a_jour(
+            tache,
+            statut='terminee',
+            progression=100,
+            resultat={
+                'taux_utilisation': float(debit.taux_utilisation),
+                'nombre_plaques_necessaires': debit.nombre_plaques_necessaires,
+            },
+            finished_at=timezone.now(),
+        )
+    except Exception as e:
+        logger.exception("Échec de la tâche d'optimisation %s", tache_id)
+        _mettre_a_jour(tache, statut='echec', erreur=str(e), finished_at=timezone.now())
+    return tache
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task
+def executer_tache_optimisation(tache_id):
+    """Tâche Celery : exécute une TacheOptimisation"""
+    from .taches import executer_tache
+    executer_tache(tache_id)
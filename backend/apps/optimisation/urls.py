@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     MatiereViewSet, ParametresDebitViewSet, AffaireViewSet,
-    LancementViewSet, DebitViewSet, ChuteViewSet, StockMatiereViewSet
+    LancementViewSet, DebitViewSet, ChuteViewSet, StockMatiereViewSet,
+    TacheOptimisationViewSet
 )
 
 router = DefaultRouter()
@@ -13,6 +14,7 @@ router.register(r'lancements', LancementViewSet, basename='lancement')
 router.register(r'debits', DebitViewSet, basename='debit')
 router.register(r'chutes', ChuteViewSet, basename='chute')
 router.register(r'stocks', StockMatiereViewSet, basename='stock-matiere')
+router.register(r'taches', TacheOptimisationViewSet, basename='tache-optimisation')
 
 urlpatterns = [
     path('', include(router.urls)),
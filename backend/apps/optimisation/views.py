@@ -1,15 +1,62 @@
+import json
+import logging
+import time
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, F
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, F, Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.text import slugify
 from .models import (
-    Matiere, ParametresDebit, Affaire, Lancement, Debit, Chute, StockMatiere
+    Matiere, ParametresDebit, Affaire, Lancement, Debit, Chute, StockMatiere,
+    TacheOptimisation
 )
 from .serializers import (
     MatiereSerializer, ParametresDebitSerializer, AffaireSerializer,
-    LancementSerializer, DebitSerializer, ChuteSerializer, StockMatiereSerializer
+    LancementSerializer, DebitSerializer, DebitResumeSerializer, ChuteSerializer,
+    StockMatiereSerializer, TacheOptimisationSerializer
+)
+from .cache import obtenir_cache
+from .exports import (
+    archive_lancement, enregistrer_programme, est_plan_barres, lignes_programme,
+    nom_fichier, obtenir_dialecte, octets
 )
+from .formats import appliquer_format, choisir_format, classement, comparer_formats
+from .lots import optimiser_lancement, pieces_lancement
+from .sources import SourcesIndisponibles, liberer_sources
+from .taches import creer_tache_debit, creer_tache_formats, creer_tache_lancement, est_volumineux
+
+logger = logging.getLogger(__name__)
+
+
+def _evenement_sse(nom: str, donnees) -> str:
+    return f"event: {nom}\ndata: {json.dumps(donnees, cls=JSONEncoder)}\n\n"
+
+
+class EvenementsRenderer(BaseRenderer):
+    """Accepte les clients EventSource ; une réponse d'erreur devient un événement 'erreur'"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return _evenement_sse('erreur', data).encode(self.charset)
+
+
+def _dialecte_demande(request, defaut: str = 'ascii'):
+    """Dialecte d'export demandé (paramètre dialecte) ; ValueError s'il est inconnu"""
+    return obtenir_dialecte(request.query_params.get('dialecte', defaut).lower())
+
+
+def _debits_sans_plan():
+    """Débits des listes imbriquées : le plan de coupe n'est ni lu ni décodé"""
+    return Prefetch('debits', queryset=Debit.objects.defer('plan_coupe'))
 
 
 class MatiereViewSet(viewsets.ModelViewSet):
@@ -49,7 +96,9 @@ class AffaireViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Affaire.objects.select_related('chantier', 'created_by').prefetch_related('lancements').all()
+        queryset = Affaire.objects.select_related('chantier', 'created_by').prefetch_related(
+            'lancements', Prefetch('lancements__debits', queryset=Debit.objects.defer('plan_coupe'))
+        ).all()
         
         statut = self.request.query_params.get('statut')
         if statut:
@@ -68,7 +117,9 @@ class LancementViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Lancement.objects.select_related('affaire', 'matiere', 'parametres').prefetch_related('debits').all()
+        queryset = Lancement.objects.select_related('affaire', 'matiere', 'parametres').prefetch_related(
+            _debits_sans_plan()
+        ).all()
         
         affaire_id = self.request.query_params.get('affaire')
         if affaire_id:
@@ -80,14 +131,73 @@ class LancementViewSet(viewsets.ModelViewSet):
         
         return queryset.order_by('-date_lancement', '-created_at')
 
+    @action(detail=True, methods=['post'])
+    def optimiser(self, request, pk=None):
+        """
+        Optimise ensemble tous les débits du lancement
+
+        Les pièces de tous les débits sont placées sur des plaques communes, puis chaque
+        débit reçoit sa part du plan. Avec asynchrone=true (ou pour un lancement
+        volumineux), la réponse 202 contient la tâche à suivre sur /taches/<id>/.
+        """
+        lancement = self.get_object()
+        asynchrone = str(
+            request.data.get('asynchrone', request.query_params.get('asynchrone', ''))
+        ).lower() == 'true'
+        if asynchrone or est_volumineux(pieces_lancement(lancement)):
+            tache = creer_tache_lancement(lancement, request.user)
+            return Response(TacheOptimisationSerializer(tache).data, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            optimiser_lancement(lancement)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(LancementSerializer(self.get_object()).data)
+
+    @action(detail=True, methods=['get'])
+    def exporter(self, request, pk=None):
+        """
+        Archive ZIP des programmes de coupe de tous les débits optimisés du lancement
+
+        Paramètre dialecte : ascii (défaut), csv ou gcode. L'archive est produite débit
+        par débit pendant l'envoi : les plans sont lus et décodés un à un, au fil des
+        fichiers de l'archive.
+        """
+        lancement = self.get_object()
+        try:
+            dialecte = _dialecte_demande(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        debits = lancement.debits.order_by('numero_debit', 'created_at')
+        # Un plan de barres se reconnaît à son résultat (nombre_barres), sans décoder le plan
+        if not dialecte.barres and debits.filter(resultat_optimisation__has_key='nombre_barres').exists():
+            return Response(
+                {'error': f"Le dialecte {dialecte.nom} ne gère pas les débits de barres"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        nom = slugify(f"{lancement.affaire.numero_affaire}-{lancement.numero_lancement}-{dialecte.nom}")
+        response = StreamingHttpResponse(
+            archive_lancement(debits.iterator(chunk_size=1), dialecte), content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nom}.zip"'
+        return response
+
 
 class DebitViewSet(viewsets.ModelViewSet):
     queryset = Debit.objects.select_related('lancement').all()
     serializer_class = DebitSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return DebitResumeSerializer
+        return DebitSerializer
+
     def get_queryset(self):
         queryset = Debit.objects.select_related('lancement').all()
+        if self.action == 'list':
+            queryset = queryset.defer('plan_coupe')
         
         lancement_id = self.request.query_params.get('lancement')
         if lancement_id:
@@ -97,22 +207,189 @@ class DebitViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def optimiser(self, request, pk=None):
-        """Force la réoptimisation du débit"""
+        """
+        Force la réoptimisation du débit
+        
+        Avec asynchrone=true (ou pour un débit volumineux), l'optimisation devient une
+        tâche de fond : la réponse 202 contient la tâche à suivre sur /taches/<id>/.
+        """
         debit = self.get_object()
+        asynchrone = str(
+            request.data.get('asynchrone', request.query_params.get('asynchrone', ''))
+        ).lower() == 'true'
+        if asynchrone or est_volumineux(debit.pieces):
+            tache = creer_tache_debit(debit, request.user)
+            return Response(TacheOptimisationSerializer(tache).data, status=status.HTTP_202_ACCEPTED)
+        
         serializer = self.get_serializer(debit)
         # L'optimisation se fait automatiquement dans le serializer
         debit = serializer._optimiser_debit(debit)
         return Response(DebitSerializer(debit).data)
 
+    @action(detail=True, methods=['get', 'post'], url_path='optimiser-progressif',
+            renderer_classes=[JSONRenderer, EvenementsRenderer])
+    def optimiser_progressif(self, request, pk=None):
+        """
+        Optimisation progressive diffusée en Server-Sent Events
+
+        Un premier plan glouton est envoyé tout de suite (événement 'plan'), puis chaque
+        plan meilleur jusqu'à la fin du budget (paramètre budget, en secondes), au plus
+        un toutes les OPTIMISATION_PROGRESSIF_INTERVALLE secondes sauf si le nombre de
+        plaques baisse. Le meilleur plan est enregistré sur le débit, puis l'événement
+        'fin' contient le débit à jour. Si le client se déconnecte, le meilleur plan
+        trouvé jusque-là est enregistré.
+
+        Les chutes et stocks réservés par le plan actuel sont proposés au calcul, mais
+        ne sont rendus qu'à l'enregistrement d'un nouveau plan, dans la même transaction
+        que sa réservation : sans plan (erreur, déconnexion avant le premier), le plan
+        actuel et ses réservations restent en place.
+        """
+        debit = self.get_object()
+        try:
+            budget = float(request.data.get('budget', request.query_params.get('budget', '')) or
+                           settings.OPTIMISATION_BUDGET_SECONDES)
+        except ValueError:
+            return Response({'error': 'budget invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        budget = max(0.0, min(budget, settings.OPTIMISATION_PROGRESSIF_BUDGET_MAX))
+
+        def evenements():
+            meilleur = None
+            enregistre = False
+            try:
+                with transaction.atomic():
+                    # Sources vues comme si le plan actuel était libéré, puis annulation
+                    liberer_sources(debit.plan_coupe)
+                    contexte = DebitSerializer._preparer(
+                        debit.lancement, debit.pieces, debit.largeur_source, debit.longueur_source,
+                        debit.sens_coupe, debit.epaisseur
+                    )
+                    transaction.set_rollback(True)
+                optimiseur = contexte['optimiseur']
+                if contexte['methode'] == 'barre':
+                    plans = iter([DebitSerializer._optimiser_barres(contexte, debit.pieces, debit.longueur_source)])
+                elif contexte['methode'] == 'bandes':
+                    plans = iter([optimiseur.optimiser_bandes(
+                        debit.pieces, contexte['sens_coupe'], sources=contexte['sources']
+                    )])
+                else:
+                    plans = optimiseur.optimiser_progressif(
+                        debit.pieces, contexte['sens_coupe'], budget, contexte['sources']
+                    )
+
+                envoye = None
+                dernier_envoi = 0
+                for resultat in plans:
+                    meilleur = resultat
+                    if (envoye is None
+                            or resultat.get('nombre_plaques') != envoye.get('nombre_plaques')
+                            or time.monotonic() - dernier_envoi >= settings.OPTIMISATION_PROGRESSIF_INTERVALLE):
+                        yield _evenement_sse('plan', resultat)
+                        envoye = resultat
+                        dernier_envoi = time.monotonic()
+                if meilleur is not envoye:
+                    yield _evenement_sse('plan', meilleur)
+
+                # Un enregistrement qui échoue n'est pas retenté à la fermeture du flux
+                enregistre = True
+                DebitSerializer._remplacer_resultat(debit, meilleur)
+                yield _evenement_sse('fin', DebitSerializer(debit).data)
+            except Exception as e:
+                yield _evenement_sse('erreur', {'error': str(e)})
+            finally:
+                if meilleur is not None and not enregistre:
+                    try:
+                        DebitSerializer._remplacer_resultat(debit, meilleur)
+                    except Exception as e:
+                        logger.error(f"Plan progressif du débit {debit.pk} non enregistré : {e}")
+
+        response = StreamingHttpResponse(evenements(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=True, methods=['get', 'post'])
+    def formats(self, request, pk=None):
+        """
+        Compare les formats source de la matière pour les pièces du débit
+
+        GET : plans classés du moins cher au plus cher (format, coût, plaques, taux).
+        POST : applique le format choisi (paramètre format : clé du candidat, le moins
+        cher par défaut) et renvoie le débit à jour avec le classement.
+
+        Avec asynchrone=true (ou pour un débit volumineux), la comparaison devient une
+        tâche de fond : la réponse 202 contient la tâche, dont le résultat porte le
+        classement (et 'format_applique' pour un POST).
+        """
+        debit = self.get_object()
+        if not debit.pieces:
+            return Response({'error': 'Le débit n\'a pas de pièces'}, status=status.HTTP_400_BAD_REQUEST)
+        choix = request.data.get('format') if request.method == 'POST' else None
+        asynchrone = str(
+            request.data.get('asynchrone', request.query_params.get('asynchrone', ''))
+        ).lower() == 'true'
+        if asynchrone or est_volumineux(debit.pieces):
+            tache = creer_tache_formats(debit, request.method == 'POST', choix, request.user)
+            return Response(TacheOptimisationSerializer(tache).data, status=status.HTTP_202_ACCEPTED)
+
+        candidats = comparer_formats(debit.lancement, debit.pieces, debit.sens_coupe, debit.epaisseur)
+        if not candidats:
+            return Response(
+                {'error': 'Aucun format standard ni stock disponible pour cette matière'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        lignes = classement(candidats)
+        if request.method == 'GET':
+            return Response({'formats': lignes})
+
+        try:
+            debit = appliquer_format(debit, choisir_format(candidats, choix))
+        except (ValueError, SourcesIndisponibles) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'formats': lignes, 'debit': DebitSerializer(debit).data})
+
+    @action(detail=False, methods=['get'], url_path='statistiques-cache')
+    def statistiques_cache(self, request):
+        """Compteurs du cache des résultats d'optimisation"""
+        return Response(obtenir_cache().statistiques())
+
+    @action(detail=True, methods=['get'])
+    def exporter(self, request, pk=None):
+        """
+        Exporte le programme de coupe du débit (paramètre dialecte : ascii, csv ou gcode)
+
+        Le fichier est diffusé plaque par plaque. Avec enregistrer=true, il est écrit
+        dans MEDIA_ROOT/exports et son chemin est reporté sur le débit
+        (fichier_ascii_path ou fichier_cnc_path).
+        """
+        try:
+            dialecte = _dialecte_demande(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._exporter(request, self.get_object(), dialecte)
+
     @action(detail=True, methods=['get'])
     def exporter_ascii(self, request, pk=None):
         """Exporte le débit au format ASCII"""
-        debit = self.get_object()
-        # TODO: Implémenter l'export ASCII
-        return Response({
-            'message': 'Export ASCII à implémenter',
-            'debit_id': str(debit.id),
-        })
+        return self._exporter(request, self.get_object(), obtenir_dialecte('ascii'))
+
+    def _exporter(self, request, debit, dialecte):
+        if not debit.plan_coupe:
+            return Response({'error': 'Le débit n\'est pas optimisé'}, status=status.HTTP_400_BAD_REQUEST)
+        if est_plan_barres(debit.plan_coupe) and not dialecte.barres:
+            return Response(
+                {'error': f"Le dialecte {dialecte.nom} ne gère pas les débits de barres"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.query_params.get('enregistrer', '').lower() == 'true':
+            chemin = enregistrer_programme(debit, dialecte)
+            return Response({'fichier': str(chemin), 'debit': DebitSerializer(debit).data})
+
+        response = StreamingHttpResponse(
+            octets(lignes_programme(debit, dialecte)), content_type='text/plain; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier(debit, dialecte)}"'
+        return response
 
 
 class ChuteViewSet(viewsets.ModelViewSet):
@@ -180,3 +457,27 @@ class StockMatiereViewSet(viewsets.ModelViewSet):
             'message': 'Export de ruptures à implémenter'
         }, status=status.HTTP_501_NOT_IMPLEMENTED)
 
+
+
+class TacheOptimisationViewSet(viewsets.ReadOnlyModelViewSet):
+    """Suivi des optimisations en arrière-plan (polling)"""
+    queryset = TacheOptimisation.objects.all()
+    serializer_class = TacheOptimisationSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = TacheOptimisation.objects.all()
+        
+        debit_id = self.request.query_params.get('debit')
+        if debit_id:
+            queryset = queryset.filter(debit_id=debit_id)
+        
+        lancement_id = self.request.query_params.get('lancement')
+        if lancement_id:
+            queryset = queryset.filter(lancement_id=lancement_id)
+        
+        statut = self.request.query_params.get('statut')
+        if statut:
+            queryset = queryset.filter(statut=statut)
+        
+        return queryset.order_by('-created_at')
@@ -1,14 +1,16 @@
 from django.contrib import admin
-from .models import Categorie, Article, Fournisseur, Mouvement, CommandeFournisseurLigne
+from .models import (
+    Categorie, Article, Fournisseur, Mouvement, CommandeFournisseurLigne, SoldeArticle, EvenementAlerteStock,
+    CoucheStock, ValorisationStock, InstantaneStock
+)
 
 admin.site.register(Categorie)
 admin.site.register(Article)
 admin.site.register(Fournisseur)
 admin.site.register(Mouvement)
 admin.site.register(CommandeFournisseurLigne)
-
-
-
-
-
-
+admin.site.register(SoldeArticle)
+admin.site.register(EvenementAlerteStock)
+admin.site.register(CoucheStock)
+admin.site.register(ValorisationStock)
+admin.site.register(InstantaneStock)
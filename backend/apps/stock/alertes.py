@@ -0,0 +1,127 @@
+"""
+Alertes de stock faible
+- Article.en_alerte (index partiel) marque les articles actifs dont le stock est
+  au plus égal au stock minimum : la liste des stocks faibles ne parcourt plus
+  tous les articles
+- Le drapeau est réévalué pour les seuls articles touchés, après chaque mouvement
+  (registre.py) et chaque modification d'article (stock, minimum, actif)
+- Chaque bascule est journalisée (EvenementAlerteStock, identifiant croissant) :
+  un client ne relit que les bascules postérieures à son dernier curseur
+- Les identifiants sont attribués à l'insertion, pas au commit : un événement peut
+  devenir visible après un événement d'identifiant supérieur. Le curseur garde donc,
+  en plus du dernier identifiant lu, les identifiants manquants (lacunes) de la
+  fenêtre récente (settings.STOCK_ALERTES_FENETRE_SECONDES, selon created_at) ; ils
+  sont relus à l'appel suivant, chaque événement n'étant renvoyé qu'une fois. Une
+  transaction plus longue que la fenêtre peut encore faire manquer un événement
+"""
+from datetime import timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Article, EvenementAlerteStock
+
+# Nombre maximal d'événements renvoyés par appel au fil des alertes
+EVENEMENTS_MAX = 500
+
+
+def evaluer_alertes(article_ids: Iterable) -> List[EvenementAlerteStock]:
+    """
+    Réévalue le drapeau d'alerte des articles et journalise les bascules
+
+    Returns:
+        les événements créés
+    """
+    evenements = []
+    bascules = {True: [], False: []}
+    articles = Article.objects.filter(pk__in=set(article_ids)).values_list(
+        'id', 'actif', 'stock_actuel', 'stock_minimum', 'en_alerte'
+    )
+    for article_id, actif, stock_actuel, stock_minimum, en_alerte in articles:
+        alerte = actif and stock_actuel <= stock_minimum
+        if alerte == en_alerte:
+            continue
+        bascules[alerte].append(article_id)
+        evenements.append(EvenementAlerteStock(
+            article_id=article_id,
+            type_evenement='alerte' if alerte else 'retour',
+            stock_actuel=stock_actuel,
+            stock_minimum=stock_minimum,
+        ))
+    for alerte, ids in bascules.items():
+        if ids:
+            Article.objects.filter(pk__in=ids).update(en_alerte=alerte)
+    return EvenementAlerteStock.objects.bulk_create(evenements)
+
+
+def lire_curseur(curseur: str) -> Tuple[int, List[int]]:
+    """
+    Dernier identifiant lu et lacunes d'un curseur ('<dernier>' ou '<dernier>.<lacune>...')
+
+    Raises:
+        ValueError: curseur illisible
+    """
+    valeurs = [int(valeur) for valeur in str(curseur).split('.')]
+    return valeurs[0], valeurs[1:]
+
+
+def _curseur(dernier: int, lacunes: Iterable[int]) -> str:
+    return '.'.join(str(valeur) for valeur in [dernier, *sorted(lacunes)])
+
+
+def _horizon() -> int:
+    """Premier identifiant de la fenêtre de relecture : les lacunes antérieures sont abandonnées"""
+    fenetre = timedelta(seconds=getattr(settings, 'STOCK_ALERTES_FENETRE_SECONDES', 60))
+    ancien = (
+        EvenementAlerteStock.objects.filter(created_at__lt=timezone.now() - fenetre)
+        .order_by('-id').values_list('id', flat=True).first()
+    )
+    return (ancien or 0) + 1
+
+
+def fil_alertes(depuis: str = None, limite: int = EVENEMENTS_MAX) -> Dict:
+    """
+    Bascules d'alerte postérieures au curseur 'depuis'
+
+    Sans curseur, renvoie l'état courant (articles en alerte) et le curseur à partir
+    duquel suivre les bascules.
+
+    Returns:
+        {'curseur', 'suite' (d'autres événements attendent), 'evenements'} ou
+        {'curseur', 'articles'} pour l'état initial
+
+    Raises:
+        ValueError: curseur illisible
+    """
+    dernier = EvenementAlerteStock.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    horizon = _horizon()
+    if depuis is None:
+        # Identifiants de la fenêtre pas encore visibles : à relire au premier appel
+        visibles = set(EvenementAlerteStock.objects.filter(id__gte=horizon).values_list('id', flat=True))
+        articles = Article.objects.filter(en_alerte=True).order_by('reference').values(
+            'id', 'reference', 'designation', 'stock_actuel', 'stock_minimum'
+        )
+        lacunes = set(range(horizon, dernier + 1)) - visibles
+        return {'curseur': _curseur(dernier, lacunes), 'articles': list(articles)}
+
+    lu, lacunes = lire_curseur(depuis)
+    evenements = list(
+        EvenementAlerteStock.objects.filter(Q(id__gt=lu) | Q(id__in=lacunes)).order_by('id').values(
+            'id', 'type_evenement', 'stock_actuel', 'stock_minimum', 'created_at',
+            article_ref=F('article_id'), reference=F('article__reference'),
+            designation=F('article__designation'),
+        )[:limite]
+    )
+    for evenement in evenements:
+        evenement['article'] = evenement.pop('article_ref')
+    renvoyes = {evenement['id'] for evenement in evenements}
+    # Les identifiants non renvoyés jusqu'au dernier lu ne sont pas encore visibles
+    nouveau = max([lu, *renvoyes])
+    manquants = (set(lacunes) | set(range(max(lu + 1, horizon), nouveau + 1))) - renvoyes
+    return {
+        'curseur': _curseur(nouveau, {lacune for lacune in manquants if lacune >= horizon}),
+        'suite': nouveau < dernier,
+        'evenements': evenements,
+    }
@@ -0,0 +1,133 @@
+"""
+Import en masse de mouvements de stock (réceptions, inventaires)
+- Le fichier CSV est lu ligne à ligne (séparateur détecté : ';', ',' ou tabulation,
+  virgule décimale acceptée) ; le JSON est une liste de lignes (ou un objet
+  {'mouvements': [...]})
+- Les lignes sont traitées par lots de TAILLE_LOT : une requête résout les références
+  d'articles du lot, puis les mouvements valides sont créés et appliqués en une
+  transaction (registre.enregistrer_mouvements)
+- Une ligne invalide est signalée dans le rapport sans interrompre l'import ; un lot
+  dont l'enregistrement échoue est annulé en bloc, et chacune de ses lignes signalée
+"""
+import csv
+import io
+import logging
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from django.utils import timezone
+
+from .models import Article, Mouvement
+from .registre import enregistrer_mouvements
+from .serializers import LigneMouvementSerializer
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 2000
+CHAMPS_DECIMAUX = ('quantite', 'prix_unitaire_ht')
+
+
+def lire_csv(fichier) -> Iterator[Tuple[int, Dict]]:
+    """Lignes (numéro dans le fichier, valeurs) d'un fichier CSV avec en-tête"""
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    debut = texte.readline()
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=';,\t')
+    except csv.Error:
+        dialecte = csv.excel
+    lecteur = csv.DictReader(io.StringIO(debut), dialect=dialecte)
+    entetes = [entete.strip() for entete in lecteur.fieldnames or []]
+    lecteur = csv.DictReader(texte, fieldnames=entetes, dialect=dialecte)
+    for valeurs in lecteur:
+        ligne = {}
+        for champ, valeur in valeurs.items():
+            if champ is None or valeur is None:
+                continue
+            valeur = valeur.strip()
+            if champ in CHAMPS_DECIMAUX:
+                valeur = valeur.replace(',', '.')
+            if valeur != '':
+                ligne[champ] = valeur
+        if ligne:
+            # L'en-tête occupe la ligne 1
+            yield lecteur.line_num + 1, ligne
+
+
+def lire_json(donnees: List[Dict]) -> Iterator[Tuple[int, Dict]]:
+    """Lignes (rang dans la liste, valeurs) d'une liste JSON"""
+    for numero, ligne in enumerate(donnees, 1):
+        yield numero, ligne
+
+
+def _lots(lignes: Iterable, taille: int) -> Iterator[List]:
+    lot = []
+    for ligne in lignes:
+        lot.append(ligne)
+        if len(lot) == taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def _importer_lot(lot: List[Tuple[int, Dict]], utilisateur, rapport: Dict):
+    valides = []
+    for numero, ligne in lot:
+        serializer = LigneMouvementSerializer(data=ligne)
+        if serializer.is_valid():
+            valides.append((numero, serializer.validated_data))
+        else:
+            rapport['erreurs'].append({'ligne': numero, 'erreurs': serializer.errors})
+
+    references = {donnees['article'] for _, donnees in valides}
+    articles = dict(Article.objects.filter(reference__in=references).values_list('reference', 'id'))
+    aujourd_hui = timezone.localdate()
+    mouvements, numeros = [], []
+    for numero, donnees in valides:
+        article_id = articles.get(donnees['article'])
+        if article_id is None:
+            rapport['erreurs'].append({
+                'ligne': numero,
+                'erreurs': {'article': [f"Article inconnu : {donnees['article']}"]},
+            })
+            continue
+        mouvements.append(Mouvement(
+            article_id=article_id,
+            type_mouvement=donnees['type_mouvement'],
+            quantite=donnees['quantite'],
+            prix_unitaire_ht=donnees.get('prix_unitaire_ht'),
+            date_mouvement=donnees.get('date_mouvement') or aujourd_hui,
+            reference_document=donnees.get('reference_document') or None,
+            notes=donnees.get('notes') or None,
+            created_by=utilisateur,
+        ))
+        numeros.append(numero)
+    if mouvements:
+        try:
+            enregistrer_mouvements(mouvements)
+        except Exception as e:
+            # La transaction du lot est annulée : aucun de ses mouvements n'est enregistré
+            logger.exception("Échec de l'enregistrement d'un lot de %s mouvements", len(mouvements))
+            rapport['erreurs'].extend(
+                {'ligne': numero, 'erreurs': {'non_field_errors': [f"Lot non enregistré : {e}"]}}
+                for numero in numeros
+            )
+            mouvements = []
+    rapport['lignes'] += len(lot)
+    rapport['crees'] += len(mouvements)
+    rapport['articles'].update(mouvement.article_id for mouvement in mouvements)
+
+
+def importer_mouvements(lignes: Iterable[Tuple[int, Dict]], utilisateur=None, taille_lot: int = TAILLE_LOT) -> Dict:
+    """
+    Importe des lignes de mouvements (voir lire_csv / lire_json)
+
+    Returns:
+        rapport {'lignes', 'crees', 'articles' (nombre d'articles touchés),
+        'erreurs': [{'ligne', 'erreurs'}]}
+    """
+    rapport = {'lignes': 0, 'crees': 0, 'articles': set(), 'erreurs': []}
+    for lot in _lots(lignes, taille_lot):
+        _importer_lot(lot, utilisateur, rapport)
+    rapport['erreurs'].sort(key=lambda erreur: erreur['ligne'])
+    rapport['articles'] = len(rapport['articles'])
+    return rapport
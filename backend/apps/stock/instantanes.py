@@ -0,0 +1,153 @@
+"""
+Stock à une date
+- Le stock d'un article au soir d'un jour vaut son ouverture plus les effets
+  (delta) des mouvements datés de ce jour ou d'avant (date_mouvement)
+- Des instantanés (InstantaneStock), pris chaque jour ou chaque mois par la commande
+  instantanes_stock, évitent de sommer tout l'historique : le stock à une date part
+  de l'instantané le plus proche, avant ou après, et n'ajoute (ou ne retire) que
+  les mouvements de l'intervalle, en une requête groupée par instantané de départ
+- Un mouvement daté d'un jour déjà photographié (saisie tardive, annulation)
+  corrige les instantanés de ce jour et des suivants (registre.py)
+- Les instantanés quotidiens anciens peuvent être purgés ; ceux de fin de mois
+  sont conservés
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Tuple
+
+from django.db.models import F, Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .models import Article, InstantaneStock, Mouvement
+
+ZERO = Decimal('0')
+
+
+def _sommes(article_ids, debut: date = None, fin: date = None) -> Dict:
+    """Somme des deltas par article, mouvements datés de ]debut, fin]"""
+    mouvements = Mouvement.objects.filter(article_id__in=article_ids, delta__isnull=False)
+    if debut is not None:
+        mouvements = mouvements.filter(date_mouvement__gt=debut)
+    if fin is not None:
+        mouvements = mouvements.filter(date_mouvement__lte=fin)
+    return dict(mouvements.values('article_id').annotate(total=Sum('delta')).values_list('article_id', 'total'))
+
+
+def stock_a_la_date(date_stock: date, article_ids: Iterable = None) -> Dict:
+    """
+    Stock de chaque article au soir de date_stock
+
+    Returns:
+        {id d'article: quantité}
+    """
+    articles = Article.objects.all()
+    if article_ids is not None:
+        articles = articles.filter(pk__in=list(article_ids))
+    avant = InstantaneStock.objects.filter(
+        article=OuterRef('pk'), date_instantane__lte=date_stock
+    ).order_by('-date_instantane')
+    apres = InstantaneStock.objects.filter(
+        article=OuterRef('pk'), date_instantane__gt=date_stock
+    ).order_by('date_instantane')
+    lignes = articles.annotate(
+        date_avant=Subquery(avant.values('date_instantane')[:1]),
+        quantite_avant=Subquery(avant.values('quantite')[:1]),
+        date_apres=Subquery(apres.values('date_instantane')[:1]),
+        quantite_apres=Subquery(apres.values('quantite')[:1]),
+    ).values_list(
+        'id', 'stock_actuel', 'solde__quantite_ouverture',
+        'date_avant', 'quantite_avant', 'date_apres', 'quantite_apres',
+    )
+
+    stocks = {}
+    # Point de départ de chaque article : (sens, date de l'instantané) -> {article: quantité}
+    departs = defaultdict(dict)
+    for article_id, stock_actuel, ouverture, date_avant, quantite_avant, date_apres, quantite_apres in lignes:
+        if date_avant is not None and (date_apres is None or date_stock - date_avant <= date_apres - date_stock):
+            if date_avant == date_stock:
+                stocks[article_id] = quantite_avant
+            else:
+                departs[('avant', date_avant)][article_id] = quantite_avant
+        elif date_apres is not None:
+            departs[('apres', date_apres)][article_id] = quantite_apres
+        elif ouverture is not None:
+            departs[('ouverture', None)][article_id] = ouverture
+        else:
+            # Aucun mouvement passé par le registre : le stock n'a pas varié
+            stocks[article_id] = stock_actuel
+
+    for (sens, date_depart), quantites in departs.items():
+        if sens == 'avant':
+            sommes = _sommes(quantites, date_depart, date_stock)
+        elif sens == 'apres':
+            # Rejeu à rebours depuis l'instantané suivant
+            sommes = {article_id: -total for article_id, total in _sommes(quantites, date_stock, date_depart).items()}
+        else:
+            sommes = _sommes(quantites, fin=date_stock)
+        for article_id, quantite in quantites.items():
+            stocks[article_id] = quantite + sommes.get(article_id, ZERO)
+    return stocks
+
+
+def prendre_instantane(date_instantane: date = None) -> int:
+    """
+    Enregistre le stock de tous les articles au soir d'une date (aujourd'hui par défaut)
+
+    Le calcul part des instantanés existants ; un instantané déjà pris à cette date
+    est remplacé.
+
+    Returns:
+        nombre d'articles
+    """
+    date_instantane = date_instantane or timezone.localdate()
+    instantanes = [
+        InstantaneStock(article_id=article_id, date_instantane=date_instantane, quantite=quantite)
+        for article_id, quantite in stock_a_la_date(date_instantane).items()
+    ]
+    InstantaneStock.objects.bulk_create(
+        instantanes, batch_size=500, update_conflicts=True,
+        unique_fields=['article', 'date_instantane'], update_fields=['quantite'],
+    )
+    return len(instantanes)
+
+
+def purger_instantanes(conserver_jours: int) -> int:
+    """
+    Supprime les instantanés de plus de conserver_jours jours, sauf ceux de fin de mois
+
+    Returns:
+        nombre d'instantanés supprimés
+    """
+    limite = timezone.localdate() - timedelta(days=conserver_jours)
+    dates = (
+        InstantaneStock.objects.filter(date_instantane__lt=limite)
+        .values_list('date_instantane', flat=True).distinct()
+    )
+    a_purger = [jour for jour in dates if (jour + timedelta(days=1)).day != 1]
+    if not a_purger:
+        return 0
+    supprimes, _ = InstantaneStock.objects.filter(date_instantane__in=a_purger).delete()
+    return supprimes
+
+
+def reporter_sur_instantanes(effets: Iterable[Tuple]):
+    """
+    Corrige les instantanés déjà pris des effets (article, date du mouvement, delta)
+    de mouvements appliqués ou annulés
+    """
+    cumuls = defaultdict(lambda: ZERO)
+    for article_id, date_mouvement, delta in effets:
+        if delta:
+            cumuls[(article_id, date_mouvement)] += delta
+    if not cumuls:
+        return
+    derniers = dict(
+        InstantaneStock.objects.filter(article_id__in={article_id for article_id, _ in cumuls})
+        .values('article_id').annotate(derniere=Max('date_instantane')).values_list('article_id', 'derniere')
+    )
+    for (article_id, date_mouvement), delta in cumuls.items():
+        if article_id in derniers and delta and date_mouvement <= derniers[article_id]:
+            InstantaneStock.objects.filter(
+                article_id=article_id, date_instantane__gte=date_mouvement
+            ).update(quantite=F('quantite') + delta)
@@ -0,0 +1,33 @@
+"""
+Commande Django des instantanés de stock
+Enregistre le stock de tous les articles au soir d'une date, à planifier chaque
+jour (ou en fin de mois) ; --conserver-jours purge les instantanés quotidiens
+anciens en gardant ceux de fin de mois (voir apps/stock/instantanes.py)
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.stock.instantanes import prendre_instantane, purger_instantanes
+
+
+class Command(BaseCommand):
+    help = 'Enregistre un instantané du stock de tous les articles (aujourd\'hui par défaut)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Date de l\'instantané (AAAA-MM-JJ)')
+        parser.add_argument(
+            '--conserver-jours', type=int,
+            help='Purge les instantanés plus anciens, sauf ceux de fin de mois'
+        )
+
+    def handle(self, *args, **options):
+        date_instantane = None
+        if options['date']:
+            date_instantane = parse_date(options['date'])
+            if date_instantane is None:
+                raise CommandError(f"Date invalide : {options['date']}")
+        nombre = prendre_instantane(date_instantane)
+        self.stdout.write(self.style.SUCCESS(f'✓ Instantané de {nombre} article(s) enregistré'))
+        if options['conserver_jours'] is not None:
+            supprimes = purger_instantanes(options['conserver_jours'])
+            self.stdout.write(f'{supprimes} instantané(s) purgé(s)')
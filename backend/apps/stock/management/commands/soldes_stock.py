@@ -0,0 +1,32 @@
+"""
+Commande Django de contrôle des soldes de stock
+Compare soldes et stocks des articles à l'historique des mouvements et, sur demande,
+les reconstruit (voir apps/stock/registre.py)
+"""
+from django.core.management.base import BaseCommand
+
+from apps.stock.registre import reconstruire_soldes, verifier_soldes
+
+
+class Command(BaseCommand):
+    help = 'Vérifie (ou reconstruit avec --reconstruire) les soldes de stock depuis les mouvements'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reconstruire', action='store_true',
+            help='Corrige les soldes et stocks en écart avec les mouvements'
+        )
+
+    def handle(self, *args, **options):
+        ecarts = reconstruire_soldes() if options['reconstruire'] else verifier_soldes()
+        for ecart in ecarts:
+            self.stdout.write(
+                f"{ecart['reference']} : attendu {ecart['attendu']}, solde {ecart['solde']}, "
+                f"stock {ecart['stock_actuel']} ({ecart['nombre_mouvements']} mouvements)"
+            )
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS('✓ Soldes conformes aux mouvements'))
+        elif options['reconstruire']:
+            self.stdout.write(self.style.SUCCESS(f'✓ {len(ecarts)} solde(s) reconstruit(s)'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(ecarts)} solde(s) en écart'))
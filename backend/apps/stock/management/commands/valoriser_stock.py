@@ -0,0 +1,37 @@
+"""
+Commande Django de valorisation du stock
+Photographie la valorisation (CMUP et FIFO) de tous les articles, à lancer en fin
+de mois (cron) ; --date photographie une date passée en rejouant les mouvements
+datés jusqu'à elle ; --reconstruire rejoue d'abord l'historique des mouvements
+(voir apps/stock/valorisation.py)
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.stock.valorisation import photographier, revaloriser
+
+
+class Command(BaseCommand):
+    help = 'Photographie la valorisation du stock (CMUP et FIFO) à une date (aujourd\'hui par défaut)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Date de la photographie (AAAA-MM-JJ), passée ou du jour')
+        parser.add_argument(
+            '--reconstruire', action='store_true',
+            help='Recalcule la valorisation de tous les articles depuis les mouvements'
+        )
+
+    def handle(self, *args, **options):
+        date_valorisation = None
+        if options['date']:
+            date_valorisation = parse_date(options['date'])
+            if date_valorisation is None:
+                raise CommandError(f"Date invalide : {options['date']}")
+        if options['reconstruire']:
+            nombre = revaloriser()
+            self.stdout.write(f'{nombre} article(s) revalorisé(s)')
+        try:
+            nombre = photographier(date_valorisation)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'✓ Valorisation de {nombre} article(s) photographiée'))
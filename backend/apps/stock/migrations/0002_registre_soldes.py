@@ -0,0 +1,77 @@
+# Generated by Django 5.2 on 2026-10-18 12:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def ouvrir_registre(apps, schema_editor):
+    """
+    Rejoue l'historique des mouvements pour fixer leur effet signé, puis ouvre un
+    solde par article ; l'ouverture absorbe l'écart avec le stock actuel
+    """
+    from decimal import Decimal
+
+    Article = apps.get_model('stock', 'Article')
+    Mouvement = apps.get_model('stock', 'Mouvement')
+    SoldeArticle = apps.get_model('stock', 'SoldeArticle')
+
+    cumuls = {}
+    nombres = {}
+    modifies = []
+    mouvements = Mouvement.objects.order_by('article_id', 'date_mouvement', 'created_at', 'id')
+    for mouvement in mouvements.iterator():
+        cumul = cumuls.get(mouvement.article_id, Decimal('0'))
+        if mouvement.type_mouvement == 'entree':
+            mouvement.delta = mouvement.quantite
+        elif mouvement.type_mouvement == 'sortie':
+            mouvement.delta = -mouvement.quantite
+        elif mouvement.type_mouvement == 'inventaire':
+            mouvement.delta = mouvement.quantite - cumul
+        else:
+            mouvement.delta = Decimal('0')
+        cumuls[mouvement.article_id] = cumul + mouvement.delta
+        nombres[mouvement.article_id] = nombres.get(mouvement.article_id, 0) + 1
+        modifies.append(mouvement)
+    Mouvement.objects.bulk_update(modifies, ['delta'], batch_size=1000)
+
+    SoldeArticle.objects.bulk_create([
+        SoldeArticle(
+            article_id=article_id,
+            quantite_ouverture=stock_actuel - cumuls.get(article_id, Decimal('0')),
+            quantite=stock_actuel,
+            nombre_mouvements=nombres.get(article_id, 0),
+        )
+        for article_id, stock_actuel in Article.objects.values_list('id', 'stock_actuel')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SoldeArticle',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='solde', serialize=False, to='stock.article')),
+                ('quantite_ouverture', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('quantite', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('nombre_mouvements', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Solde article',
+                'verbose_name_plural': 'Soldes articles',
+                'db_table': 'stock_soldes',
+            },
+        ),
+        migrations.AddField(
+            model_name='mouvement',
+            name='delta',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=12, null=True),
+        ),
+        migrations.RunPython(ouvrir_registre, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 12:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def initialiser_alertes(apps, schema_editor):
+    Article = apps.get_model('stock', 'Article')
+    Article.objects.filter(actif=True, stock_actuel__lte=models.F('stock_minimum')).update(en_alerte=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0002_registre_soldes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvenementAlerteStock',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('type_evenement', models.CharField(choices=[('alerte', 'Passage en stock faible'), ('retour', 'Retour au-dessus du minimum')], max_length=10)),
+                ('stock_actuel', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock_minimum', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': "Événement d'alerte stock",
+                'verbose_name_plural': "Événements d'alerte stock",
+                'db_table': 'stock_alertes_evenements',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='en_alerte',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(condition=models.Q(('en_alerte', True)), fields=['reference'], name='article_en_alerte_idx'),
+        ),
+        migrations.AddField(
+            model_name='evenementalertestock',
+            name='article',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evenements_alerte', to='stock.article'),
+        ),
+        migrations.RunPython(initialiser_alertes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.2 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rejouer(ouverture, prix_achat, mouvements):
+    """
+    Copie figée de apps.stock.valorisation.rejouer (à la date de la migration)
+
+    Returns:
+        (cmup, valeur_fifo, [(couche [quantité, prix], id du mouvement)])
+    """
+    from decimal import Decimal
+
+    zero = Decimal('0')
+    quantite, cmup, couches, nouvelles = zero, zero, [], []
+    for delta, prix, mouvement_id in [(ouverture, None, None), *mouvements]:
+        if delta > 0:
+            if prix is None:
+                prix = cmup or prix_achat
+            if quantite > 0:
+                cmup = ((quantite * cmup + delta * prix) / (quantite + delta)).quantize(Decimal('0.0001'))
+            else:
+                cmup = prix
+            reste = delta + min(quantite, zero)
+            quantite += delta
+            if reste > 0:
+                couche = [reste, prix]
+                couches.append(couche)
+                nouvelles.append((couche, mouvement_id))
+        elif delta < 0:
+            quantite += delta
+            sortie = -delta
+            while sortie > 0 and couches:
+                prise = min(couches[0][0], sortie)
+                couches[0][0] -= prise
+                sortie -= prise
+                if couches[0][0] == 0:
+                    couches.pop(0)
+    valeur_fifo = sum((reste * prix for reste, prix in couches), zero).quantize(Decimal('0.01'))
+    return cmup, valeur_fifo, nouvelles
+
+
+def ouvrir_valorisation(apps, schema_editor):
+    """Valorise chaque solde en rejouant ses mouvements depuis l'ouverture du registre"""
+    from collections import defaultdict
+
+    Article = apps.get_model('stock', 'Article')
+    Mouvement = apps.get_model('stock', 'Mouvement')
+    SoldeArticle = apps.get_model('stock', 'SoldeArticle')
+    CoucheStock = apps.get_model('stock', 'CoucheStock')
+
+    prix_achat = dict(Article.objects.values_list('id', 'prix_achat_ht'))
+    historiques = defaultdict(list)
+    mouvements = (
+        Mouvement.objects.filter(delta__isnull=False)
+        .order_by('article_id', 'created_at', 'id')
+        .values_list('article_id', 'delta', 'prix_unitaire_ht', 'id')
+    )
+    for article_id, delta, prix, mouvement_id in mouvements.iterator():
+        historiques[article_id].append((delta, prix, mouvement_id))
+
+    soldes = list(SoldeArticle.objects.all())
+    couches = []
+    for solde in soldes:
+        solde.cmup, solde.valeur_fifo, nouvelles = rejouer(
+            solde.quantite_ouverture, prix_achat[solde.article_id], historiques[solde.article_id]
+        )
+        couches.extend(
+            CoucheStock(
+                article_id=solde.article_id, mouvement_id=mouvement_id,
+                quantite_restante=couche[0], prix_unitaire=couche[1],
+            )
+            for couche, mouvement_id in nouvelles if couche[0] > 0
+        )
+    SoldeArticle.objects.bulk_update(soldes, ['cmup', 'valeur_fifo'], batch_size=500)
+    CoucheStock.objects.bulk_create(couches, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0003_alertes_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soldearticle',
+            name='cmup',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='soldearticle',
+            name='valeur_fifo',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.CreateModel(
+            name='CoucheStock',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('quantite_restante', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('prix_unitaire', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='couches', to='stock.article')),
+                ('mouvement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='couches', to='stock.mouvement')),
+            ],
+            options={
+                'verbose_name': 'Couche de stock',
+                'verbose_name_plural': 'Couches de stock',
+                'db_table': 'stock_couches',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ValorisationStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_valorisation', models.DateField()),
+                ('quantite', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('cmup', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('valeur_cmup', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('valeur_fifo', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valorisations', to='stock.article')),
+            ],
+            options={
+                'verbose_name': 'Valorisation du stock',
+                'verbose_name_plural': 'Valorisations du stock',
+                'db_table': 'stock_valorisations',
+                'indexes': [models.Index(fields=['date_valorisation'], name='stock_valor_date_va_34a182_idx')],
+                'unique_together': {('article', 'date_valorisation')},
+            },
+        ),
+        migrations.RunPython(ouvrir_valorisation, migrations.RunPython.noop),
+    ]
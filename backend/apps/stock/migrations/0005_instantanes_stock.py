@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 12:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerciale', '0004_alter_facture_numero_facture'),
+        ('stock', '0004_valorisation_stock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_instantane', models.DateField()),
+                ('quantite', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+                'db_table': 'stock_instantanes',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mouvement',
+            index=models.Index(fields=['article', 'date_mouvement'], name='stock_mouve_article_3ea4c8_idx'),
+        ),
+        migrations.AddField(
+            model_name='instantanestock',
+            name='article',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantanes', to='stock.article'),
+        ),
+        migrations.AddIndex(
+            model_name='instantanestock',
+            index=models.Index(fields=['date_instantane'], name='stock_insta_date_in_1a5555_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='instantanestock',
+            unique_together={('article', 'date_instantane')},
+        ),
+    ]
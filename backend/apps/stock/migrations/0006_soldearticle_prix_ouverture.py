@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 12:38
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def memoriser_prix_ouverture(apps, schema_editor):
+    """Les valorisations déjà ouvertes (0004) l'ont été au prix d'achat de l'article"""
+    Article = apps.get_model('stock', 'Article')
+    SoldeArticle = apps.get_model('stock', 'SoldeArticle')
+    SoldeArticle.objects.filter(cmup__isnull=False).update(
+        prix_ouverture=Subquery(Article.objects.filter(pk=OuterRef('article_id')).values('prix_achat_ht')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0005_instantanes_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='soldearticle',
+            name='prix_ouverture',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True),
+        ),
+        migrations.RunPython(memoriser_prix_ouverture, migrations.RunPython.noop),
+    ]
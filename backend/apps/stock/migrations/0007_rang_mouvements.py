@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 12:57
+
+from django.db import migrations, models
+
+
+def numeroter_mouvements(apps, schema_editor):
+    """Rang des mouvements déjà appliqués : ordre de création (created_at, id), faute de mieux"""
+    Mouvement = apps.get_model('stock', 'Mouvement')
+    SoldeArticle = apps.get_model('stock', 'SoldeArticle')
+    rangs = {}
+    mouvements = []
+    anciens = Mouvement.objects.filter(delta__isnull=False).order_by('article_id', 'created_at', 'id')
+    for mouvement in anciens.only('id', 'article_id').iterator():
+        rangs[mouvement.article_id] = mouvement.rang = rangs.get(mouvement.article_id, 0) + 1
+        mouvements.append(mouvement)
+    Mouvement.objects.bulk_update(mouvements, ['rang'], batch_size=500)
+    soldes = list(SoldeArticle.objects.filter(pk__in=list(rangs)))
+    for solde in soldes:
+        solde.dernier_rang = rangs[solde.pk]
+    SoldeArticle.objects.bulk_update(soldes, ['dernier_rang'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0006_soldearticle_prix_ouverture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mouvement',
+            name='rang',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='soldearticle',
+            name='dernier_rang',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='mouvement',
+            index=models.Index(fields=['article', 'rang'], name='stock_mouve_article_7a362d_idx'),
+        ),
+        migrations.RunPython(numeroter_mouvements, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator
 import uuid
 from django.conf import settings
+from django.utils import timezone
 
 
 class Categorie(models.Model):
@@ -47,6 +48,8 @@ class Article(models.Model):
     stock_minimum = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock_actuel = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     actif = models.BooleanField(default=True)
+    # Article actif sous son stock minimum, tenu à jour par alertes.py
+    en_alerte = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -54,6 +57,10 @@ class Article(models.Model):
         db_table = 'stock_articles'
         verbose_name = 'Article'
         verbose_name_plural = 'Articles'
+        indexes = [
+            # Liste des articles en stock faible
+            models.Index(fields=['reference'], name='article_en_alerte_idx', condition=models.Q(en_alerte=True)),
+        ]
 
     def __str__(self):
         return f"{self.reference} - {self.designation}"
@@ -166,17 +173,139 @@ class Mouvement(models.Model):
         related_name='mouvements_stock'
     )
     notes = models.TextField(null=True, blank=True)
+    # Effet signé sur le stock, fixé par le registre à l'application du mouvement (voir registre.py)
+    delta = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False)
+    # Rang d'application dans le registre de l'article : ordre des rejeux de la valorisation
+    rang = models.BigIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = 'stock_mouvements'
         verbose_name = 'Mouvement'
         verbose_name_plural = 'Mouvements'
+        indexes = [
+            # Stock à une date : somme des mouvements d'un article sur une période
+            models.Index(fields=['article', 'date_mouvement']),
+            # Rejeu de la valorisation dans l'ordre d'application
+            models.Index(fields=['article', 'rang']),
+        ]
 
     def __str__(self):
         return f"{self.type_mouvement} - {self.article.reference} - {self.quantite}"
 
 
+class SoldeArticle(models.Model):
+    """Solde courant d'un article : ouverture du registre + somme des mouvements appliqués"""
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='solde')
+    quantite_ouverture = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    quantite = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    nombre_mouvements = models.IntegerField(default=0)
+    # Rang du dernier mouvement appliqué (Mouvement.rang), jamais décrémenté
+    dernier_rang = models.BigIntegerField(default=0)
+    # Valorisation (valorisation.py) ; cmup nul tant que la valorisation n'est pas ouverte
+    cmup = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    # Prix d'achat de l'article à l'ouverture de la valorisation : prix du solde d'ouverture
+    prix_ouverture = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    valeur_fifo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'stock_soldes'
+        verbose_name = 'Solde article'
+        verbose_name_plural = 'Soldes articles'
+
+    def __str__(self):
+        return f"{self.article_id} - {self.quantite}"
+
+
+class CoucheStock(models.Model):
+    """Couche FIFO : reste d'une entrée en stock, à son prix d'entrée"""
+    id = models.BigAutoField(primary_key=True)
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='couches')
+    mouvement = models.ForeignKey(
+        Mouvement, on_delete=models.SET_NULL, null=True, blank=True, related_name='couches'
+    )
+    quantite_restante = models.DecimalField(max_digits=12, decimal_places=2)
+    prix_unitaire = models.DecimalField(max_digits=12, decimal_places=4)
+
+    class Meta:
+        db_table = 'stock_couches'
+        verbose_name = 'Couche de stock'
+        verbose_name_plural = 'Couches de stock'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.article_id} - {self.quantite_restante} x {self.prix_unitaire}"
+
+
+class ValorisationStock(models.Model):
+    """Photographie de la valorisation d'un article à une date (fin de mois...)"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='valorisations')
+    date_valorisation = models.DateField()
+    quantite = models.DecimalField(max_digits=12, decimal_places=2)
+    cmup = models.DecimalField(max_digits=12, decimal_places=4)
+    valeur_cmup = models.DecimalField(max_digits=14, decimal_places=2)
+    valeur_fifo = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stock_valorisations'
+        verbose_name = 'Valorisation du stock'
+        verbose_name_plural = 'Valorisations du stock'
+        unique_together = [['article', 'date_valorisation']]
+        indexes = [
+            models.Index(fields=['date_valorisation']),
+        ]
+
+    def __str__(self):
+        return f"{self.article_id} - {self.date_valorisation}"
+
+
+class InstantaneStock(models.Model):
+    """Stock d'un article à la fin d'une journée (mouvements datés de ce jour compris)"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='instantanes')
+    date_instantane = models.DateField()
+    quantite = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stock_instantanes'
+        verbose_name = 'Instantané de stock'
+        verbose_name_plural = 'Instantanés de stock'
+        unique_together = [['article', 'date_instantane']]
+        indexes = [
+            models.Index(fields=['date_instantane']),
+        ]
+
+    def __str__(self):
+        return f"{self.article_id} - {self.date_instantane} : {self.quantite}"
+
+
+class EvenementAlerteStock(models.Model):
+    """Passage d'un article sous son stock minimum (alerte) ou retour au-dessus (retour)"""
+    id = models.BigAutoField(primary_key=True)
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='evenements_alerte')
+    type_evenement = models.CharField(
+        max_length=10,
+        choices=[
+            ('alerte', 'Passage en stock faible'),
+            ('retour', 'Retour au-dessus du minimum'),
+        ]
+    )
+    stock_actuel = models.DecimalField(max_digits=10, decimal_places=2)
+    stock_minimum = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'stock_alertes_evenements'
+        verbose_name = 'Événement d\'alerte stock'
+        verbose_name_plural = 'Événements d\'alerte stock'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.article_id} - {self.type_evenement}"
+
+
 class CommandeFournisseurLigne(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     commande_fournisseur = models.ForeignKey(
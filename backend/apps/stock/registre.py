@@ -0,0 +1,267 @@
+"""
+Registre des mouvements de stock
+- Chaque mouvement appliqué reçoit son effet signé ('delta') : + quantité pour une
+  entrée, - quantité pour une sortie, écart avec le solde pour un inventaire ;
+  un ajustement reste sans effet sur le stock, comme auparavant
+- Le solde d'un article (SoldeArticle) vaut son ouverture plus la somme des deltas :
+  il est verrouillé (select_for_update) le temps de l'application, puis mis à jour
+  en une requête avec Article.stock_actuel ; deux mouvements simultanés sur le
+  même article ne peuvent plus s'écraser
+- Seule la colonne stock_actuel de l'article est écrite, jamais la ligne entière
+- Chaque application donne au mouvement le rang suivant du registre de l'article
+  (SoldeArticle.dernier_rang, sous le verrou du solde) : les rejeux de la
+  valorisation suivent ce rang, et non created_at, partagé par tout un import
+- La valorisation (CMUP, couches FIFO) suit chaque mouvement (valorisation.py)
+- Les instantanés de stock déjà pris aux dates des mouvements sont corrigés
+  (instantanes.py)
+- Le drapeau de stock faible des articles touchés est réévalué (alertes.py)
+- Un lot de mouvements (import) est créé en bulk_create ; chaque article touché
+  reçoit l'effet net du lot en une seule mise à jour
+- La vérification et la reconstruction recalculent tous les soldes en une seule
+  requête groupée sur les mouvements
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+from typing import Dict, List
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from .alertes import evaluer_alertes
+from .instantanes import reporter_sur_instantanes
+from .models import Article, Mouvement, SoldeArticle
+from .valorisation import revaloriser, valoriser
+
+ZERO = Decimal('0')
+
+
+def _soldes_verrouilles(article_ids) -> Dict:
+    """
+    Soldes des articles, verrouillés (select_for_update), par id d'article
+
+    Les soldes manquants sont créés à la première utilisation, le stock actuel en ouverture.
+    Les verrous sont pris dans l'ordre des ids : deux lots d'articles qui se recouvrent
+    ne peuvent pas s'interbloquer.
+    """
+    article_ids = set(article_ids)
+    soldes = {
+        solde.pk: solde
+        for solde in SoldeArticle.objects.select_for_update().filter(pk__in=article_ids).order_by('pk')
+    }
+    manquants = article_ids - set(soldes)
+    if manquants:
+        # ignore_conflicts : un mouvement concurrent a pu créer le solde entre-temps
+        SoldeArticle.objects.bulk_create([
+            SoldeArticle(article_id=article_id, quantite_ouverture=stock_actuel, quantite=stock_actuel)
+            for article_id, stock_actuel in Article.objects.filter(pk__in=manquants).values_list('id', 'stock_actuel')
+        ], ignore_conflicts=True)
+        soldes.update(
+            (solde.pk, solde)
+            for solde in SoldeArticle.objects.select_for_update().filter(pk__in=manquants).order_by('pk')
+        )
+    return soldes
+
+
+def _solde_verrouille(article_id) -> SoldeArticle:
+    return _soldes_verrouilles([article_id])[article_id]
+
+
+def effet(type_mouvement: str, quantite: Decimal, solde: Decimal) -> Decimal:
+    """Effet signé d'un mouvement sur un solde"""
+    if type_mouvement == 'entree':
+        return quantite
+    if type_mouvement == 'sortie':
+        return -quantite
+    if type_mouvement == 'inventaire':
+        return quantite - solde
+    return ZERO
+
+
+def _reporter(solde: SoldeArticle, delta: Decimal, nombre: int):
+    """Met à jour le solde verrouillé (valorisation comprise) et le stock de l'article"""
+    quantite = solde.quantite + delta
+    SoldeArticle.objects.filter(pk=solde.pk).update(
+        quantite=F('quantite') + delta,
+        nombre_mouvements=F('nombre_mouvements') + nombre,
+        dernier_rang=solde.dernier_rang,
+        cmup=solde.cmup,
+        prix_ouverture=solde.prix_ouverture,
+        valeur_fifo=solde.valeur_fifo,
+        updated_at=timezone.now(),
+    )
+    Article.objects.filter(pk=solde.pk).update(stock_actuel=quantite)
+    solde.quantite = quantite
+    solde.nombre_mouvements += nombre
+
+
+def appliquer_mouvement(mouvement: Mouvement) -> Decimal:
+    """
+    Applique un mouvement enregistré au solde de son article
+
+    Returns:
+        l'effet signé du mouvement, aussi enregistré dans mouvement.delta
+    """
+    with transaction.atomic():
+        solde = _solde_verrouille(mouvement.article_id)
+        delta = effet(mouvement.type_mouvement, mouvement.quantite, solde.quantite)
+        mouvement.delta = delta
+        solde.dernier_rang += 1
+        mouvement.rang = solde.dernier_rang
+        valoriser({mouvement.article_id: solde}, [mouvement])
+        _reporter(solde, delta, 1)
+        Mouvement.objects.filter(pk=mouvement.pk).update(delta=delta, rang=mouvement.rang)
+        reporter_sur_instantanes([(mouvement.article_id, mouvement.date_mouvement, delta)])
+        evaluer_alertes([mouvement.article_id])
+    return delta
+
+
+def enregistrer_mouvements(mouvements: List[Mouvement]) -> List[Mouvement]:
+    """
+    Crée et applique un lot de mouvements (non enregistrés), dans l'ordre de la liste
+
+    Les soldes des articles concernés sont verrouillés ensemble, les mouvements créés
+    en bulk_create, puis chaque solde reçoit l'effet net de ses mouvements en une mise
+    à jour par article.
+    """
+    with transaction.atomic():
+        soldes = _soldes_verrouilles(mouvement.article_id for mouvement in mouvements)
+        nets = defaultdict(lambda: ZERO)
+        nombres = Counter()
+        for mouvement in mouvements:
+            article_id = mouvement.article_id
+            mouvement.delta = effet(
+                mouvement.type_mouvement, mouvement.quantite, soldes[article_id].quantite + nets[article_id]
+            )
+            nets[article_id] += mouvement.delta
+            nombres[article_id] += 1
+            soldes[article_id].dernier_rang += 1
+            mouvement.rang = soldes[article_id].dernier_rang
+        Mouvement.objects.bulk_create(mouvements, batch_size=500)
+        valoriser(soldes, mouvements)
+        for article_id, net in nets.items():
+            _reporter(soldes[article_id], net, nombres[article_id])
+        reporter_sur_instantanes((m.article_id, m.date_mouvement, m.delta) for m in mouvements)
+        evaluer_alertes(nets)
+    return mouvements
+
+
+def annuler_mouvement(mouvement: Mouvement):
+    """Retire du solde de son article l'effet d'un mouvement déjà appliqué"""
+    if mouvement.delta is None:
+        return
+    with transaction.atomic():
+        solde = _solde_verrouille(mouvement.article_id)
+        _reporter(solde, -mouvement.delta, -1)
+        reporter_sur_instantanes([(mouvement.article_id, mouvement.date_mouvement, -mouvement.delta)])
+        Mouvement.objects.filter(pk=mouvement.pk).update(delta=None)
+        mouvement.delta = None
+        # Les couches FIFO ne se défont pas : l'historique de l'article est rejoué
+        revaloriser([mouvement.article_id])
+        evaluer_alertes([mouvement.article_id])
+
+
+def enregistrer_mouvement(serializer, **valeurs) -> Mouvement:
+    """Crée le mouvement d'un serializer validé et l'applique, en une transaction"""
+    with transaction.atomic():
+        mouvement = serializer.save(**valeurs)
+        appliquer_mouvement(mouvement)
+    return mouvement
+
+
+def modifier_mouvement(serializer) -> Mouvement:
+    """Met à jour un mouvement : l'ancien effet est retiré, le nouveau appliqué"""
+    with transaction.atomic():
+        annuler_mouvement(serializer.instance)
+        mouvement = serializer.save()
+        appliquer_mouvement(mouvement)
+    return mouvement
+
+
+def supprimer_mouvement(mouvement: Mouvement):
+    with transaction.atomic():
+        annuler_mouvement(mouvement)
+        mouvement.delete()
+
+
+def verifier_soldes() -> List[Dict]:
+    """
+    Compare soldes et stocks des articles à l'historique des mouvements
+
+    Une seule requête groupée somme les deltas de tous les articles.
+
+    Returns:
+        écarts : 'article', 'reference', 'ouverture', 'attendu', 'solde', 'stock_actuel',
+        'nombre_mouvements', 'dernier_rang'
+    """
+    totaux = {
+        ligne['article_id']: ligne
+        for ligne in Mouvement.objects.filter(delta__isnull=False)
+        .values('article_id').annotate(total=Sum('delta'), nombre=Count('id'), rang=Max('rang'))
+    }
+    soldes = {solde.pk: solde for solde in SoldeArticle.objects.all()}
+    ecarts = []
+    for article_id, reference, stock_actuel in Article.objects.values_list('id', 'reference', 'stock_actuel'):
+        ligne = totaux.get(article_id, {})
+        nombre = ligne.get('nombre', 0)
+        total = ligne.get('total') or ZERO
+        solde = soldes.get(article_id)
+        if solde is None and not nombre:
+            # Article sans mouvement ni solde : rien à vérifier
+            continue
+        # Solde disparu : le stock actuel est supposé refléter les mouvements
+        ouverture = solde.quantite_ouverture if solde else stock_actuel - total
+        attendu = ouverture + total
+        if solde is None or solde.quantite != attendu or stock_actuel != attendu or solde.nombre_mouvements != nombre:
+            ecarts.append({
+                'article': article_id,
+                'reference': reference,
+                'ouverture': ouverture,
+                'attendu': attendu,
+                'solde': solde.quantite if solde else None,
+                'stock_actuel': stock_actuel,
+                'nombre_mouvements': nombre,
+                'dernier_rang': max(ligne.get('rang') or 0, solde.dernier_rang if solde else 0),
+            })
+    return ecarts
+
+
+def reconstruire_soldes() -> List[Dict]:
+    """
+    Recalcule depuis les mouvements les soldes et stocks en écart
+
+    Returns:
+        les écarts corrigés (voir verifier_soldes)
+    """
+    with transaction.atomic():
+        ecarts = verifier_soldes()
+        if not ecarts:
+            return ecarts
+        maintenant = timezone.now()
+        existants = set(
+            SoldeArticle.objects.select_for_update()
+            .filter(pk__in=[ecart['article'] for ecart in ecarts]).order_by('pk').values_list('pk', flat=True)
+        )
+        a_creer, a_modifier, articles = [], [], []
+        for ecart in ecarts:
+            solde = SoldeArticle(
+                article_id=ecart['article'],
+                quantite_ouverture=ecart['ouverture'],
+                quantite=ecart['attendu'],
+                nombre_mouvements=ecart['nombre_mouvements'],
+                dernier_rang=ecart['dernier_rang'],
+                updated_at=maintenant,
+            )
+            if ecart['article'] in existants:
+                a_modifier.append(solde)
+            else:
+                a_creer.append(solde)
+            articles.append(Article(pk=ecart['article'], stock_actuel=ecart['attendu']))
+        SoldeArticle.objects.bulk_update(
+            a_modifier, ['quantite', 'nombre_mouvements', 'dernier_rang', 'updated_at'], batch_size=500
+        )
+        SoldeArticle.objects.bulk_create(a_creer, batch_size=500)
+        Article.objects.bulk_update(articles, ['stock_actuel'], batch_size=500)
+        revaloriser(ecart['article'] for ecart in ecarts)
+        evaluer_alertes(ecart['article'] for ecart in ecarts)
+    return ecarts
@@ -1,5 +1,9 @@
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Categorie, Article, Fournisseur, Mouvement, CommandeFournisseurLigne
+from .registre import appliquer_mouvement
 
 
 class CategorieSerializer(serializers.ModelSerializer):
@@ -10,15 +14,43 @@ class CategorieSerializer(serializers.ModelSerializer):
 
 class ArticleSerializer(serializers.ModelSerializer):
     categorie_nom = serializers.CharField(source='categorie.nom', read_only=True)
+    # Saisi à la création seulement : le stock initial entre par un mouvement du registre
+    stock_actuel = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False
+    )
 
     class Meta:
         model = Article
         fields = [
             'id', 'reference', 'designation', 'categorie', 'categorie_nom',
             'unite_mesure', 'prix_achat_ht', 'prix_vente_ht', 'taux_tva',
-            'stock_minimum', 'stock_actuel', 'actif', 'created_at', 'updated_at'
+            'stock_minimum', 'stock_actuel', 'actif', 'en_alerte', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'en_alerte', 'created_at', 'updated_at']
+
+    def create(self, validated_data):
+        stock_initial = validated_data.pop('stock_actuel', None)
+        with transaction.atomic():
+            article = super().create(validated_data)
+            if stock_initial:
+                request = self.context.get('request')
+                mouvement = Mouvement.objects.create(
+                    article=article,
+                    type_mouvement='entree',
+                    quantite=stock_initial,
+                    prix_unitaire_ht=article.prix_achat_ht,
+                    date_mouvement=timezone.localdate(),
+                    notes='Stock initial',
+                    created_by=request.user if request else None,
+                )
+                appliquer_mouvement(mouvement)
+                article.refresh_from_db(fields=['stock_actuel', 'en_alerte'])
+        return article
+
+    def update(self, instance, validated_data):
+        # Le stock ne change ensuite que par les mouvements (registre.py)
+        validated_data.pop('stock_actuel', None)
+        return super().update(instance, validated_data)
 
 
 class FournisseurSerializer(serializers.ModelSerializer):
@@ -41,12 +73,17 @@ class MouvementSerializer(serializers.ModelSerializer):
             'id', 'article', 'article_reference', 'type_mouvement',
             'quantite', 'prix_unitaire_ht', 'date_mouvement',
             'reference_document', 'chantier', 'commande_fournisseur',
-            'created_by', 'notes', 'created_at'
+            'created_by', 'notes', 'delta', 'created_at'
         ]
-        read_only_fields = ['id', 'created_at']
-
-
-
-
-
-
+        read_only_fields = ['id', 'delta', 'created_at']
+
+
+class LigneMouvementSerializer(serializers.Serializer):
+    """Ligne d'un import de mouvements : l'article est désigné par sa référence"""
+    article = serializers.CharField(max_length=100)
+    type_mouvement = serializers.ChoiceField(choices=Mouvement._meta.get_field('type_mouvement').choices)
+    quantite = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    prix_unitaire_ht = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    date_mouvement = serializers.DateField(required=False)
+    reference_document = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
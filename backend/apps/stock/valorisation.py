@@ -0,0 +1,331 @@
+"""
+Valorisation du stock au coût moyen unitaire pondéré (CMUP) et en FIFO
+- La valorisation suit le registre (registre.py) : chaque mouvement appliqué met à
+  jour, sous le verrou du solde, le CMUP de l'article et ses couches FIFO
+- Un effet positif entre au prix du mouvement (à défaut au CMUP courant, puis au
+  prix d'achat de l'article) ; un effet négatif sort au CMUP, et consomme les
+  couches FIFO les plus anciennes
+- La valorisation d'un article s'ouvre à son premier mouvement : son solde entre
+  au prix d'achat de l'article, mémorisé sur le solde (prix_ouverture) pour que
+  les rejeux ultérieurs partent du même prix, même si le prix d'achat a changé
+- L'annulation ou la modification d'un mouvement rejoue l'historique de l'article ;
+  la reconstruction rejoue celui de tous les articles en une passe
+- Les photographies (ValorisationStock) figent la valorisation de tous les articles
+  à une date : la valorisation de fin de mois est une lecture, pas un rejeu ; une
+  photographie d'une date passée rejoue les mouvements datés de ce jour ou d'avant
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Article, CoucheStock, Mouvement, SoldeArticle, ValorisationStock
+
+ZERO = Decimal('0')
+PRECISION_CMUP = Decimal('0.0001')
+CENTIMES = Decimal('0.01')
+
+
+class EtatValorisation:
+    """CMUP et couches FIFO ([quantité restante, prix, id de la couche]) d'un article"""
+
+    def __init__(self, quantite: Decimal = ZERO, cmup: Decimal = ZERO, couches: List[List] = None):
+        self.quantite = quantite
+        self.cmup = cmup
+        self.couches = couches if couches is not None else []
+        self.nouvelles = []  # (couche, mouvement) créées depuis le chargement
+
+    def entree(self, quantite: Decimal, prix: Decimal, mouvement=None):
+        if self.quantite > 0:
+            self.cmup = (
+                (self.quantite * self.cmup + quantite * prix) / (self.quantite + quantite)
+            ).quantize(PRECISION_CMUP)
+        else:
+            self.cmup = prix
+        # Une entrée sur stock négatif comble d'abord le manque
+        reste = quantite + min(self.quantite, ZERO)
+        self.quantite += quantite
+        if reste > 0:
+            couche = [reste, prix, None]
+            self.couches.append(couche)
+            self.nouvelles.append((couche, mouvement))
+
+    def sortie(self, quantite: Decimal):
+        self.quantite -= quantite
+        while quantite > 0 and self.couches:
+            couche = self.couches[0]
+            prise = min(couche[0], quantite)
+            couche[0] -= prise
+            quantite -= prise
+            if couche[0] == 0:
+                self.couches.pop(0)
+
+    def appliquer(self, delta: Decimal, prix: Optional[Decimal], prix_defaut: Decimal, mouvement=None):
+        """Applique l'effet signé d'un mouvement"""
+        if delta > 0:
+            if prix is None:
+                prix = self.cmup or prix_defaut
+            self.entree(delta, prix, mouvement)
+        elif delta < 0:
+            self.sortie(-delta)
+
+    @property
+    def valeur_cmup(self) -> Decimal:
+        return (max(self.quantite, ZERO) * self.cmup).quantize(CENTIMES)
+
+    @property
+    def valeur_fifo(self) -> Decimal:
+        return sum((quantite * prix for quantite, prix, _ in self.couches), ZERO).quantize(CENTIMES)
+
+
+def _prix_achat(article_ids) -> Dict:
+    return dict(Article.objects.filter(pk__in=article_ids).values_list('id', 'prix_achat_ht'))
+
+
+def _enregistrer_couches(etats: Dict, initiales: Dict):
+    """Écrit les couches modifiées : créées, entamées ou épuisées"""
+    restantes = {couche[2]: couche[0] for etat in etats.values() for couche in etat.couches if couche[2]}
+    epuisees = [pk for pk in initiales if pk not in restantes]
+    entamees = [
+        CoucheStock(pk=pk, quantite_restante=quantite)
+        for pk, quantite in restantes.items() if quantite != initiales[pk]
+    ]
+    creees = [
+        CoucheStock(
+            article_id=article_id, mouvement=mouvement,
+            quantite_restante=couche[0], prix_unitaire=couche[1],
+        )
+        for article_id, etat in etats.items() for couche, mouvement in etat.nouvelles if couche[0] > 0
+    ]
+    if epuisees:
+        CoucheStock.objects.filter(pk__in=epuisees).delete()
+    if entamees:
+        CoucheStock.objects.bulk_update(entamees, ['quantite_restante'], batch_size=500)
+    CoucheStock.objects.bulk_create(creees, batch_size=500)
+
+
+def valoriser(soldes: Dict, mouvements: Iterable[Mouvement]):
+    """
+    Valorise des mouvements tout juste appliqués (delta fixé), dans leur ordre
+
+    Les soldes, verrouillés et pas encore mis à jour de ces mouvements, reçoivent
+    leur nouveau cmup et valeur_fifo (écrits par le registre) ; les couches FIFO
+    sont écrites ici.
+    """
+    mouvements = list(mouvements)
+    article_ids = {mouvement.article_id for mouvement in mouvements}
+    prix_achat = _prix_achat(article_ids)
+    initiales = {}
+    couches = defaultdict(list)
+    for pk, article_id, quantite, prix in CoucheStock.objects.filter(article_id__in=article_ids).values_list(
+        'id', 'article_id', 'quantite_restante', 'prix_unitaire'
+    ):
+        initiales[pk] = quantite
+        couches[article_id].append([quantite, prix, pk])
+
+    etats = {}
+    for article_id in article_ids:
+        solde = soldes[article_id]
+        if solde.cmup is None:
+            # Ouverture de la valorisation : le solde entre au prix d'achat
+            solde.prix_ouverture = prix_achat[article_id]
+            etat = EtatValorisation()
+            etat.appliquer(solde.quantite, None, solde.prix_ouverture)
+        else:
+            etat = EtatValorisation(solde.quantite, solde.cmup, couches[article_id])
+        etats[article_id] = etat
+
+    for mouvement in mouvements:
+        etats[mouvement.article_id].appliquer(
+            mouvement.delta, mouvement.prix_unitaire_ht, prix_achat[mouvement.article_id], mouvement
+        )
+
+    _enregistrer_couches(etats, initiales)
+    for article_id, etat in etats.items():
+        soldes[article_id].cmup = etat.cmup
+        soldes[article_id].valeur_fifo = etat.valeur_fifo
+
+
+def rejouer(ouverture: Decimal, prix_achat: Decimal, mouvements: Iterable) -> EtatValorisation:
+    """Valorisation d'un article depuis l'ouverture du registre : mouvements (delta, prix, id)"""
+    etat = EtatValorisation()
+    etat.appliquer(ouverture, None, prix_achat)
+    for delta, prix, mouvement_id in mouvements:
+        etat.appliquer(delta, prix, prix_achat, mouvement_id)
+    return etat
+
+
+def _historiques(mouvements) -> Dict:
+    """Mouvements appliqués (delta, prix, id) de chaque article, dans l'ordre d'application"""
+    historiques = defaultdict(list)
+    for article_id, delta, prix, mouvement_id in mouvements.order_by('article_id', 'rang').values_list(
+        'article_id', 'delta', 'prix_unitaire_ht', 'id'
+    ).iterator():
+        historiques[article_id].append((delta, prix, mouvement_id))
+    return historiques
+
+
+def revaloriser(article_ids: Iterable = None) -> int:
+    """
+    Reconstruit la valorisation d'articles (de tous, par défaut) en rejouant leurs mouvements
+
+    Returns:
+        nombre d'articles revalorisés
+    """
+    with transaction.atomic():
+        soldes = SoldeArticle.objects.select_for_update().order_by('pk')
+        mouvements = Mouvement.objects.filter(delta__isnull=False)
+        if article_ids is not None:
+            article_ids = set(article_ids)
+            soldes = soldes.filter(pk__in=article_ids)
+            mouvements = mouvements.filter(article_id__in=article_ids)
+        soldes = {solde.pk: solde for solde in soldes}
+        prix_achat = _prix_achat(soldes)
+
+        historiques = _historiques(mouvements)
+
+        etats = {}
+        for article_id, solde in soldes.items():
+            if solde.prix_ouverture is None:
+                # Solde jamais valorisé (créé par la reconstruction) : ouverture au prix actuel
+                solde.prix_ouverture = prix_achat[article_id]
+            etats[article_id] = rejouer(solde.quantite_ouverture, solde.prix_ouverture, historiques[article_id])
+        CoucheStock.objects.filter(article_id__in=list(soldes)).delete()
+        CoucheStock.objects.bulk_create([
+            CoucheStock(
+                article_id=article_id, mouvement_id=mouvement_id,
+                quantite_restante=couche[0], prix_unitaire=couche[1],
+            )
+            for article_id, etat in etats.items() for couche, mouvement_id in etat.nouvelles if couche[0] > 0
+        ], batch_size=500)
+        for article_id, solde in soldes.items():
+            solde.cmup = etats[article_id].cmup
+            solde.valeur_fifo = etats[article_id].valeur_fifo
+        SoldeArticle.objects.bulk_update(
+            list(soldes.values()), ['cmup', 'valeur_fifo', 'prix_ouverture'], batch_size=500
+        )
+    return len(soldes)
+
+
+def valorisation_courante() -> List[Dict]:
+    """Valorisation actuelle de chaque article (les articles sans mouvement au prix d'achat)"""
+    lignes = []
+    articles = Article.objects.order_by('reference').values_list(
+        'id', 'reference', 'stock_actuel', 'prix_achat_ht',
+        'solde__quantite', 'solde__cmup', 'solde__valeur_fifo',
+    )
+    for article_id, reference, stock_actuel, prix_achat, quantite, cmup, valeur_fifo in articles:
+        if cmup is None:
+            etat = EtatValorisation()
+            etat.appliquer(quantite if quantite is not None else stock_actuel, None, prix_achat)
+            quantite, cmup, valeur_fifo = etat.quantite, etat.cmup, etat.valeur_fifo
+        lignes.append({
+            'article': article_id,
+            'reference': reference,
+            'quantite': quantite,
+            'cmup': cmup,
+            'valeur_cmup': (max(quantite, ZERO) * cmup).quantize(CENTIMES),
+            'valeur_fifo': valeur_fifo,
+        })
+    return lignes
+
+
+def valorisation_a_la_date(date_valorisation: date) -> List[Dict]:
+    """
+    Valorisation de chaque article au soir d'une date passée
+
+    Chaque article rejoue, depuis l'ouverture de son registre, ses mouvements datés de
+    ce jour ou d'avant (date_mouvement) ; les articles sans registre sont au prix d'achat.
+    """
+    historiques = _historiques(
+        Mouvement.objects.filter(delta__isnull=False, date_mouvement__lte=date_valorisation)
+    )
+    lignes = []
+    articles = Article.objects.order_by('reference').values_list(
+        'id', 'reference', 'stock_actuel', 'prix_achat_ht', 'solde__quantite_ouverture', 'solde__prix_ouverture',
+    )
+    for article_id, reference, stock_actuel, prix_achat, ouverture, prix_ouverture in articles:
+        if ouverture is None:
+            etat = rejouer(stock_actuel, prix_achat, [])
+        else:
+            etat = rejouer(ouverture, prix_ouverture if prix_ouverture is not None else prix_achat,
+                           historiques[article_id])
+        lignes.append({
+            'article': article_id,
+            'reference': reference,
+            'quantite': etat.quantite,
+            'cmup': etat.cmup,
+            'valeur_cmup': etat.valeur_cmup,
+            'valeur_fifo': etat.valeur_fifo,
+        })
+    return lignes
+
+
+def photographier(date_valorisation: date = None) -> int:
+    """
+    Fige la valorisation de tous les articles à une date (aujourd'hui par défaut)
+
+    Aujourd'hui, la valorisation courante est lue ; une date passée est rejouée
+    (valorisation_a_la_date) ; une date future est refusée (ValueError). Une
+    photographie existante à cette date est remplacée.
+
+    Returns:
+        nombre d'articles photographiés
+    """
+    aujourd_hui = timezone.localdate()
+    date_valorisation = date_valorisation or aujourd_hui
+    if date_valorisation > aujourd_hui:
+        raise ValueError(f'Date future : {date_valorisation}')
+    if date_valorisation == aujourd_hui:
+        lignes = valorisation_courante()
+    else:
+        lignes = valorisation_a_la_date(date_valorisation)
+    photos = [
+        ValorisationStock(
+            article_id=ligne['article'],
+            date_valorisation=date_valorisation,
+            quantite=ligne['quantite'],
+            cmup=ligne['cmup'],
+            valeur_cmup=ligne['valeur_cmup'],
+            valeur_fifo=ligne['valeur_fifo'],
+        )
+        for ligne in lignes
+    ]
+    ValorisationStock.objects.bulk_create(
+        photos, batch_size=500, update_conflicts=True,
+        unique_fields=['article', 'date_valorisation'],
+        update_fields=['quantite', 'cmup', 'valeur_cmup', 'valeur_fifo'],
+    )
+    return len(photos)
+
+
+def _synthese(lignes: List[Dict]) -> Dict:
+    return {
+        'valeur_cmup': sum((ligne['valeur_cmup'] for ligne in lignes), ZERO),
+        'valeur_fifo': sum((ligne['valeur_fifo'] for ligne in lignes), ZERO),
+        'articles': lignes,
+    }
+
+
+def valorisation(date_valorisation: date = None) -> Optional[Dict]:
+    """
+    Valorisation de tous les articles : actuelle, ou photographiée à une date
+
+    Returns:
+        {'date', 'source' ('courante' ou 'photographie'), 'valeur_cmup', 'valeur_fifo',
+        'articles'}, ou None sans photographie à cette date
+    """
+    if date_valorisation is None:
+        return {'date': timezone.localdate(), 'source': 'courante', **_synthese(valorisation_courante())}
+    lignes = list(
+        ValorisationStock.objects.filter(date_valorisation=date_valorisation)
+        .order_by('article__reference')
+        .values('article', 'quantite', 'cmup', 'valeur_cmup', 'valeur_fifo', reference=F('article__reference'))
+    )
+    if not lignes:
+        return None
+    return {'date': date_valorisation, 'source': 'photographie', **_synthese(lignes)}
@@ -1,9 +1,17 @@
+import csv
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import F
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_date
 from .models import Categorie, Article, Fournisseur, Mouvement, CommandeFournisseurLigne
+from .alertes import evaluer_alertes, fil_alertes
+from .imports import importer_mouvements, lire_csv, lire_json
+from .instantanes import stock_a_la_date
+from .registre import enregistrer_mouvement, modifier_mouvement, supprimer_mouvement
+from .valorisation import valorisation
 from .serializers import (
     CategorieSerializer, ArticleSerializer, FournisseurSerializer, MouvementSerializer
 )
@@ -23,15 +31,78 @@ class ArticleViewSet(viewsets.ModelViewSet):
     filterset_fields = ['categorie', 'actif', 'unite_mesure']
     search_fields = ['reference', 'designation']
 
+    def perform_create(self, serializer):
+        article = serializer.save()
+        if evaluer_alertes([article.id]):
+            article.refresh_from_db(fields=['en_alerte'])
+
+    def perform_update(self, serializer):
+        article = serializer.save()
+        if evaluer_alertes([article.id]):
+            article.refresh_from_db(fields=['en_alerte'])
+
     @action(detail=False, methods=['get'])
     def stock_faible(self, request):
-        articles = Article.objects.filter(
-            stock_actuel__lte=F('stock_minimum'),
-            actif=True
-        )
+        # Drapeau tenu à jour par les mouvements (index partiel)
+        articles = Article.objects.filter(en_alerte=True)
         serializer = self.get_serializer(articles, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def alertes(self, request):
+        """
+        Fil des alertes de stock faible : sans paramètre, les articles en alerte et le
+        curseur ; avec ?depuis=<curseur>, les bascules survenues depuis
+        """
+        try:
+            return Response(fil_alertes(request.query_params.get('depuis')))
+        except ValueError:
+            return Response({'error': 'curseur invalide'}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def stock_a_date(self, request):
+        """
+        Stock au soir de ?date=AAAA-MM-JJ, de tous les articles ou de ?article=<id>,
+        calculé depuis l'instantané le plus proche
+        """
+        date_stock = parse_date(request.query_params.get('date') or '')
+        if date_stock is None:
+            return Response({'error': 'date requise (AAAA-MM-JJ)'}, status=status.HTTP_400_BAD_REQUEST)
+        articles = Article.objects.order_by('reference')
+        article = request.query_params.get('article')
+        if article:
+            articles = articles.filter(pk=article)
+        try:
+            references = dict(articles.values_list('id', 'reference'))
+        except ValidationError:
+            references = {}
+        if article and not references:
+            return Response({'error': 'Article introuvable'}, status=status.HTTP_404_NOT_FOUND)
+        stocks = stock_a_la_date(date_stock, None if not article else list(references))
+        return Response({
+            'date': date_stock,
+            'articles': [
+                {'article': article_id, 'reference': reference, 'quantite': stocks[article_id]}
+                for article_id, reference in references.items()
+            ],
+        })
+
+    @action(detail=False, methods=['get'])
+    def valorisation(self, request):
+        """Valorisation CMUP et FIFO du stock : actuelle, ou photographiée à ?date=AAAA-MM-JJ"""
+        date_valorisation = request.query_params.get('date')
+        if date_valorisation is not None:
+            date_valorisation = parse_date(date_valorisation)
+            if date_valorisation is None:
+                return Response({'error': 'date invalide (AAAA-MM-JJ)'}, status=status.HTTP_400_BAD_REQUEST)
+        resultat = valorisation(date_valorisation)
+        if resultat is None:
+            return Response(
+                {'error': 'Aucune photographie de la valorisation à cette date'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(resultat)
+
 
 class FournisseurViewSet(viewsets.ModelViewSet):
     queryset = Fournisseur.objects.all()
@@ -48,14 +119,41 @@ class MouvementViewSet(viewsets.ModelViewSet):
     filterset_fields = ['type_mouvement', 'article', 'date_mouvement']
 
     def perform_create(self, serializer):
-        mouvement = serializer.save(created_by=self.request.user)
-        # Mise à jour du stock
-        article = mouvement.article
-        if mouvement.type_mouvement == 'entree':
-            article.stock_actuel += mouvement.quantite
-        elif mouvement.type_mouvement == 'sortie':
-            article.stock_actuel -= mouvement.quantite
-        elif mouvement.type_mouvement == 'inventaire':
-            article.stock_actuel = mouvement.quantite
-        article.save()
+        # Mise à jour du stock par le registre (solde verrouillé, une transaction)
+        enregistrer_mouvement(serializer, created_by=self.request.user)
+
+    def perform_update(self, serializer):
+        modifier_mouvement(serializer)
 
+    def perform_destroy(self, instance):
+        supprimer_mouvement(instance)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def importer(self, request):
+        """
+        Import en masse : fichier CSV ('fichier', multipart) ou liste JSON de lignes
+        (article = référence, type_mouvement, quantite, prix_unitaire_ht, date_mouvement,
+        reference_document, notes) ; les lignes invalides sont rapportées sans bloquer les autres
+
+        201 si des mouvements ont été créés, 200 sinon (rapport d'erreurs) ; 400 seulement
+        pour un envoi illisible.
+        """
+        fichier = request.FILES.get('fichier')
+        donnees = request.data.get('mouvements') if isinstance(request.data, dict) else request.data
+        if fichier is not None:
+            lignes = lire_csv(fichier.file)
+        elif isinstance(donnees, list) and donnees:
+            lignes = lire_json(donnees)
+        else:
+            return Response(
+                {'error': 'Fichier CSV (champ fichier) ou liste JSON de mouvements attendu'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            rapport = importer_mouvements(lignes, request.user)
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({'error': f"Fichier CSV illisible : {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            rapport,
+            status=status.HTTP_201_CREATED if rapport['crees'] else status.HTTP_200_OK
+        )
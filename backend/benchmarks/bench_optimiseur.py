@@ -0,0 +1,167 @@
+"""
+Benchmark d'OptimiseurDebit sur les charges synthétiques de generateurs.py
+
+Pour chaque scénario, taille et algorithme, on mesure la durée, le pic mémoire
+(tracemalloc, lors d'une seconde exécution pour ne pas fausser la durée), le
+nombre de plaques ou de barres et le taux d'utilisation. Les mesures sont
+écrites en JSON et en CSV, avec VERSION_ALGORITHME, pour comparer les versions
+du solveur entre elles.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_optimiseur --tailles 10,1000,10000
+    python -m benchmarks.bench_optimiseur --scenarios barres --comparer benchmarks/resultats/ancien.json
+"""
+import argparse
+import csv
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from apps.optimisation.optimisation_algo import OptimiseurDebit, VERSION_ALGORITHME
+
+from .generateurs import GENERATEURS, TAILLES
+
+ALGORITHMES = {
+    'plaque': ['guillotine', 'portefeuille', 'bandes'],
+    'barre': ['barre'],
+}
+
+COLONNES = [
+    'scenario', 'algorithme', 'nombre_pieces', 'graine', 'duree_s', 'memoire_pic_mo',
+    'nombre_plaques', 'taux_utilisation', 'pieces_non_placees', 'version_algorithme',
+]
+
+
+def executer(scenario: Dict, algorithme: str, nb_workers: int = 1, budget_secondes: float = 10) -> Dict:
+    """Lance un algorithme sur un scénario et retourne le résultat brut de l'optimiseur"""
+    optimiseur = OptimiseurDebit(
+        scenario['largeur_source'], scenario['longueur_source'], epaisseur_lame=scenario['epaisseur_lame']
+    )
+    if algorithme == 'barre':
+        return optimiseur.optimiser_barre(scenario['pieces'], scenario['longueur_source'])
+    if algorithme == 'portefeuille':
+        return optimiseur.optimiser_portefeuille(
+            scenario['pieces'], nb_workers=nb_workers, budget_secondes=budget_secondes
+        )
+    if algorithme == 'bandes':
+        return optimiseur.optimiser_bandes(scenario['pieces'])
+    return optimiseur.optimiser_guillotine(scenario['pieces'])
+
+
+def mesurer(scenario: Dict, algorithme: str, graine: int, memoire: bool = True, **options) -> Dict:
+    """Une ligne de mesures pour un scénario et un algorithme"""
+    debut = time.perf_counter()
+    resultat = executer(scenario, algorithme, **options)
+    duree = time.perf_counter() - debut
+
+    pic = None
+    if memoire:
+        tracemalloc.start()
+        executer(scenario, algorithme, **options)
+        pic = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return {
+        'scenario': scenario['nom'],
+        'algorithme': algorithme,
+        'nombre_pieces': scenario['nombre_pieces'],
+        'graine': graine,
+        'duree_s': round(duree, 4),
+        'memoire_pic_mo': round(pic, 2) if pic is not None else None,
+        'nombre_plaques': resultat.get('nombre_plaques', resultat.get('nombre_barres')),
+        'taux_utilisation': round(resultat['taux_utilisation'], 3),
+        'pieces_non_placees': sum(p['quantite'] for p in resultat.get('pieces_non_placees', [])),
+        'version_algorithme': VERSION_ALGORITHME,
+    }
+
+
+def campagne(scenarios: List[str], tailles: List[int], algorithmes: List[str] = None,
+             graine: int = 42, memoire: bool = True, **options) -> List[Dict]:
+    """Mesure toutes les combinaisons scénario x taille x algorithme applicable"""
+    mesures = []
+    for nom in scenarios:
+        for taille in tailles:
+            scenario = GENERATEURS[nom](taille, graine)
+            for algorithme in ALGORITHMES[scenario['type']]:
+                if algorithmes and algorithme not in algorithmes:
+                    continue
+                mesure = mesurer(scenario, algorithme, graine, memoire, **options)
+                print(
+                    f"{nom:<11} {taille:>6} {algorithme:<13} {mesure['duree_s']:>9.3f} s "
+                    f"{mesure['nombre_plaques']:>6} plaques/barres  {mesure['taux_utilisation']:>7.2f} %"
+                )
+                mesures.append(mesure)
+    return mesures
+
+
+def ecrire(mesures: List[Dict], repertoire: Path) -> Path:
+    """Écrit les mesures en JSON (avec le contexte d'exécution) et en CSV ; retourne le chemin JSON"""
+    repertoire.mkdir(parents=True, exist_ok=True)
+    horodatage = datetime.now().strftime('%Y%m%d_%H%M%S')
+    chemin_json = repertoire / f"bench_v{VERSION_ALGORITHME}_{horodatage}.json"
+    with open(chemin_json, 'w', encoding='utf-8') as fichier:
+        json.dump({
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'version_algorithme': VERSION_ALGORITHME,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'mesures': mesures,
+        }, fichier, indent=2, ensure_ascii=False)
+    with open(chemin_json.with_suffix('.csv'), 'w', newline='', encoding='utf-8') as fichier:
+        ecrivain = csv.DictWriter(fichier, fieldnames=COLONNES)
+        ecrivain.writeheader()
+        ecrivain.writerows(mesures)
+    return chemin_json
+
+
+def comparer(mesures: List[Dict], reference: Path):
+    """Affiche l'évolution de la durée et du nombre de plaques par rapport à une campagne précédente"""
+    with open(reference, encoding='utf-8') as fichier:
+        anciennes = {
+            (m['scenario'], m['algorithme'], m['nombre_pieces']): m
+            for m in json.load(fichier)['mesures']
+        }
+    for mesure in mesures:
+        ancienne = anciennes.get((mesure['scenario'], mesure['algorithme'], mesure['nombre_pieces']))
+        if ancienne is None:
+            continue
+        rapport = mesure['duree_s'] / ancienne['duree_s'] if ancienne['duree_s'] else 0
+        print(
+            f"{mesure['scenario']:<11} {mesure['nombre_pieces']:>6} {mesure['algorithme']:<13} "
+            f"durée x{rapport:.2f}  plaques {ancienne['nombre_plaques']} -> {mesure['nombre_plaques']}"
+        )
+
+
+def _liste(texte: str) -> List[str]:
+    return [element for element in texte.split(',') if element]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', type=_liste, default=list(GENERATEURS))
+    parser.add_argument('--tailles', type=lambda t: [int(v) for v in _liste(t)], default=TAILLES)
+    parser.add_argument('--algorithmes', type=_liste, default=None)
+    parser.add_argument('--graine', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=1, help="processus du portefeuille")
+    parser.add_argument('--budget', type=float, default=10, help="budget du portefeuille (s)")
+    parser.add_argument('--sans-memoire', action='store_true', help="ne pas mesurer le pic mémoire")
+    parser.add_argument('--sortie', type=Path, default=Path(__file__).parent / 'resultats')
+    parser.add_argument('--comparer', type=Path, default=None, help="campagne JSON de référence")
+    args = parser.parse_args()
+
+    mesures = campagne(
+        args.scenarios, args.tailles, args.algorithmes, args.graine, not args.sans_memoire,
+        nb_workers=args.workers, budget_secondes=args.budget,
+    )
+    chemin = ecrire(mesures, args.sortie)
+    print(f"Résultats : {chemin} (+ .csv)")
+    if args.comparer:
+        comparer(mesures, args.comparer)
+
+
+if __name__ == '__main__':
+    main()
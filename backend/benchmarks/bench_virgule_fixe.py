@@ -0,0 +1,56 @@
+"""
+Benchmark du cœur de placement : Decimal contre entiers en dixièmes de mm
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_virgule_fixe --pieces 10000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from apps.optimisation.dimensions import en_dixiemes
+from apps.optimisation.guillotine import PackerGuillotine
+from apps.optimisation.pieces import TypePiece
+
+
+def generer_pieces(nombre: int, graine: int = 42):
+    """Pièces de vitrage aléatoires (dimensions au dixième de mm)"""
+    alea = random.Random(graine)
+    return [
+        (Decimal(alea.randint(2000, 12000)) / 10, Decimal(alea.randint(2000, 15000)) / 10)
+        for _ in range(nombre)
+    ]
+
+
+def chronometrer(pieces, largeur, longueur, epaisseur_lame, conversion):
+    debut = time.perf_counter()
+    types = [
+        TypePiece(conversion(l), conversion(h))
+        for l, h in sorted(pieces, key=lambda p: p[0] * p[1], reverse=True)
+    ]
+    packer = PackerGuillotine(conversion(largeur), conversion(longueur), conversion(epaisseur_lame), conversion(Decimal('0')))
+    plaques, _ = packer.placer_pieces(types)
+    return time.perf_counter() - debut, len(plaques)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pieces', type=int, default=10000)
+    parser.add_argument('--graine', type=int, default=42)
+    args = parser.parse_args()
+
+    pieces = generer_pieces(args.pieces, args.graine)
+    largeur, longueur, lame = Decimal('3210'), Decimal('2250'), Decimal('4')
+
+    duree_decimal, plaques_decimal = chronometrer(pieces, largeur, longueur, lame, lambda v: v)
+    duree_entiers, plaques_entiers = chronometrer(pieces, largeur, longueur, lame, en_dixiemes)
+
+    print(f"{args.pieces} pièces")
+    print(f"  Decimal : {duree_decimal:.3f} s ({plaques_decimal} plaques)")
+    print(f"  Entiers : {duree_entiers:.3f} s ({plaques_entiers} plaques)")
+    print(f"  Accélération : x{duree_decimal / duree_entiers:.2f}")
+
+
+if __name__ == '__main__':
+    main()
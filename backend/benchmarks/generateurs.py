@@ -0,0 +1,111 @@
+"""
+Générateurs de charges synthétiques pour OptimiseurDebit
+
+Chaque générateur est déterministe pour une graine donnée et retourne un scénario :
+    {'nom', 'type' ('plaque' | 'barre'), 'pieces', 'largeur_source',
+     'longueur_source', 'epaisseur_lame', 'nombre_pieces'}
+Les pièces sont au format des débits (largeur, longueur, quantite, nom).
+"""
+import random
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+
+def _scenario(nom: str, type_scenario: str, pieces: List[Dict], largeur_source, longueur_source,
+              epaisseur_lame) -> Dict:
+    return {
+        'nom': nom,
+        'type': type_scenario,
+        'pieces': pieces,
+        'largeur_source': Decimal(str(largeur_source)),
+        'longueur_source': Decimal(str(longueur_source)),
+        'epaisseur_lame': Decimal(str(epaisseur_lame)),
+        'nombre_pieces': sum(piece['quantite'] for piece in pieces),
+    }
+
+
+def _lignes(alea: random.Random, nombre: int, tirer: Callable[[], Dict], quantite_max: int) -> List[Dict]:
+    """Tire des lignes de débit jusqu'à atteindre exactement le nombre de pièces demandé"""
+    pieces = []
+    restant = nombre
+    while restant > 0:
+        piece = tirer()
+        piece['quantite'] = min(restant, alea.randint(1, quantite_max))
+        restant -= piece['quantite']
+        pieces.append(piece)
+    return pieces
+
+
+def vitrages(nombre: int, graine: int = 42) -> Dict:
+    """Vitrages de fenêtres : quelques gammes de menuiseries, cotes au mm, petites séries"""
+    alea = random.Random(graine)
+    gammes = [(400, 900, 500, 1400), (600, 1400, 900, 2200), (300, 700, 300, 700)]
+
+    def tirer():
+        l_min, l_max, h_min, h_max = alea.choice(gammes)
+        return {
+            'largeur': alea.randint(l_min, l_max),
+            'longueur': alea.randint(h_min, h_max),
+            'nom': f"V{alea.randint(1, 500)}",
+        }
+
+    return _scenario('vitrages', 'plaque', _lignes(alea, nombre, tirer, 4), 3210, 2250, 3)
+
+
+def etageres(nombre: int, graine: int = 42) -> Dict:
+    """Étagères : profondeurs normalisées, longueurs au pas de 50 mm, grandes séries"""
+    alea = random.Random(graine)
+    profondeurs = [250, 300, 350, 400, 600]
+
+    def tirer():
+        profondeur = alea.choice(profondeurs)
+        longueur = alea.randrange(600, 2401, 50)
+        return {'largeur': longueur, 'longueur': profondeur, 'nom': f"E{longueur}x{profondeur}"}
+
+    return _scenario('etageres', 'plaque', _lignes(alea, nombre, tirer, 40), 2800, 2070, 4)
+
+
+def barres(nombre: int, graine: int = 42) -> Dict:
+    """Longues listes de barres : profilés de 300 à 3000 mm sur barres de 6500 mm"""
+    alea = random.Random(graine)
+
+    def tirer():
+        longueur = alea.randint(300, 3000)
+        return {'longueur': longueur, 'nom': f"P{longueur}"}
+
+    return _scenario('barres', 'barre', _lignes(alea, nombre, tirer, 20), 0, 6500, 4)
+
+
+def identiques(nombre: int, graine: int = 42) -> Dict:
+    """Cas pathologique : une seule pièce répétée"""
+    return _scenario(
+        'identiques', 'plaque',
+        [{'largeur': 500, 'longueur': 400, 'quantite': nombre, 'nom': 'A'}],
+        3210, 2250, 3,
+    )
+
+
+def uniques(nombre: int, graine: int = 42) -> Dict:
+    """Cas pathologique : toutes les pièces sont différentes (au dixième de mm)"""
+    alea = random.Random(graine)
+    pieces = [
+        {
+            'largeur': alea.randint(1000, 9000) / 10,
+            'longueur': alea.randint(1000, 9000) / 10,
+            'quantite': 1,
+            'nom': f"U{i}",
+        }
+        for i in range(nombre)
+    ]
+    return _scenario('uniques', 'plaque', pieces, 3210, 2250, 3)
+
+
+GENERATEURS = {
+    'vitrages': vitrages,
+    'etageres': etageres,
+    'barres': barres,
+    'identiques': identiques,
+    'uniques': uniques,
+}
+
+TAILLES = [10, 100, 1000, 10000, 50000]
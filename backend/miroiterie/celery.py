@@ -0,0 +1,12 @@
+"""
+Configuration Celery pour miroiterie (tâches d'optimisation en arrière-plan)
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'miroiterie.settings')
+
+app = Celery('miroiterie')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
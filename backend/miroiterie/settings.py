@@ -166,6 +166,41 @@ CORS_ALLOW_CREDENTIALS = True
 PDF_OUTPUT_DIR = BASE_DIR / 'media' / 'pdfs'
 PDF_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Optimisation des débits
+OPTIMISATION_NB_WORKERS = int(os.getenv('OPTIMISATION_NB_WORKERS', os.cpu_count() or 1))
+OPTIMISATION_BUDGET_SECONDES = float(os.getenv('OPTIMISATION_BUDGET_SECONDES', '10'))
+# Backend des tâches : 'thread' (mono-poste), 'celery' ou 'eager' (synchrone)
+OPTIMISATION_TACHES_BACKEND = os.getenv('OPTIMISATION_TACHES_BACKEND', 'thread')
+OPTIMISATION_TACHES_THREADS = int(os.getenv('OPTIMISATION_TACHES_THREADS', '2'))
+# Au-delà de ce nombre de pièces, l'optimisation d'un débit passe en tâche de fond
+OPTIMISATION_SEUIL_ASYNCHRONE = int(os.getenv('OPTIMISATION_SEUIL_ASYNCHRONE', '500'))
+# Cache des résultats : 'memoire', 'fichier', 'base' ou 'aucun'
+OPTIMISATION_CACHE_BACKEND = os.getenv('OPTIMISATION_CACHE_BACKEND', 'memoire')
+OPTIMISATION_CACHE_TAILLE_MAX = int(os.getenv('OPTIMISATION_CACHE_TAILLE_MAX', '500'))
+OPTIMISATION_CACHE_REPERTOIRE = BASE_DIR / 'media' / 'cache_optimisation'
+# Nombre maximum de chutes proposées au moteur avant les plaques neuves
+OPTIMISATION_CHUTES_MAX_CANDIDATS = int(os.getenv('OPTIMISATION_CHUTES_MAX_CANDIDATS', '200'))
+# Optimisation progressive diffusée en SSE : budget maximum accepté et intervalle minimum entre deux plans
+OPTIMISATION_PROGRESSIF_BUDGET_MAX = float(os.getenv('OPTIMISATION_PROGRESSIF_BUDGET_MAX', '120'))
+OPTIMISATION_PROGRESSIF_INTERVALLE = float(os.getenv('OPTIMISATION_PROGRESSIF_INTERVALLE', '0.5'))
+# Modification des pièces d'un débit : au-delà de cette part de plaques touchées, ré-optimisation complète
+OPTIMISATION_INCREMENTAL_PART_MAX = float(os.getenv('OPTIMISATION_INCREMENTAL_PART_MAX', '0.5'))
+# Temps d'usinage estimé d'une plaque : vitesses en mm/s, temps en secondes
+OPTIMISATION_SCIE_VITESSE_COUPE = float(os.getenv('OPTIMISATION_SCIE_VITESSE_COUPE', '300'))
+OPTIMISATION_SCIE_VITESSE_DEPLACEMENT = float(os.getenv('OPTIMISATION_SCIE_VITESSE_DEPLACEMENT', '500'))
+OPTIMISATION_SCIE_TEMPS_ROTATION = float(os.getenv('OPTIMISATION_SCIE_TEMPS_ROTATION', '8'))
+OPTIMISATION_SCIE_TEMPS_CHARGEMENT = float(os.getenv('OPTIMISATION_SCIE_TEMPS_CHARGEMENT', '30'))
+
+# Stock : fenêtre (secondes) pendant laquelle le fil des alertes relit les événements pas encore visibles
+STOCK_ALERTES_FENETRE_SECONDES = float(os.getenv('STOCK_ALERTES_FENETRE_SECONDES', '60'))
+
+# Celery
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TIMEZONE = TIME_ZONE
+
 # Logging
 LOGS_DIR = BASE_DIR / 'logs'
 LOGS_DIR.mkdir(exist_ok=True)
@@ -0,0 +1,950 @@
+import pytest
+from collections import Counter
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from rest_framework.test import APIClient
+from apps.optimisation.cache import obtenir_cache, reinitialiser_cache
+from apps.optimisation.models import (
+    Matiere, ParametresDebit, Affaire, Lancement, Debit, Chute, StockMatiere, TacheOptimisation
+)
+from apps.optimisation.optimisation_algo import OptimiseurDebit
+from apps.optimisation.serializers import DebitSerializer
+from apps.optimisation.sources import SourcesIndisponibles, reserver_sources
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def cache_vide():
+    reinitialiser_cache()
+    yield
+    reinitialiser_cache()
+
+
+@pytest.fixture
+def api_client():
+    user = User.objects.create_user(
+        username='atelier',
+        email='atelier@example.com',
+        password='testpass123',
+        nom='Test',
+        prenom='Atelier',
+        role='atelier'
+    )
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def test_lancement():
+    matiere = Matiere.objects.create(code='VF4', designation='Float 4mm', type_matiere='vitrage')
+    parametres = ParametresDebit.objects.create(nom='Standard', epaisseur_lame=Decimal('3'))
+    affaire = Affaire.objects.create(numero_affaire='DEB-TEST-0001', nom='Affaire test')
+    return Lancement.objects.create(
+        affaire=affaire, numero_lancement='L1', matiere=matiere, parametres=parametres
+    )
+
+
+@pytest.fixture
+def test_debit(test_lancement):
+    return Debit.objects.create(
+        lancement=test_lancement,
+        numero_debit='D1',
+        largeur_source=Decimal('3210'),
+        longueur_source=Decimal('2250'),
+        pieces=[{'largeur': 1000, 'longueur': 800, 'quantite': 6, 'nom': 'A'}],
+    )
+
+
+def _chevauchement(a, b):
+    return not (a['x'] + a['largeur'] <= b['x'] or b['x'] + b['largeur'] <= a['x'] or
+                a['y'] + a['longueur'] <= b['y'] or b['y'] + b['longueur'] <= a['y'])
+
+
+class TestOptimiseurGuillotine:
+    def test_remplit_la_plaque_en_deux_dimensions(self):
+        optimiseur = OptimiseurDebit(Decimal('2006'), Decimal('2006'), epaisseur_lame=Decimal('3'))
+        resultat = optimiseur.optimiser_guillotine([
+            {'largeur': 1000, 'longueur': 1000, 'quantite': 4, 'nom': 'A'},
+        ])
+        assert resultat['nombre_plaques'] == 1
+        assert len(resultat['plan_coupe'][0]['pieces']) == 4
+        assert resultat['taux_utilisation'] > 99
+
+    def test_pieces_sans_chevauchement_et_dans_la_plaque(self):
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'), epaisseur_lame=Decimal('4'))
+        resultat = optimiseur.optimiser_guillotine([
+            {'largeur': 800, 'longueur': 600, 'quantite': 7, 'nom': 'A'},
+            {'largeur': 450, 'longueur': 1200, 'quantite': 5, 'nom': 'B'},
+            {'largeur': 300, 'longueur': 300, 'quantite': 12, 'nom': 'C'},
+        ], sens_coupe='longitudinal')
+        placees = 0
+        for plaque in resultat['plan_coupe']:
+            pieces = plaque['pieces']
+            placees += len(pieces)
+            for i, piece in enumerate(pieces):
+                assert piece['x'] + piece['largeur'] <= plaque['largeur']
+                assert piece['y'] + piece['longueur'] <= plaque['longueur']
+                for autre in pieces[i + 1:]:
+                    assert not _chevauchement(piece, autre)
+        assert placees == 24
+        assert resultat['pieces_non_placees'] == []
+
+    def test_piece_trop_grande_signalee(self):
+        optimiseur = OptimiseurDebit(Decimal('1000'), Decimal('1000'))
+        resultat = optimiseur.optimiser_guillotine([
+            {'largeur': 1200, 'longueur': 500, 'quantite': 1, 'nom': 'XL'},
+        ])
+        assert resultat['nombre_plaques'] == 0
+        assert resultat['pieces_non_placees'][0]['nom'] == 'XL'
+
+    def test_series_de_pieces_identiques(self):
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'), epaisseur_lame=Decimal('3'))
+        resultat = optimiseur.optimiser_guillotine([
+            {'largeur': 100, 'longueur': 40, 'quantite': 800, 'nom': 'Cale'},
+            {'largeur': 100, 'longueur': 40, 'quantite': 800, 'nom': 'Cale'},
+            {'largeur': 250, 'longueur': 60, 'quantite': 800, 'nom': 'Entretoise'},
+        ])
+        pieces = [p for plaque in resultat['plan_coupe'] for p in plaque['pieces']]
+        assert len(pieces) == 2400
+        assert resultat['nombre_plaques'] == 3
+        for plaque in resultat['plan_coupe']:
+            pieces = plaque['pieces']
+            for i, piece in enumerate(pieces):
+                assert piece['x'] + piece['largeur'] <= plaque['largeur']
+                assert piece['y'] + piece['longueur'] <= plaque['longueur']
+                assert not any(_chevauchement(piece, autre) for autre in pieces[i + 1:])
+
+
+class TestDimensions:
+    def test_conversion_en_dixiemes(self):
+        from apps.optimisation.dimensions import en_dixiemes, en_dixiemes_piece, en_dixiemes_source, en_mm
+        assert en_dixiemes('1000') == 10000
+        assert en_dixiemes(Decimal('12.34')) == 123
+        assert en_mm(en_dixiemes(2.5)) == 2.5
+        # Un demi-dixième : la pièce est arrondie au-dessus, la plaque au-dessous
+        assert en_dixiemes_piece('1000.05') == 10001
+        assert en_dixiemes_piece(1000.01) == 10001
+        assert en_dixiemes_source('1000.05') == 10000
+        assert en_dixiemes_source('999.99') == 9999
+
+    def test_piece_en_bord_de_plaque(self):
+        optimiseur = OptimiseurDebit(Decimal('1000.05'), Decimal('500'), epaisseur_lame=Decimal('0'))
+        juste = optimiseur.optimiser_guillotine([{'largeur': 1000, 'longueur': 500, 'quantite': 1}])
+        assert juste['nombre_plaques'] == 1 and not juste['pieces_non_placees']
+
+        trop_large = optimiseur.optimiser_guillotine([{'largeur': '1000.05', 'longueur': 500, 'quantite': 1}])
+        assert trop_large['pieces_non_placees'][0]['quantite'] == 1
+
+
+@pytest.mark.django_db
+class TestChutesAvantPlaquesNeuves:
+    def test_chute_utilisee_avant_plaque_neuve(self):
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'), epaisseur_lame=Decimal('3'))
+        resultat = optimiseur.optimiser_guillotine(
+            [{'largeur': 1000, 'longueur': 800, 'quantite': 2, 'nom': 'A'}],
+            sources=[
+                {'largeur': 500, 'longueur': 500, 'origine': 'chute', 'reference': 'c1'},
+                {'largeur': 1100, 'longueur': 900, 'origine': 'chute', 'reference': 'c2'},
+            ],
+        )
+        assert resultat['nombre_plaques'] == 2
+        assert resultat['plan_coupe'][0]['origine'] == 'chute'
+        assert resultat['plan_coupe'][0]['reference'] == 'c2'
+        assert resultat['plan_coupe'][1]['origine'] == 'neuve'
+
+    def test_reservation_et_liberation(self, api_client, test_debit):
+        lancement = test_debit.lancement
+        lancement.parametres.utiliser_chutes = True
+        lancement.parametres.save()
+        chute = Chute.objects.create(matiere=lancement.matiere, largeur=Decimal('1100'), longueur=Decimal('900'))
+        Chute.objects.create(matiere=lancement.matiere, largeur=Decimal('300'), longueur=Decimal('300'))
+        stock = StockMatiere.objects.create(
+            matiere=lancement.matiere, largeur=Decimal('2100'), longueur=Decimal('1700'), quantite=3
+        )
+
+        response = api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        origines = [plaque['origine'] for plaque in response.data['plan_coupe']]
+        assert origines == ['chute', 'stock', 'stock']
+        chute.refresh_from_db()
+        stock.refresh_from_db()
+        assert chute.statut == 'reservee'
+        assert stock.quantite_reservee == 2
+
+        # Sans chute ni stock utile, la ré-optimisation rend les réservations du plan
+        # enregistré (un plan_coupe envoyé par le client est ignoré)
+        api_client.patch(f'/api/optimisation/debits/{test_debit.id}/', {
+            'pieces': [{'largeur': 3000, 'longueur': 2000, 'quantite': 1, 'nom': 'B'}],
+            'plan_coupe': [],
+        }, format='json')
+        chute.refresh_from_db()
+        stock.refresh_from_db()
+        assert chute.statut == 'disponible'
+        assert stock.quantite_reservee == 0
+
+    def test_reservation_refusee_si_source_prise(self, test_lancement):
+        matiere = test_lancement.matiere
+        chute = Chute.objects.create(matiere=matiere, largeur=Decimal('1100'), longueur=Decimal('900'))
+        stock = StockMatiere.objects.create(
+            matiere=matiere, largeur=Decimal('2100'), longueur=Decimal('1700'), quantite=2
+        )
+        plan_chute = [{'origine': 'chute', 'reference': str(chute.id)}]
+        plan_stock = [{'origine': 'stock', 'reference': str(stock.id), 'quantite': 2}]
+
+        # Deux plans calculés sur les mêmes sources : seul le premier les obtient
+        with transaction.atomic():
+            reserver_sources(plan_chute + plan_stock)
+        with pytest.raises(SourcesIndisponibles):
+            with transaction.atomic():
+                reserver_sources(plan_chute)
+        with pytest.raises(SourcesIndisponibles):
+            with transaction.atomic():
+                reserver_sources([{'origine': 'stock', 'reference': str(stock.id)}])
+        stock.refresh_from_db()
+        assert stock.quantite_reservee == 2
+
+    def test_chute_de_barres_reservee_en_partie(self, test_lancement):
+        chute = Chute.objects.create(matiere=test_lancement.matiere, longueur=Decimal('2500'), quantite=3)
+        with transaction.atomic():
+            reserver_sources([{'origine': 'chute', 'reference': str(chute.id), 'quantite': 1, 'pieces': []}])
+        chute.refresh_from_db()
+        assert (chute.statut, chute.quantite) == ('reservee', 1)
+        reste = Chute.objects.exclude(id=chute.id).get(matiere=test_lancement.matiere)
+        assert (reste.statut, reste.quantite, reste.longueur) == ('disponible', 2, Decimal('2500'))
+
+
+@pytest.mark.django_db
+class TestOptimisationLancement:
+    @pytest.fixture
+    def debits(self, test_lancement):
+        return [
+            Debit.objects.create(
+                lancement=test_lancement,
+                numero_debit=numero,
+                largeur_source=Decimal('3210'),
+                longueur_source=Decimal('2250'),
+                pieces=[{'largeur': 1000, 'longueur': 800, 'quantite': 3, 'nom': 'A'}],
+            )
+            for numero in ('D1', 'D2')
+        ]
+
+    def test_debits_regroupes_sur_les_memes_plaques(self, api_client, test_lancement, debits):
+        response = api_client.post(f'/api/optimisation/lancements/{test_lancement.id}/optimiser/')
+        assert response.status_code == 200
+        assert response.data['statut'] == 'optimise'
+
+        d1, d2 = (Debit.objects.get(id=debit.id) for debit in debits)
+        # Séparément, chaque débit entamerait sa propre plaque
+        assert d1.nombre_plaques_necessaires + d2.nombre_plaques_necessaires == 1
+        principal, renvoi = sorted((d1, d2), key=lambda debit: not debit.plan_coupe[0]['principal'])
+        plaque = principal.plan_coupe[0]
+        assert [p['debit'] for p in plaque['pieces']].count('D1') == 3
+        assert [p['debit'] for p in plaque['pieces']].count('D2') == 3
+        # Le débit secondaire ne garde qu'un renvoi vers la plaque, avec ses pièces
+        part = renvoi.plan_coupe[0]
+        assert not part['principal'] and 'sequence' not in part
+        assert (part['debit_principal'], part['plaque_principale']) == (principal.numero_debit, 0)
+        assert {p['debit'] for p in part['pieces']} == {renvoi.numero_debit}
+        assert len(part['pieces']) == 3
+        assert d1.resultat_optimisation['lot']['debits'] == ['D1', 'D2']
+
+    def test_lancement_volumineux_en_tache_de_fond(self, api_client, test_lancement, debits, settings):
+        settings.OPTIMISATION_TACHES_BACKEND = 'eager'
+        settings.OPTIMISATION_SEUIL_ASYNCHRONE = 5
+        response = api_client.post(f'/api/optimisation/lancements/{test_lancement.id}/optimiser/')
+        assert response.status_code == 202
+        assert response.data['type_tache'] == 'lancement'
+        assert response.data['statut'] == 'terminee'
+        assert response.data['resultat']['nombre_plaques'] == 1
+
+    def test_cotes_au_centieme_de_mm(self, api_client, test_lancement, debits):
+        # 500.03 est arrondi au dixième supérieur dans le plan (500.1)
+        Debit.objects.filter(id=debits[0].id).update(
+            pieces=[{'largeur': 500.03, 'longueur': 800, 'quantite': 2, 'nom': 'A'}]
+        )
+        response = api_client.post(f'/api/optimisation/lancements/{test_lancement.id}/optimiser/')
+        assert response.status_code == 200
+        d1 = Debit.objects.get(id=debits[0].id)
+        assert d1.resultat_optimisation['pieces_non_placees'] == []
+
+    def test_barres_avec_largeur(self, debits):
+        from apps.optimisation.lots import repartir_plan
+        for debit in debits:
+            debit.pieces = [{'largeur': 40, 'longueur': 1200, 'quantite': 2, 'nom': 'A'}]
+        pieces = [piece for debit in debits for piece in debit.pieces]
+        resultat = OptimiseurDebit(Decimal('40'), Decimal('6000')).optimiser_barre(pieces, Decimal('6000'))
+        parts = repartir_plan(resultat, debits)
+        debits_servis = [
+            piece['debit'] for part in parts for barre in part['plan_coupe'] if barre['principal']
+            for piece in barre['pieces']
+        ]
+        assert sorted(debits_servis) == ['D1', 'D1', 'D2', 'D2']
+        assert all(part['pieces_non_placees'] == [] for part in parts)
+
+
+class TestOptimiseurPortefeuille:
+    PIECES = [
+        {'largeur': 1300, 'longueur': 700, 'quantite': 6, 'nom': 'A'},
+        {'largeur': 400, 'longueur': 1700, 'quantite': 4, 'nom': 'B'},
+        {'largeur': 550, 'longueur': 350, 'quantite': 10, 'nom': 'C'},
+    ]
+
+    def test_jamais_moins_bon_que_le_glouton(self):
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'))
+        glouton = optimiseur.optimiser_guillotine(self.PIECES)
+        resultat = optimiseur.optimiser_portefeuille(self.PIECES, nb_workers=1, budget_secondes=30)
+        assert resultat['taux_utilisation'] >= glouton['taux_utilisation']
+        assert resultat['heuristiques_evaluees'] > 1
+        assert set(resultat['heuristique']) == {'tri', 'regle_placement', 'rotation'}
+
+    def test_execution_parallele(self):
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'))
+        resultat = optimiseur.optimiser_portefeuille(self.PIECES, nb_workers=2, budget_secondes=30)
+        assert sum(len(p['pieces']) for p in resultat['plan_coupe']) == 20
+
+    def test_heuristiques_arretees_a_l_echeance(self):
+        import multiprocessing
+        from apps.optimisation.portefeuille import _fermer_pools
+        _fermer_pools()
+        pieces = [{'largeur': 100 + i, 'longueur': 150 + i, 'quantite': 20, 'nom': f'P{i}'} for i in range(40)]
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'))
+        resultat = optimiseur.optimiser_portefeuille(pieces, nb_workers=2, budget_secondes=0)
+        assert resultat['heuristiques_evaluees'] < 30
+        # Les heuristiques encore en cours ne tournent plus après le retour
+        assert multiprocessing.active_children() == []
+
+    def test_classement_sur_les_quantites_non_placees(self):
+        from apps.optimisation.portefeuille import _cle_classement
+        un_type = {'pieces_non_placees': [{'quantite': 50}], 'nombre_plaques': 3, 'taux_utilisation': 90.0}
+        deux_types = {
+            'pieces_non_placees': [{'quantite': 1}, {'quantite': 1}],
+            'nombre_plaques': 3, 'taux_utilisation': 60.0,
+        }
+        moins_de_plaques = {**deux_types, 'nombre_plaques': 2, 'taux_utilisation': 50.0}
+        assert max([un_type, deux_types], key=_cle_classement) is deux_types
+        assert max([deux_types, moins_de_plaques], key=_cle_classement) is moins_de_plaques
+
+
+class TestOptimisationProgressive:
+    def test_premier_plan_glouton_puis_ameliorations(self):
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'))
+        glouton = optimiseur.optimiser_guillotine(TestOptimiseurPortefeuille.PIECES)
+        plans = list(optimiseur.optimiser_progressif(TestOptimiseurPortefeuille.PIECES, budget_secondes=2))
+        assert plans[0]['phase'] == 'glouton'
+        assert plans[0]['plan_coupe'] == glouton['plan_coupe']
+        assert plans[-1]['taux_utilisation'] >= glouton['taux_utilisation']
+        for precedent, suivant in zip(plans, plans[1:]):
+            assert suivant['nombre_plaques'] <= precedent['nombre_plaques']
+        assert sum(len(p['pieces']) for p in plans[-1]['plan_coupe']) == 20
+
+    @pytest.mark.django_db
+    def test_flux_sse(self, api_client, test_debit):
+        response = api_client.get(
+            f'/api/optimisation/debits/{test_debit.id}/optimiser-progressif/?budget=0.5',
+            HTTP_ACCEPT='text/event-stream',
+        )
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'text/event-stream'
+        contenu = b''.join(response.streaming_content).decode()
+        evenements = [bloc.split('\n')[0] for bloc in contenu.strip().split('\n\n')]
+        assert evenements[0] == 'event: plan'
+        assert evenements[-1] == 'event: fin'
+        test_debit.refresh_from_db()
+        assert test_debit.nombre_plaques_necessaires == 1
+
+    @pytest.mark.django_db
+    def test_reservations_conservees_sans_nouveau_plan(self, api_client, test_debit, monkeypatch):
+        lancement = test_debit.lancement
+        lancement.parametres.utiliser_chutes = True
+        lancement.parametres.save()
+        chute = Chute.objects.create(matiere=lancement.matiere, largeur=Decimal('1100'), longueur=Decimal('900'))
+        api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        chute.refresh_from_db()
+        assert chute.statut == 'reservee'
+
+        def echec(*args, **kwargs):
+            raise RuntimeError('matière introuvable')
+
+        monkeypatch.setattr(DebitSerializer, '_preparer', staticmethod(echec))
+        response = api_client.get(
+            f'/api/optimisation/debits/{test_debit.id}/optimiser-progressif/?budget=0.1',
+            HTTP_ACCEPT='text/event-stream',
+        )
+        assert b'event: erreur' in b''.join(response.streaming_content)
+        chute.refresh_from_db()
+        assert chute.statut == 'reservee'
+
+
+class TestOptimiseurBarre:
+    def test_revient_sur_les_barres_entamees(self):
+        # Next-fit utiliserait 3 barres : 4000 | 3000 + 2000... ; l'optimum en utilise 2
+        optimiseur = OptimiseurDebit(Decimal('0'), Decimal('6000'), epaisseur_lame=Decimal('0'))
+        resultat = optimiseur.optimiser_barre([
+            {'longueur': 4000, 'quantite': 1, 'nom': 'A'},
+            {'longueur': 3000, 'quantite': 2, 'nom': 'B'},
+            {'longueur': 2000, 'quantite': 1, 'nom': 'C'},
+        ], Decimal('6000'))
+        assert resultat['nombre_barres'] == 2
+        assert resultat['taux_utilisation'] == 100
+
+    def test_barres_identiques_regroupees(self):
+        optimiseur = OptimiseurDebit(Decimal('0'), Decimal('6500'), epaisseur_lame=Decimal('4'))
+        resultat = optimiseur.optimiser_barre([
+            {'longueur': 1200, 'quantite': 500, 'nom': 'Montant'},
+        ], Decimal('6500'))
+        assert resultat['nombre_barres'] == 100
+        assert len(resultat['plan_coupe']) == 1
+        assert resultat['plan_coupe'][0]['quantite'] == 100
+        assert len(resultat['plan_coupe'][0]['pieces']) == 5
+        assert resultat['chutes'] == [{'longueur': 480.0, 'quantite': 100}]
+
+
+    def test_plusieurs_longueurs_et_chutes(self):
+        optimiseur = OptimiseurDebit(Decimal('0'), Decimal('6000'), epaisseur_lame=Decimal('0'))
+        pieces = [{'longueur': 3250, 'quantite': 4, 'nom': 'Traverse'}]
+        barres = [
+            {'longueur': 6000, 'prix_unitaire': 60},
+            {'longueur': 6500, 'prix_unitaire': 64},
+            {'longueur': 7000, 'prix_unitaire': 68},
+            {'longueur': 3300, 'quantite': 1, 'origine': 'chute', 'reference': 'C1'},
+        ]
+        # Coût : la chute (gratuite), une barre de 6,5 m, puis une de 6 m pour la dernière pièce
+        resultat = optimiseur.optimiser_barres_mixtes(pieces, barres)
+        assert [(b['longueur'], b['quantite'], b.get('origine')) for b in resultat['plan_coupe']] == [
+            (3300.0, 1, 'chute'), (6500.0, 1, None), (6000.0, 1, None),
+        ]
+        assert resultat['cout_total'] == 124
+        # Chute minimale : deux barres de 6,5 m sans perte
+        resultat = optimiseur.optimiser_barres_mixtes(pieces, barres, objectif='chute')
+        assert [(b['longueur'], b['quantite']) for b in resultat['plan_coupe']] == [(6500.0, 2)]
+        assert resultat['taux_utilisation'] == 100
+
+    @pytest.mark.django_db
+    def test_stocks_et_chutes_reserves(self, test_lancement):
+        matiere = test_lancement.matiere
+        matiere.type_matiere = 'barre'
+        matiere.longueur_standard = Decimal('6000')
+        matiere.prix_unitaire = Decimal('60')
+        matiere.save()
+        test_lancement.parametres.utiliser_chutes = True
+        test_lancement.parametres.save()
+        chute = Chute.objects.create(matiere=matiere, largeur=0, longueur=Decimal('3300'), quantite=1)
+        stock = StockMatiere.objects.create(matiere=matiere, largeur=0, longueur=Decimal('6500'), quantite=5)
+        debit = Debit.objects.create(
+            lancement=test_lancement, numero_debit='B1', largeur_source=Decimal('0'),
+            longueur_source=Decimal('6000'), pieces=[{'longueur': 3240, 'quantite': 7, 'nom': 'T'}],
+        )
+        DebitSerializer()._optimiser_debit(debit)
+        chute.refresh_from_db()
+        stock.refresh_from_db()
+        # La chute, puis trois barres du stock (65 au prorata de la barre standard, deux pièces chacune)
+        assert chute.statut == 'reservee'
+        assert stock.quantite_reservee == 3
+        assert debit.resultat_optimisation['cout_total'] == 195
+
+@pytest.mark.django_db
+class TestTachesOptimisation:
+    def test_optimisation_asynchrone(self, api_client, test_debit, settings):
+        settings.OPTIMISATION_TACHES_BACKEND = 'eager'
+        response = api_client.post(
+            f'/api/optimisation/debits/{test_debit.id}/optimiser/', {'asynchrone': True}, format='json'
+        )
+        assert response.status_code == 202
+        assert response.data['statut'] == 'terminee'
+        assert response.data['progression'] == 100
+
+        suivi = api_client.get(f"/api/optimisation/taches/{response.data['id']}/")
+        assert suivi.data['resultat']['nombre_plaques_necessaires'] == 1
+        test_debit.refresh_from_db()
+        assert test_debit.nombre_plaques_necessaires == 1
+        assert len(test_debit.plan_coupe[0]['pieces']) == 6
+
+    def test_debit_volumineux_planifie_a_la_creation(self, api_client, test_lancement, settings):
+        settings.OPTIMISATION_TACHES_BACKEND = 'eager'
+        settings.OPTIMISATION_SEUIL_ASYNCHRONE = 10
+        response = api_client.post('/api/optimisation/debits/', {
+            'lancement': str(test_lancement.id),
+            'numero_debit': 'D2',
+            'largeur_source': '3210',
+            'longueur_source': '2250',
+            'pieces': [{'largeur': 300, 'longueur': 200, 'quantite': 50, 'nom': 'B'}],
+        }, format='json')
+        assert response.status_code == 201
+        tache = TacheOptimisation.objects.get(debit_id=response.data['id'])
+        assert tache.statut == 'terminee'
+
+
+@pytest.mark.django_db
+class TestCacheResultats:
+    @pytest.mark.parametrize('backend', ['memoire', 'fichier', 'base'])
+    def test_second_calcul_servi_par_le_cache(self, api_client, test_debit, settings, tmp_path, backend):
+        settings.OPTIMISATION_CACHE_BACKEND = backend
+        settings.OPTIMISATION_CACHE_REPERTOIRE = tmp_path
+
+        premier = api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        second = api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        assert 'depuis_cache' not in premier.data['resultat_optimisation']
+        assert second.data['resultat_optimisation']['depuis_cache'] is True
+        assert second.data['plan_coupe'] == premier.data['plan_coupe']
+
+        statistiques = obtenir_cache().statistiques()
+        assert (statistiques['succes'], statistiques['echecs'], statistiques['taille']) == (1, 1, 1)
+
+    def test_eviction_lru(self):
+        from apps.optimisation.cache import CacheMemoire
+        cache = CacheMemoire(taille_max=2)
+        cache.ecrire('a', {'n': 1})
+        cache.ecrire('b', {'n': 2})
+        cache.lire('a')
+        cache.ecrire('c', {'n': 3})
+        assert cache.lire('b') is None
+        assert cache.lire('a') == {'n': 1}
+
+    def test_cle_canonique(self):
+        from apps.optimisation.cache import cle_cache
+        pieces = [{'largeur': 1000, 'longueur': 500, 'quantite': 2, 'nom': 'A'},
+                  {'largeur': 300, 'longueur': 200, 'quantite': 1, 'nom': 'B'}]
+        variante = [{'largeur': '300.00', 'longueur': 200.0, 'quantite': 1, 'nom': 'B'},
+                    {'largeur': 1000, 'longueur': '500', 'quantite': 2, 'nom': 'A'}]
+        args = (Decimal('3210'), Decimal('2250'), Decimal('3'), Decimal('0'), 'transversal')
+        assert cle_cache('guillotine', pieces, *args) == cle_cache('guillotine', variante, *args)
+        assert cle_cache('guillotine', pieces, *args) != cle_cache('portefeuille', pieces, *args)
+
+
+class TestEncodagePlan:
+    def test_aller_retour_et_taille(self):
+        import json
+        from apps.optimisation.encodage import decoder_plan, encoder_plan
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'), epaisseur_lame=Decimal('3.5'))
+        plan = optimiseur.optimiser_guillotine([
+            {'largeur': 412.5, 'longueur': 318, 'quantite': 400, 'nom': 'A'},
+            {'largeur': 250, 'longueur': 180.3, 'quantite': 300, 'nom': 'B'},
+        ], rotation=True)['plan_coupe']
+        plan[0]['lot'] = True
+        plan[0]['pieces'][0]['debit'] = 'D1'
+        compact = encoder_plan(plan)
+        assert decoder_plan(compact) == plan
+        assert len(compact) * 5 < len(json.dumps(plan))
+
+    @pytest.mark.django_db
+    def test_plan_stocke_une_fois_et_absent_des_listes(self, api_client, test_debit):
+        api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        test_debit.refresh_from_db()
+        assert len(test_debit.plan_coupe[0]['pieces']) == 6
+        assert 'plan_coupe' not in test_debit.resultat_optimisation
+
+        liste = api_client.get('/api/optimisation/debits/')
+        assert 'plan_coupe' not in liste.data['results'][0]
+        lancement = api_client.get(f'/api/optimisation/lancements/{test_debit.lancement_id}/')
+        assert 'plan_coupe' not in lancement.data['debits'][0]
+        detail = api_client.get(f'/api/optimisation/debits/{test_debit.id}/')
+        assert len(detail.data['plan_coupe'][0]['pieces']) == 6
+
+
+@pytest.mark.django_db
+class TestExportProgrammes:
+    def test_export_ascii_diffuse(self, api_client, test_debit):
+        api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        response = api_client.get(f'/api/optimisation/debits/{test_debit.id}/exporter_ascii/')
+        assert response.status_code == 200
+        assert response.streaming
+        contenu = b''.join(response.streaming_content).decode()
+        assert contenu.startswith('DEBIT D1\n')
+        assert contenu.count('PLAQUE ') == 1 and contenu.endswith('FIN\n')
+        assert 'deb-test-0001-l1-d1.txt' in response['Content-Disposition']
+
+    def test_enregistrement_et_dialecte_inconnu(self, api_client, test_debit, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        url = f'/api/optimisation/debits/{test_debit.id}/exporter/'
+        response = api_client.get(url, {'dialecte': 'gcode', 'enregistrer': 'true'})
+        assert response.status_code == 200
+        test_debit.refresh_from_db()
+        assert test_debit.fichier_cnc_path == 'exports/deb-test-0001-l1-d1.nc'
+        assert (tmp_path / test_debit.fichier_cnc_path).read_text().count('\nM3\n') == 6
+        assert api_client.get(url, {'dialecte': 'dxf'}).status_code == 400
+
+    def test_archive_du_lancement(self, api_client, test_lancement, test_debit):
+        import io
+        import zipfile
+        Debit.objects.create(
+            lancement=test_lancement, numero_debit='D2', largeur_source=Decimal('6000'),
+            longueur_source=Decimal('6000'), pieces=[{'longueur': 1500, 'quantite': 5, 'nom': 'T'}],
+        )
+        api_client.post(f'/api/optimisation/lancements/{test_lancement.id}/optimiser/')
+        url = f'/api/optimisation/lancements/{test_lancement.id}/exporter/'
+        response = api_client.get(url, {'dialecte': 'csv'})
+        assert response['Content-Type'] == 'application/zip'
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        assert archive.namelist() == ['deb-test-0001-l1-d1.csv', 'deb-test-0001-l1-d2.csv']
+        assert archive.read('deb-test-0001-l1-d2.csv').decode().count('PIECE;') == 5
+        assert api_client.get(url, {'dialecte': 'gcode'}).status_code == 200
+
+        # Le G-code ne décrit pas les barres : refusé avant d'ouvrir l'archive
+        Matiere.objects.filter(id=test_lancement.matiere_id).update(type_matiere='barre')
+        api_client.post(f'/api/optimisation/lancements/{test_lancement.id}/optimiser/')
+        assert api_client.get(url, {'dialecte': 'gcode'}).status_code == 400
+
+    def test_plaque_partagee_une_seule_fois_dans_l_archive(self, api_client, test_lancement):
+        import io
+        import zipfile
+        for numero in ('D1', 'D2'):
+            Debit.objects.create(
+                lancement=test_lancement, numero_debit=numero, largeur_source=Decimal('3210'),
+                longueur_source=Decimal('2250'),
+                pieces=[{'largeur': 1000, 'longueur': 800, 'quantite': 3, 'nom': 'A'}],
+            )
+        api_client.post(f'/api/optimisation/lancements/{test_lancement.id}/optimiser/')
+        url = f'/api/optimisation/lancements/{test_lancement.id}/exporter/'
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(api_client.get(url, {'dialecte': 'csv'}).streaming_content)))
+        contenu = ''.join(archive.read(nom).decode() for nom in archive.namelist())
+        assert len(archive.namelist()) == 1
+        assert contenu.count('PLAQUE;') == 1
+        assert contenu.count('PIECE;') == 6
+
+
+@pytest.mark.django_db
+class TestReoptimisationIncrementale:
+    def test_ajout_d_une_piece_conserve_les_autres_plaques(self, api_client, test_lancement):
+        debit = Debit.objects.create(
+            lancement=test_lancement, numero_debit='D1', largeur_source=Decimal('3210'),
+            longueur_source=Decimal('2250'),
+            pieces=[{'largeur': 1500, 'longueur': 1000, 'quantite': 40, 'nom': 'A'}],
+        )
+        api_client.post(f'/api/optimisation/debits/{debit.id}/optimiser/')
+        debit.refresh_from_db()
+        assert len(debit.plan_coupe) == 10
+
+        pieces = debit.pieces + [{'largeur': 500, 'longueur': 400, 'quantite': 1, 'nom': 'B'}]
+        response = api_client.patch(f'/api/optimisation/debits/{debit.id}/', {'pieces': pieces}, format='json')
+        assert response.status_code == 200
+        debit.refresh_from_db()
+        assert debit.resultat_optimisation['incremental']['plaques_conservees'] == 8
+        apres = {plaque['numero']: plaque for plaque in debit.plan_coupe}
+        assert sorted(apres) == list(range(1, 12))
+        noms = [piece['nom'] for plaque in debit.plan_coupe for piece in plaque['pieces']]
+        assert noms.count('A') == 40 and noms.count('B') == 1
+
+        # Retrait : la plaque portant B est la seule recalculée
+        response = api_client.patch(
+            f'/api/optimisation/debits/{debit.id}/', {'pieces': pieces[:1]}, format='json'
+        )
+        debit.refresh_from_db()
+        assert debit.resultat_optimisation['incremental'] == {'plaques_conservees': 10, 'plaques_recalculees': 0}
+        assert debit.nombre_plaques_necessaires == 10
+
+    def test_cotes_au_centieme_de_mm(self):
+        from apps.optimisation.incremental import difference, reoptimiser
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'))
+        pieces = [{'largeur': 1500, 'longueur': 200.03, 'quantite': 200, 'nom': 'A'}]
+        plan = optimiseur.optimiser_guillotine(pieces)['plan_coupe']
+        assert difference(plan, pieces) == (Counter(), Counter())
+
+        ajout = pieces + [{'largeur': 500, 'longueur': 400, 'quantite': 1, 'nom': 'B'}]
+        resultat = reoptimiser(optimiseur, plan, ajout)
+        assert resultat is not None
+        cotes = {
+            tuple(sorted((piece['largeur'], piece['longueur'])))
+            for plaque in resultat['plan_coupe'] for piece in plaque['pieces'] if piece['nom'] == 'A'
+        }
+        assert cotes == {(200.1, 1500)}
+
+    def test_reglages_modifies_ou_erreur(self, api_client, test_debit, monkeypatch):
+        url = f'/api/optimisation/debits/{test_debit.id}/'
+        api_client.post(f'{url}optimiser/')
+        test_debit.refresh_from_db()
+        plan = test_debit.plan_coupe
+        pieces = test_debit.pieces + [{'largeur': 500, 'longueur': 400, 'quantite': 1, 'nom': 'B'}]
+
+        def echec(*args, **kwargs):
+            raise RuntimeError('plan illisible')
+
+        # Erreur : plan précédent conservé, erreur enregistrée comme pour une optimisation complète
+        monkeypatch.setattr('apps.optimisation.serializers.reoptimiser', echec)
+        assert api_client.patch(url, {'pieces': pieces}, format='json').status_code == 200
+        test_debit.refresh_from_db()
+        assert test_debit.resultat_optimisation == {'erreur': 'plan illisible'}
+        assert test_debit.plan_coupe == plan
+
+        # Lame changée depuis le calcul : le plan est recalculé entièrement
+        monkeypatch.undo()
+        api_client.post(f'{url}optimiser/')
+        parametres = test_debit.lancement.parametres
+        parametres.epaisseur_lame = Decimal('5')
+        parametres.save()
+        api_client.patch(url, {'pieces': test_debit.pieces}, format='json')
+        test_debit.refresh_from_db()
+        assert 'incremental' not in test_debit.resultat_optimisation
+        assert test_debit.resultat_optimisation['reglages']['epaisseur_lame'] == '5.00'
+
+        # Sens de coupe seul : le plan n'est plus laissé périmé
+        appels = []
+        optimiser_debit = DebitSerializer._optimiser_debit
+        monkeypatch.setattr(
+            DebitSerializer, '_optimiser_debit',
+            lambda serializer, debit: appels.append(debit.sens_coupe) or optimiser_debit(serializer, debit),
+        )
+        api_client.patch(url, {'sens_coupe': 'longitudinal'}, format='json')
+        assert appels == ['longitudinal']
+
+    def test_chutes_mises_a_jour_sur_place(self, test_debit):
+        matiere = test_debit.lancement.matiere
+        gardee, *autres = (
+            Chute.objects.create(matiere=matiere, debit=test_debit, largeur=largeur, longueur=500)
+            for largeur in (Decimal('400'), Decimal('300'), Decimal('200'))
+        )
+        DebitSerializer._synchroniser_chutes(test_debit, [
+            {'largeur': 400, 'longueur': 500}, {'largeur': 700, 'longueur': 250},
+        ])
+        chutes = {chute.id: (chute.largeur, chute.longueur) for chute in test_debit.chutes.all()}
+        assert len(chutes) == 2 and chutes[gardee.id] == (Decimal('400'), Decimal('500'))
+        recyclee, = set(chutes) - {gardee.id}
+        assert recyclee in {chute.id for chute in autres}
+        assert chutes[recyclee] == (Decimal('700'), Decimal('250'))
+
+
+class TestExtractionChutes:
+    def test_chutes_detachables_par_coupes_traversantes(self):
+        from apps.optimisation.chutes import extraire_chutes
+        # Une pièce au centre : deux bandes pleine hauteur, puis les restes de la bande centrale
+        assert extraire_chutes(10, 10, [(4, 4, 2, 2)]) == [
+            (0, 0, 4, 10), (6, 0, 4, 10), (4, 0, 2, 4), (4, 6, 2, 4),
+        ]
+        # Pièces en moulinet : le vide central n'est détachable par aucune coupe
+        moulinet = [(0, 0, 6, 4), (6, 0, 4, 6), (4, 6, 6, 4), (0, 4, 4, 6)]
+        assert extraire_chutes(10, 10, moulinet) == []
+        assert extraire_chutes(10, 20, moulinet) == [(0, 10, 10, 10)]
+
+    @pytest.mark.django_db
+    def test_chutes_du_debit(self, api_client, test_debit):
+        parametres = test_debit.lancement.parametres
+        parametres.dimension_chute_facturee = Decimal('250')
+        parametres.save()
+        api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        test_debit.refresh_from_db()
+        # Trait de coupe de 3 mm : bande du haut sur toute la largeur, puis bande de droite
+        assert test_debit.plan_coupe[0]['chutes'] == [
+            {'x': 0.0, 'y': 1606.0, 'largeur': 3210.0, 'longueur': 644.0, 'facturee': False},
+            {'x': 3009.0, 'y': 0.0, 'largeur': 201.0, 'longueur': 1603.0, 'facturee': True},
+        ]
+        assert sorted(
+            (chute.largeur, chute.longueur) for chute in test_debit.chutes.all()
+        ) == [(Decimal('201'), Decimal('1603')), (Decimal('3210'), Decimal('644'))]
+
+        # Sous la dimension de chute jetée, rien n'est conservé
+        parametres.dimension_chute_jetee = Decimal('700')
+        parametres.save()
+        resultat = DebitSerializer._resoudre(
+            test_debit.lancement, test_debit.pieces, test_debit.largeur_source,
+            test_debit.longueur_source, test_debit.sens_coupe
+        )
+        assert resultat['chutes'] == []
+
+
+@pytest.mark.django_db
+class TestEnregistrementOptimisation:
+    @pytest.fixture
+    def debit_vitrage(self, test_lancement):
+        # Une pièce par plaque : deux chutes réutilisables par plaque
+        return Debit.objects.create(
+            lancement=test_lancement, numero_debit='D9', largeur_source=Decimal('3210'),
+            longueur_source=Decimal('2250'),
+            pieces=[{'largeur': 3000, 'longueur': 2000, 'quantite': 120, 'nom': 'G'}],
+        )
+
+    def test_nombre_de_requetes_constant(self, debit_vitrage):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        DebitSerializer()._optimiser_debit(debit_vitrage)
+        assert Chute.objects.filter(debit=debit_vitrage).count() == 240
+
+        # Seconde optimisation : les chutes précédentes sont remplacées, sans INSERT par chute
+        debit_vitrage.pieces = [{'largeur': 3000, 'longueur': 2000, 'quantite': 200, 'nom': 'G'}]
+        with CaptureQueriesContext(connection) as requetes:
+            DebitSerializer()._optimiser_debit(debit_vitrage)
+        assert Chute.objects.filter(debit=debit_vitrage).count() == 400
+        # Savepoints, débit, suppression des anciennes chutes ; INSERT par lots (SQLite limite la taille d'un lot)
+        inserts = [q for q in requetes.captured_queries if q['sql'].startswith('INSERT')]
+        assert len(requetes) - len(inserts) <= 6
+        assert len(inserts) <= 10
+
+    def test_echec_annule_tout(self, debit_vitrage, monkeypatch):
+        DebitSerializer()._optimiser_debit(debit_vitrage)
+        plan = debit_vitrage.plan_coupe
+
+        def echec(*args, **kwargs):
+            raise RuntimeError('panne')
+        monkeypatch.setattr(DebitSerializer, '_creer_chutes', staticmethod(echec))
+        debit_vitrage.pieces = [{'largeur': 1000, 'longueur': 800, 'quantite': 3, 'nom': 'A'}]
+        DebitSerializer()._optimiser_debit(debit_vitrage)
+        debit_vitrage.refresh_from_db()
+        assert debit_vitrage.resultat_optimisation == {'erreur': 'panne'}
+        assert debit_vitrage.plan_coupe == plan
+        assert Chute.objects.filter(debit=debit_vitrage).count() == 240
+
+
+class TestDebitEnBandes:
+    def test_plan_realisable_en_deux_etapes(self):
+        optimiseur = OptimiseurDebit(Decimal('3210'), Decimal('2250'), epaisseur_lame=Decimal('4'))
+        resultat = optimiseur.optimiser_bandes([
+            {'largeur': 800, 'longueur': 600, 'quantite': 7, 'nom': 'A'},
+            {'largeur': 450, 'longueur': 1200, 'quantite': 5, 'nom': 'B'},
+            {'largeur': 300, 'longueur': 300, 'quantite': 12, 'nom': 'C'},
+        ])
+        placees = 0
+        for plaque in resultat['plan_coupe']:
+            pieces = plaque['pieces']
+            placees += len(pieces)
+            for i, piece in enumerate(pieces):
+                assert not any(_chevauchement(piece, autre) for autre in pieces[i + 1:])
+                # Chaque pièce tient dans une bande, et chaque bande fait toute la largeur de la plaque
+                assert any(
+                    bande['x'] <= piece['x'] and piece['x'] + piece['largeur'] <= bande['x'] + bande['largeur']
+                    and bande['y'] <= piece['y'] and piece['y'] + piece['longueur'] <= bande['y'] + bande['longueur']
+                    for bande in plaque['bandes']
+                )
+            assert all(bande['largeur'] == plaque['largeur'] for bande in plaque['bandes'])
+            assert all(bande['y'] + bande['longueur'] <= plaque['longueur'] for bande in plaque['bandes'])
+        assert placees == 24
+        assert resultat['pieces_non_placees'] == []
+
+    @pytest.mark.django_db
+    def test_parametre_algorithme_bandes(self, api_client, test_debit):
+        parametres = test_debit.lancement.parametres
+        parametres.algorithme_plaques = 'bandes'
+        parametres.save()
+        response = api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        assert response.status_code == 200
+        test_debit.refresh_from_db()
+        # Bandes de 800 mm : trois pièces de 1000 mm par bande, deux bandes
+        assert test_debit.nombre_plaques_necessaires == 1
+        assert len(test_debit.plan_coupe[0]['bandes']) == 2
+        assert len(test_debit.plan_coupe[0]['pieces']) == 6
+
+
+@pytest.mark.django_db
+class TestChoixFormat:
+    @pytest.fixture
+    def formats(self, test_debit):
+        matiere = test_debit.lancement.matiere
+        matiere.largeur_standard = Decimal('3210')
+        matiere.longueur_standard = Decimal('2250')
+        matiere.prix_unitaire = Decimal('100')
+        matiere.save()
+        StockMatiere.objects.create(
+            matiere=matiere, largeur=Decimal('2550'), longueur=Decimal('1605'), quantite=10,
+            prix_unitaire=Decimal('40')
+        )
+        return test_debit
+
+    def test_classement_par_cout(self, formats):
+        from apps.optimisation.formats import comparer_formats
+        candidats = comparer_formats(formats.lancement, formats.pieces, nb_workers=2)
+        # 6 pièces : une plaque standard (100) ou deux plaques du stock (2 x 40)
+        couts = {candidat['format']['cle']: candidat['cout'] for candidat in candidats}
+        assert couts == {'3210x2250': Decimal('100.00'), '2550x1605': Decimal('80.00'), 'mixte': Decimal('80.00')}
+        assert candidats[0]['format']['cle'] == '2550x1605'
+        assert candidats[-1]['nombre_plaques'] == 1
+
+    def test_application_du_moins_cher(self, api_client, formats):
+        response = api_client.get(f'/api/optimisation/debits/{formats.id}/formats/')
+        assert [f['format']['cle'] for f in response.data['formats']][-1] == '3210x2250'
+        assert 'resultat' not in response.data['formats'][0]
+
+        response = api_client.post(f'/api/optimisation/debits/{formats.id}/formats/', {}, format='json')
+        assert response.status_code == 200
+        formats.refresh_from_db()
+        assert (formats.largeur_source, formats.longueur_source) == (Decimal('2550'), Decimal('1605'))
+        assert formats.nombre_plaques_necessaires == 2
+
+        assert StockMatiere.objects.get().quantite_reservee == 2
+
+        response = api_client.post(
+            f'/api/optimisation/debits/{formats.id}/formats/', {'format': '1x1'}, format='json'
+        )
+        assert response.status_code == 400
+
+    def test_stock_limite_a_sa_quantite(self, api_client, formats):
+        from apps.optimisation.formats import comparer_formats
+        stock = StockMatiere.objects.get()
+        stock.quantite = 1
+        stock.save()
+        candidats = comparer_formats(formats.lancement, formats.pieces, nb_workers=1)
+        meilleur = candidats[0]
+        # Une plaque du stock (40), puis une neuve du même format au prorata du standard (100)
+        assert meilleur['format']['cle'] == '2550x1605'
+        assert meilleur['plaques_neuves'] == 1
+        assert meilleur['cout'] == Decimal('96.67')
+
+        response = api_client.post(f'/api/optimisation/debits/{formats.id}/formats/', {}, format='json')
+        assert response.status_code == 200
+        stock.refresh_from_db()
+        assert stock.quantite_reservee == 1
+
+    def test_comparaison_volumineuse_en_tache_de_fond(self, api_client, formats, settings):
+        settings.OPTIMISATION_TACHES_BACKEND = 'eager'
+        settings.OPTIMISATION_SEUIL_ASYNCHRONE = 5
+        response = api_client.post(f'/api/optimisation/debits/{formats.id}/formats/', {}, format='json')
+        assert response.status_code == 202
+        assert response.data['type_tache'] == 'formats'
+        assert response.data['statut'] == 'terminee'
+        assert response.data['resultat']['format_applique'] == '2550x1605'
+        assert response.data['resultat']['formats'][0]['cout'] == 80.0
+        formats.refresh_from_db()
+        assert formats.longueur_source == Decimal('1605')
+
+
+class TestSequencementCoupes:
+    def test_coupes_et_temps_d_usinage(self):
+        from apps.optimisation.sequencage import sequencer_plaque
+        optimiseur = OptimiseurDebit(Decimal('2006'), Decimal('2006'), epaisseur_lame=Decimal('3'))
+        plaque = optimiseur.optimiser_guillotine([
+            {'largeur': 1000, 'longueur': 1000, 'quantite': 4, 'nom': 'A'},
+        ])['plan_coupe'][0]
+        sequence = sequencer_plaque(plaque, Decimal('3'))
+        # Une coupe de refente, puis chaque bande tournée et coupée en deux
+        assert [(c['niveau'], c['position'], c['rotation']) for c in sequence['coupes']] == [
+            (1, 1000.0, False), (2, 1000.0, True), (2, 1000.0, True),
+        ]
+        assert sequence['guillotine'] and sequence['rotations'] == 2
+        # Chargement 30 s + 4006 mm coupés à 300 mm/s + 3000 mm de chariot à 500 mm/s + 2 rotations de 8 s
+        assert sequence['temps_usinage_s'] == 65.4
+
+    def test_plan_non_guillotine_signale(self):
+        from apps.optimisation.sequencage import sequencer_plaque
+        # Moulinet : aucune coupe ne traverse la plaque
+        moulinet = [(0, 0, 200, 100), (200, 0, 100, 200), (100, 200, 200, 100), (0, 100, 100, 200), (100, 100, 100, 100)]
+        plaque = {
+            'largeur': 300, 'longueur': 300,
+            'pieces': [{'x': x, 'y': y, 'largeur': l, 'longueur': h} for x, y, l, h in moulinet],
+        }
+        sequence = sequencer_plaque(plaque, Decimal('0'))
+        assert not sequence['guillotine']
+        assert sequence['coupes'] == []
+
+    @pytest.mark.django_db
+    def test_temps_d_usinage_du_debit(self, api_client, test_debit):
+        api_client.post(f'/api/optimisation/debits/{test_debit.id}/optimiser/')
+        response = api_client.get(f'/api/optimisation/debits/{test_debit.id}/')
+        plaques = response.data['plan_coupe']
+        assert all(plaque['sequence'] and plaque['guillotine'] for plaque in plaques)
+        assert response.data['temps_usinage_s'] == pytest.approx(sum(p['temps_usinage_s'] for p in plaques))
+
+
+class TestBenchmarks:
+    def test_generateurs_deterministes(self):
+        from benchmarks.generateurs import GENERATEURS
+        for generateur in GENERATEURS.values():
+            scenario = generateur(250, graine=7)
+            assert scenario['nombre_pieces'] == 250
+            assert scenario['pieces'] == generateur(250, graine=7)['pieces']
+
+    def test_campagne_et_export(self, tmp_path):
+        from benchmarks.bench_optimiseur import campagne, ecrire
+        mesures = campagne(['etageres', 'barres'], [50], algorithmes=['guillotine', 'barre'])
+        assert [m['algorithme'] for m in mesures] == ['guillotine', 'barre']
+        assert all(m['memoire_pic_mo'] > 0 and m['nombre_plaques'] > 0 for m in mesures)
+        chemin = ecrire(mesures, tmp_path)
+        assert chemin.with_suffix('.csv').read_text(encoding='utf-8').count('\n') == 3
@@ -1,5 +1,11 @@
 import pytest
-from apps.stock.models import Categorie, Article, Fournisseur, Mouvement
+from decimal import Decimal
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from apps.stock.models import (
+    Categorie, Article, Fournisseur, Mouvement, SoldeArticle, EvenementAlerteStock, InstantaneStock
+)
 from apps.commerciale.models import Client
 from django.contrib.auth import get_user_model
 
@@ -84,7 +90,342 @@ class TestStock:
         assert mouvement.article == article
 
 
+@pytest.mark.django_db
+class TestRegistreStock:
+    @pytest.fixture
+    def article(self, test_categorie):
+        return Article.objects.create(
+            reference='ART-100',
+            designation='Miroir 4mm',
+            categorie=test_categorie,
+            prix_achat_ht=10.00,
+            prix_vente_ht=15.00,
+            stock_actuel=40
+        )
+
+    @pytest.fixture
+    def api_client(self, test_user):
+        client = APIClient()
+        client.force_authenticate(user=test_user)
+        return client
+
+    def _mouvement(self, api_client, article, type_mouvement, quantite):
+        response = api_client.post('/api/stock/mouvements/', {
+            'article': article.id,
+            'type_mouvement': type_mouvement,
+            'quantite': quantite,
+            'date_mouvement': '2024-01-15',
+        })
+        assert response.status_code == 201
+        return response.data
+
+    def test_mouvements_tiennent_le_solde(self, api_client, article):
+        assert self._mouvement(api_client, article, 'entree', '25')['delta'] == '25.00'
+        assert self._mouvement(api_client, article, 'sortie', '5')['delta'] == '-5.00'
+        # Un inventaire ramène le stock à la quantité comptée
+        assert self._mouvement(api_client, article, 'inventaire', '50')['delta'] == '-10.00'
+
+        article.refresh_from_db()
+        solde = SoldeArticle.objects.get(article=article)
+        assert article.stock_actuel == Decimal('50')
+        assert solde.quantite == Decimal('50')
+        assert solde.quantite_ouverture == Decimal('40')
+        assert solde.nombre_mouvements == 3
+
+    def test_suppression_annule_le_mouvement(self, api_client, article):
+        mouvement = self._mouvement(api_client, article, 'sortie', '15')
+        assert api_client.delete(f"/api/stock/mouvements/{mouvement['id']}/").status_code == 204
+        article.refresh_from_db()
+        assert article.stock_actuel == Decimal('40')
+        assert SoldeArticle.objects.get(article=article).nombre_mouvements == 0
+
+    def test_reconstruction_des_soldes(self, api_client, article):
+        self._mouvement(api_client, article, 'entree', '10')
+        # Stock modifié hors registre
+        Article.objects.filter(pk=article.pk).update(stock_actuel=3)
+        call_command('soldes_stock')
+        article.refresh_from_db()
+        assert article.stock_actuel == Decimal('3')
+
+        call_command('soldes_stock', '--reconstruire')
+        article.refresh_from_db()
+        assert article.stock_actuel == Decimal('50')
+        assert SoldeArticle.objects.get(article=article).quantite == Decimal('50')
+
+    def test_import_csv(self, api_client, article):
+        contenu = (
+            "article;type_mouvement;quantite;date_mouvement\n"
+            "ART-100;entree;12,5;2024-02-01\n"
+            "ART-404;entree;3;2024-02-01\n"
+            "ART-100;sortie;abc;2024-02-01\n"
+            "ART-100;sortie;2,5;2024-02-02\n"
+        ).encode('utf-8')
+        response = api_client.post(
+            '/api/stock/mouvements/import/',
+            {'fichier': SimpleUploadedFile('reception.csv', contenu, content_type='text/csv')},
+            format='multipart'
+        )
+        assert response.status_code == 201
+        assert response.data['lignes'] == 4
+        assert response.data['crees'] == 2
+        assert [erreur['ligne'] for erreur in response.data['erreurs']] == [3, 4]
+
+        article.refresh_from_db()
+        assert article.stock_actuel == Decimal('50')
+        assert SoldeArticle.objects.get(article=article).nombre_mouvements == 2
+
+    def test_import_json_inventaire(self, api_client, article):
+        response = api_client.post('/api/stock/mouvements/import/', [
+            {'article': 'ART-100', 'type_mouvement': 'sortie', 'quantite': '10'},
+            {'article': 'ART-100', 'type_mouvement': 'inventaire', 'quantite': '28'},
+        ], format='json')
+        assert response.status_code == 201
+        deltas = sorted(Mouvement.objects.filter(article=article).values_list('delta', flat=True))
+        assert deltas == [Decimal('-10'), Decimal('-2')]
+        article.refresh_from_db()
+        assert article.stock_actuel == Decimal('28')
+        call_command('soldes_stock', '--reconstruire')
+        article.refresh_from_db()
+        assert article.stock_actuel == Decimal('28')
+
+    def test_import_sans_mouvement_cree(self, api_client, article, monkeypatch):
+        # Aucune ligne valide : le rapport, pas une erreur de requête
+        response = api_client.post('/api/stock/mouvements/import/', [
+            {'article': 'ART-404', 'type_mouvement': 'entree', 'quantite': '1'},
+        ], format='json')
+        assert response.status_code == 200
+        assert response.data['crees'] == 0 and len(response.data['erreurs']) == 1
+
+        # Un lot qui échoue à l'enregistrement est rapporté ligne par ligne
+        def echec(mouvements):
+            raise RuntimeError('base indisponible')
+
+        monkeypatch.setattr('apps.stock.imports.enregistrer_mouvements', echec)
+        response = api_client.post('/api/stock/mouvements/import/', [
+            {'article': 'ART-100', 'type_mouvement': 'entree', 'quantite': '1'},
+            {'article': 'ART-100', 'type_mouvement': 'entree', 'quantite': '2'},
+        ], format='json')
+        assert response.status_code == 200
+        assert [erreur['ligne'] for erreur in response.data['erreurs']] == [1, 2]
+        assert 'base indisponible' in response.data['erreurs'][0]['erreurs']['non_field_errors'][0]
+
+
+@pytest.mark.django_db
+class TestAlertesStock:
+    @pytest.fixture
+    def api_client(self, test_user):
+        client = APIClient()
+        client.force_authenticate(user=test_user)
+        return client
+
+    @pytest.fixture
+    def article(self, test_categorie):
+        # Le stock ne se saisit pas par l'API : il ne bouge que par les mouvements
+        return Article.objects.create(
+            reference='ART-200',
+            designation='Joint silicone',
+            categorie=test_categorie,
+            prix_achat_ht=Decimal('4.00'),
+            prix_vente_ht=Decimal('6.00'),
+            stock_minimum=Decimal('10'),
+            stock_actuel=Decimal('12'),
+        )
+
+    def test_mouvements_basculent_l_alerte(self, api_client, article):
+        etat = api_client.get('/api/stock/articles/alertes/').data
+        assert etat['articles'] == []
+        curseur = etat['curseur']
+
+        api_client.post('/api/stock/mouvements/import/', [
+            {'article': 'ART-200', 'type_mouvement': 'sortie', 'quantite': '5'},
+        ], format='json')
+        assert [a['reference'] for a in api_client.get('/api/stock/articles/stock_faible/').data] == ['ART-200']
+
+        fil = api_client.get('/api/stock/articles/alertes/', {'depuis': curseur}).data
+        assert [(e['reference'], e['type_evenement']) for e in fil['evenements']] == [('ART-200', 'alerte')]
+        assert fil['suite'] is False
+
+        # Rien de nouveau depuis le dernier curseur
+        assert api_client.get('/api/stock/articles/alertes/', {'depuis': fil['curseur']}).data['evenements'] == []
+
+    def test_evenement_visible_apres_un_suivant(self, article):
+        from apps.stock.alertes import fil_alertes
+        curseur = fil_alertes()['curseur']
+        valeurs = {'article': article, 'stock_actuel': Decimal('9'), 'stock_minimum': Decimal('10')}
+        tardif = EvenementAlerteStock.objects.create(type_evenement='alerte', **valeurs).id
+        EvenementAlerteStock.objects.create(type_evenement='retour', **valeurs)
+        # Le premier événement n'est pas encore commité quand le client lit le fil
+        EvenementAlerteStock.objects.filter(id=tardif).delete()
+        fil = fil_alertes(curseur)
+        assert [e['type_evenement'] for e in fil['evenements']] == ['retour']
+
+        EvenementAlerteStock.objects.create(id=tardif, type_evenement='alerte', **valeurs)
+        fil = fil_alertes(fil['curseur'])
+        assert [e['id'] for e in fil['evenements']] == [tardif]
+        assert fil_alertes(fil['curseur'])['evenements'] == []
+
+    def test_stock_initial_par_le_registre(self, api_client, test_categorie):
+        response = api_client.post('/api/stock/articles/', {
+            'reference': 'ART-201', 'designation': 'Mastic', 'categorie': test_categorie.id,
+            'prix_achat_ht': '3.00', 'prix_vente_ht': '5.00', 'stock_minimum': '10', 'stock_actuel': '8',
+        }, format='json')
+        assert response.status_code == 201
+        assert (response.data['stock_actuel'], response.data['en_alerte']) == ('8.00', True)
+        mouvement = Mouvement.objects.get(article_id=response.data['id'])
+        assert (mouvement.type_mouvement, mouvement.delta) == ('entree', Decimal('8'))
+        assert SoldeArticle.objects.get(article_id=response.data['id']).quantite == Decimal('8')
+
+    def test_seuil_modifie(self, api_client, article):
+        # Après la création, le stock ne bouge que par les mouvements
+        response = api_client.patch(f'/api/stock/articles/{article.id}/', {'stock_actuel': '100'}, format='json')
+        assert response.data['stock_actuel'] == '12.00'
+        response = api_client.patch(f'/api/stock/articles/{article.id}/', {'stock_minimum': '15'}, format='json')
+        assert response.data['en_alerte'] is True
+        api_client.patch(f'/api/stock/articles/{article.id}/', {'actif': False}, format='json')
+        types = list(EvenementAlerteStock.objects.filter(article=article).values_list('type_evenement', flat=True))
+        assert types == ['alerte', 'retour']
+
+
+@pytest.mark.django_db
+class TestValorisationStock:
+    @pytest.fixture
+    def api_client(self, test_user):
+        client = APIClient()
+        client.force_authenticate(user=test_user)
+        return client
+
+    @pytest.fixture
+    def article(self, test_categorie):
+        # Stock d'ouverture valorisé au prix d'achat
+        return Article.objects.create(
+            reference='ART-300',
+            designation='Vitrage feuilleté',
+            categorie=test_categorie,
+            prix_achat_ht=10.00,
+            prix_vente_ht=20.00,
+            stock_actuel=10
+        )
+
+    def _importer(self, api_client, lignes):
+        response = api_client.post('/api/stock/mouvements/import/', lignes, format='json')
+        assert response.status_code == 201
+
+    def test_cmup_et_fifo(self, api_client, article):
+        self._importer(api_client, [
+            {'article': 'ART-300', 'type_mouvement': 'entree', 'quantite': '10', 'prix_unitaire_ht': '16'},
+            {'article': 'ART-300', 'type_mouvement': 'sortie', 'quantite': '15'},
+        ])
+        solde = SoldeArticle.objects.get(article=article)
+        # CMUP (10 x 10 + 10 x 16) / 20 = 13 ; FIFO : reste 5 de la couche à 16
+        assert solde.cmup == Decimal('13')
+        assert solde.valeur_fifo == Decimal('80')
+
+        ligne = api_client.get('/api/stock/articles/valorisation/').data['articles'][0]
+        assert ligne['valeur_cmup'] == Decimal('65')
+
+        # Une suppression rejoue l'historique de l'article
+        sortie = Mouvement.objects.get(article=article, type_mouvement='sortie')
+        api_client.delete(f'/api/stock/mouvements/{sortie.id}/')
+        solde.refresh_from_db()
+        assert solde.valeur_fifo == Decimal('260')
+
+        # Le rejeu repart du prix d'ouverture, pas du prix d'achat modifié depuis
+        Article.objects.filter(pk=article.pk).update(prix_achat_ht=Decimal('30'))
+        call_command('valoriser_stock', '--reconstruire')
+        solde.refresh_from_db()
+        assert solde.prix_ouverture == Decimal('10')
+        assert (solde.cmup, solde.valeur_fifo) == (Decimal('13'), Decimal('260'))
+
+    def test_rejeu_dans_l_ordre_d_application(self, api_client, article, monkeypatch):
+        # Tout un import partage le même created_at : le rejeu suit le rang des mouvements
+        from django.utils import timezone
+        instant = timezone.now()
+        monkeypatch.setattr(timezone, 'now', lambda: instant)
+        self._importer(api_client, [
+            {'article': 'ART-300', 'type_mouvement': 'sortie', 'quantite': '10'},
+            {'article': 'ART-300', 'type_mouvement': 'entree', 'quantite': '10', 'prix_unitaire_ht': '16'},
+            {'article': 'ART-300', 'type_mouvement': 'sortie', 'quantite': '5'},
+            {'article': 'ART-300', 'type_mouvement': 'entree', 'quantite': '5', 'prix_unitaire_ht': '20'},
+        ])
+        assert list(Mouvement.objects.filter(article=article).order_by('rang').values_list('rang', flat=True)) == [
+            1, 2, 3, 4
+        ]
+        solde = SoldeArticle.objects.get(article=article)
+        incremental = (solde.cmup, solde.valeur_fifo)
+        call_command('valoriser_stock', '--reconstruire')
+        solde.refresh_from_db()
+        assert (solde.cmup, solde.valeur_fifo) == incremental == (Decimal('18'), Decimal('180'))
+
+    def test_photographie_fin_de_mois(self, api_client, article):
+        self._importer(api_client, [
+            {'article': 'ART-300', 'type_mouvement': 'sortie', 'quantite': '4', 'date_mouvement': '2024-01-15'},
+            {'article': 'ART-300', 'type_mouvement': 'entree', 'quantite': '4', 'prix_unitaire_ht': '12',
+             'date_mouvement': '2024-02-10'},
+        ])
+        # Date passée : seuls les mouvements datés de ce jour ou d'avant sont rejoués
+        call_command('valoriser_stock', '--date', '2024-01-31')
+        with pytest.raises(CommandError):
+            call_command('valoriser_stock', '--date', '2999-01-31')
+        photo = api_client.get('/api/stock/articles/valorisation/', {'date': '2024-01-31'}).data
+        assert photo['source'] == 'photographie'
+        assert photo['valeur_fifo'] == Decimal('60')
+        assert api_client.get('/api/stock/articles/valorisation/').data['valeur_fifo'] == Decimal('108')
+        assert api_client.get('/api/stock/articles/valorisation/', {'date': '2024-02-29'}).status_code == 404
+
+        # La reconstruction retrouve la valorisation incrémentale
+        call_command('valoriser_stock', '--reconstruire')
+        assert SoldeArticle.objects.get(article=article).valeur_fifo == Decimal('108')
+
+
+@pytest.mark.django_db
+class TestStockALaDate:
+    @pytest.fixture
+    def api_client(self, test_user):
+        client = APIClient()
+        client.force_authenticate(user=test_user)
+        return client
+
+    @pytest.fixture
+    def article(self, api_client, test_categorie):
+        article = Article.objects.create(
+            reference='ART-400',
+            designation='Profil alu',
+            categorie=test_categorie,
+            prix_achat_ht=5.00,
+            prix_vente_ht=8.00,
+            stock_actuel=20
+        )
+        api_client.post('/api/stock/mouvements/import/', [
+            {'article': 'ART-400', 'type_mouvement': 'entree', 'quantite': '10', 'date_mouvement': '2024-12-10'},
+            {'article': 'ART-400', 'type_mouvement': 'sortie', 'quantite': '4', 'date_mouvement': '2024-12-31'},
+            {'article': 'ART-400', 'type_mouvement': 'sortie', 'quantite': '6', 'date_mouvement': '2025-01-15'},
+        ], format='json')
+        return article
+
+    def _stock(self, api_client, date_stock, **params):
+        response = api_client.get('/api/stock/articles/stock_a_date/', {'date': date_stock, **params})
+        assert response.status_code == 200
+        return {ligne['reference']: ligne['quantite'] for ligne in response.data['articles']}
 
+    def test_stock_depuis_les_instantanes(self, api_client, article):
+        # Sans instantané : depuis l'ouverture du registre
+        assert self._stock(api_client, '2024-12-31')['ART-400'] == Decimal('26')
 
+        call_command('instantanes_stock', '--date', '2024-12-31')
+        call_command('instantanes_stock', '--date', '2025-01-31')
+        assert self._stock(api_client, '2024-12-31', article=article.id) == {'ART-400': Decimal('26')}
+        assert self._stock(api_client, '2025-01-02')['ART-400'] == Decimal('26')
+        # Plus proche de l'instantané du 31/01 : rejeu à rebours
+        assert self._stock(api_client, '2025-01-20')['ART-400'] == Decimal('20')
+        assert self._stock(api_client, '2024-12-01')['ART-400'] == Decimal('20')
 
+    def test_mouvement_tardif_corrige_les_instantanes(self, api_client, article):
+        call_command('instantanes_stock', '--date', '2024-12-31')
+        api_client.post('/api/stock/mouvements/import/', [
+            {'article': 'ART-400', 'type_mouvement': 'entree', 'quantite': '3', 'date_mouvement': '2024-12-20'},
+        ], format='json')
+        assert InstantaneStock.objects.get(article=article).quantite == Decimal('29')
 
+        sortie = Mouvement.objects.get(article=article, date_mouvement='2024-12-31')
+        api_client.delete(f'/api/stock/mouvements/{sortie.id}/')
+        assert self._stock(api_client, '2024-12-31')['ART-400'] == Decimal('33')